@@ -0,0 +1,155 @@
+# 適応型の出題
+# 回答済みの質問から、各タイプの平均評価が最終的に取りうる範囲を求め、残りの質問にどう答えても
+# 主要タイプ（ローカル採点の1位。同点は TYPE_NAMES の先頭側）が変わらなくなった時点で出題を終える。
+# 次の質問は、その回答によって主要タイプの予測分布のエントロピーが最も小さくなる
+# （主要タイプについての情報量が最大の）ものを選ぶ。未回答の評価は 1〜5 が等確率と仮定する。
+#
+# 出題を途中で終えた場合、未回答の質問は中央の評価（3）で補って採点する。補った値は
+# 取りうる範囲の内側にあるため、主要タイプは全問回答した場合と必ず一致する
+# （tools/verify_adaptive.py で 5^10 通りの回答すべてについて確認している）。
+# 質問画面で使うため numpy は使わない。
+import functools
+import math
+
+from type_data import TYPE_ITEMS, ITEM_TYPES
+
+RATINGS = (1, 2, 3, 4, 5)
+NEUTRAL_RATING = 3
+UNANSWERED = 0
+
+# タイプの平均評価を共通の整数の目盛りで比較するための倍率（平均 × SCALE が整数になる）
+SCALE = math.lcm(*[len(items) for items in TYPE_ITEMS if items])
+MAX_VALUE = RATINGS[-1] * SCALE
+
+
+# 回答からタイプごとの (回答済みの評価の合計, 回答済みの質問数) を作る
+def type_states(answers):
+    states = []
+    for items in TYPE_ITEMS:
+        ratings = [answers[q_idx] for q_idx in items if answers[q_idx] != UNANSWERED]
+        states.append((sum(ratings), len(ratings)))
+    return tuple(states)
+
+
+# 各タイプの平均評価 × SCALE が最終的に取りうる範囲 (最小, 最大)
+def type_bounds(states):
+    bounds = []
+    for items, (total, answered) in zip(TYPE_ITEMS, states):
+        if not items:
+            bounds.append((0, 0))
+            continue
+        remaining = len(items) - answered
+        unit = SCALE // len(items)
+        bounds.append(((total + RATINGS[0] * remaining) * unit, (total + RATINGS[-1] * remaining) * unit))
+    return bounds
+
+
+# 残りの回答によらず主要タイプが決まっていればその番号を返す（決まっていなければ None）
+def decided_type(answers):
+    bounds = type_bounds(type_states(answers))
+    for t, (low, _) in enumerate(bounds):
+        # 先頭側のタイプには同点でも負けるため、それらの最大値を上回る必要がある
+        if all(high < low for _, high in bounds[:t]) and all(high <= low for _, high in bounds[t + 1:]):
+            return t
+    return None
+
+
+# m 問の評価の合計の分布（{合計: 確率}）
+@functools.lru_cache(maxsize=None)
+def rating_sum_distribution(m):
+    distribution = {0: 1.0}
+    for _ in range(m):
+        step = {}
+        for total, p in distribution.items():
+            for r in RATINGS:
+                step[total + r] = step.get(total + r, 0.0) + p / len(RATINGS)
+        distribution = step
+    return distribution
+
+
+# タイプの平均評価 × SCALE の累積分布（P(X <= v) を v = 0〜MAX_VALUE の順に並べたもの）
+@functools.lru_cache(maxsize=None)
+def type_value_cdf(t, state):
+    items = TYPE_ITEMS[t]
+    pmf = [0.0] * (MAX_VALUE + 1)
+    if not items:
+        pmf[0] = 1.0
+    else:
+        total, answered = state
+        unit = SCALE // len(items)
+        for rest, p in rating_sum_distribution(len(items) - answered).items():
+            pmf[(total + rest) * unit] += p
+    cdf = []
+    running = 0.0
+    for p in pmf:
+        running += p
+        cdf.append(running)
+    return tuple(pmf), tuple(cdf)
+
+
+# 主要タイプの予測分布（タイプごとの確率）
+@functools.lru_cache(maxsize=1 << 16)
+def main_type_distribution(states):
+    cdfs = [type_value_cdf(t, state) for t, state in enumerate(states)]
+    probabilities = []
+    for t, (pmf, _) in enumerate(cdfs):
+        p_main = 0.0
+        for value, p in enumerate(pmf):
+            if p == 0.0:
+                continue
+            for u, (_, cdf) in enumerate(cdfs):
+                if u == t:
+                    continue
+                # 先頭側のタイプは値が小さい場合のみ、後ろ側のタイプは同点以下なら t が1位になる
+                p *= (cdf[value - 1] if value > 0 else 0.0) if u < t else cdf[value]
+                if p == 0.0:
+                    break
+            p_main += p
+        probabilities.append(p_main)
+    return tuple(probabilities)
+
+
+def entropy(probabilities):
+    return -sum(p * math.log2(p) for p in probabilities if p > 0.0)
+
+
+# 次に出題する質問の番号（主要タイプが決まっている場合は None）
+def next_question(answers):
+    if decided_type(answers) is not None:
+        return None
+    states = type_states(answers)
+    best_q_idx = None
+    best_entropy = None
+    for q_idx, rating in enumerate(answers):
+        if rating != UNANSWERED:
+            continue
+        t = ITEM_TYPES[q_idx]
+        total, answered = states[t]
+        expected = 0.0
+        for r in RATINGS:
+            after = states[:t] + ((total + r, answered + 1),) + states[t + 1:]
+            expected += entropy(main_type_distribution(after)) / len(RATINGS)
+        # 同程度なら番号の小さい質問を優先する
+        if best_entropy is None or expected < best_entropy - 1e-12:
+            best_q_idx, best_entropy = q_idx, expected
+    return best_q_idx
+
+
+# 未回答の質問を中央の評価で補った回答（出題を途中で終えた場合の採点用）
+def fill_unanswered(answers):
+    return bytearray(NEUTRAL_RATING if rating == UNANSWERED else rating for rating in answers)
+
+
+# タイプごとに、未回答の質問を含むか（TYPE_NAMES 順。含むタイプのスコアは補った評価による推定値）
+def estimated_types(answers):
+    return tuple(any(answers[q_idx] == UNANSWERED for q_idx in items) for items in TYPE_ITEMS)
+
+
+# q_idx にどの評価で回答しても出題が終わるか（最後の質問か）
+def is_last_question(answers, q_idx):
+    answers = bytearray(answers)
+    for rating in RATINGS:
+        answers[q_idx] = rating
+        if next_question(answers) is not None:
+            return False
+    return True
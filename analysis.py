@@ -0,0 +1,470 @@
+# OpenAI APIを使った継続力タイプ分析
+# Streamlit に依存しないため、app.py と一括診断 (bulk_diagnose.py) の両方から使う
+#
+# 出力モード（ANALYSIS_OUTPUT_MODE）:
+#   text       : 従来どおり自由記述の分析テキストからタイプとスコアを抽出する（既定）
+#   structured : 主要タイプ・8タイプの整数スコア・短い理由を JSON で受け取り、1回で検証して解析する
+#                ANALYSIS_NARRATIVE=True の場合は、別の呼び出しで長文の詳細分析も生成する
+#
+# プロンプトは prompt_templates.py のバージョン（ANALYSIS_PROMPT_VERSION）ごとのテンプレートで作る。
+# API の呼び出しごとの入出力トークン数と所要時間は llm_usage.py に記録する。
+#
+# 判定モード（ANALYSIS_DECISION_MODE）:
+#   hybrid : 先にローカル採点を行い、1位と2位の正規化スコアの差が HYBRID_MARGIN_THRESHOLD 以上なら
+#            AI を使わずに採点結果で診断する。同点・僅差の場合だけ AI分析を行う
+#            （適応型の出題で未回答の質問がある場合は、未回答の質問にどう答えても保証される差で判定する）
+#   llm    : 従来どおり常に AI分析を行う
+#
+# tools/pregenerate_narratives.py で事前生成した詳細分析のパック（narrative_pack.py）がある場合は、
+# ハイブリッド判定で診断した結果と、長文の詳細分析（ANALYSIS_NARRATIVE=True）にパックの詳細分析を使い、
+# 詳細分析の API 呼び出しを省く。パックに無いシグネチャの場合だけ従来どおり生成する。
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from type_data import questions, personality_types
+from scoring import score_answers, scores_to_dict, make_result, TYPE_NAMES, CONFIDENT_ANALYSIS_TEXT
+from adaptive import fill_unanswered, type_states, type_bounds, UNANSWERED
+from analysis_cache import make_cache_key, get_default_cache
+from llm_client import get_client
+from llm_scheduler import get_scheduler, estimate_tokens
+from llm_usage import CallUsage, get_usage_log, usage_tokens, estimate_text_tokens
+from prompt_templates import get_template, LATEST_VERSION
+from metrics import REGISTRY, PHASE_SECONDS, timer
+from narrative_pack import get_default_pack
+
+# プロンプトテンプレートのバージョン（キャッシュのキーに含まれる）
+PROMPT_VERSION = os.getenv("ANALYSIS_PROMPT_VERSION") or LATEST_VERSION
+TEMPLATE = get_template(PROMPT_VERSION)
+OUTPUT_MODE = os.getenv("ANALYSIS_OUTPUT_MODE", "text")
+NARRATIVE_ENABLED = os.getenv("ANALYSIS_NARRATIVE", "False").lower() == "true"
+
+MODEL = "gpt-4"  # または利用可能な最新モデル
+TEMPERATURE = 0.5
+MAX_TOKENS = 1500
+
+# 構造化出力モード（ANALYSIS_OUTPUT_MODE=structured を指定した場合のみ）は JSON モードに対応したモデルを使い、出力トークンを絞る
+STRUCTURED_MODEL = os.getenv("ANALYSIS_STRUCTURED_MODEL", "gpt-4-turbo")
+STRUCTURED_MAX_TOKENS = 400
+
+# 長文の詳細分析に使うモデル（小さく速いモデルを指定できる）
+NARRATIVE_MODEL = os.getenv("ANALYSIS_NARRATIVE_MODEL") or MODEL
+
+DECISION_MODE = os.getenv("ANALYSIS_DECISION_MODE", "hybrid")
+# ハイブリッド判定で AI を使わずに診断する、1位と2位の正規化スコア（0〜100）の差の下限
+HYBRID_MARGIN_THRESHOLD = float(os.getenv("HYBRID_MARGIN_THRESHOLD", "10"))
+
+# テキストモードのスコア表記 (例: "指揮官型: 85%") を1回の走査で探すパターン
+SCORE_PATTERN = re.compile(
+    "(" + "|".join(re.escape(t) for t in TYPE_NAMES) + ")[：:]\\s*(\\d+)([％%])?"
+)
+
+
+# 最近の分析結果をプロセス内に保持する件数（セッションには分析キーだけを保存し、テキストはここから引く）
+RECENT_RESULTS_SIZE = 10000
+
+
+# 構造化出力の検証エラー
+class AnalysisParseError(ValueError):
+    pass
+
+
+# API を呼び出す（スケジューラーがレート制限・期限・再試行・サーキットブレーカーを管理する）
+# 呼び出しごとの入出力トークン数と所要時間を purpose（structured / text / narrative）ごとに記録する。
+# ストリーミングの場合は、最後のチャンクで usage を受け取り、受け取り終えた時点で記録する
+# （応答を読み終えるまでを期限の対象にする）
+def create_completion(messages, max_tokens, purpose, **options):
+    if options.get("stream"):
+        options["extra_body"] = {"stream_options": {"include_usage": True}}
+    scheduler = get_scheduler()
+    deadline = scheduler.deadline_at()
+    queued_at = time.monotonic()
+    sent_at = queued_at
+
+    def request(timeout):
+        nonlocal sent_at
+        client = get_client()
+        sent_at = time.monotonic()
+        return client.chat.completions.create(messages=messages, max_tokens=max_tokens, timeout=timeout, **options)
+
+    response = scheduler.call(request, estimate_tokens(messages, max_tokens), deadline=deadline)
+    if options.get("stream"):
+        return _record_stream_usage(scheduler.stream_until(response, deadline), messages, purpose, options["model"],
+                                    sent_at - queued_at, sent_at)
+    _record_usage(purpose, options["model"], response.usage, messages, response.choices[0].message.content or "",
+                  sent_at - queued_at, None, time.monotonic() - sent_at)
+    return response
+
+
+# 1回の呼び出しの使用量を記録する（usage が無い場合は文字数から見積もる）
+def _record_usage(purpose, model, usage, messages, output_text, queue_seconds, ttft_seconds, seconds):
+    if usage is not None:
+        input_tokens, cached_tokens, output_tokens = usage_tokens(usage)
+    else:
+        input_tokens = sum(estimate_text_tokens(str(m.get("content", ""))) for m in messages)
+        cached_tokens, output_tokens = 0, estimate_text_tokens(output_text)
+    get_usage_log().record(CallUsage(
+        purpose, model, PROMPT_VERSION, input_tokens, cached_tokens, output_tokens,
+        queue_seconds, ttft_seconds, seconds, usage is None
+    ))
+
+
+# ストリーミングのチャンクをそのまま返しながら、最初のテキストまでの時間と usage を記録する
+def _record_stream_usage(stream, messages, purpose, model, queue_seconds, sent_at):
+    first_at = None
+    usage = None
+    parts = []
+    for chunk in stream:
+        usage = getattr(chunk, "usage", None) or usage
+        if chunk.choices and chunk.choices[0].delta.content:
+            if first_at is None:
+                first_at = time.monotonic()
+            parts.append(chunk.choices[0].delta.content)
+        yield chunk
+    ttft_seconds = first_at - sent_at if first_at is not None else None
+    _record_usage(purpose, model, usage, messages, "".join(parts), queue_seconds, ttft_seconds, time.monotonic() - sent_at)
+
+
+# 回答を {質問番号: 評価} の dict に揃える（配列の 0 は未回答として除く）
+def answers_to_dict(answers):
+    if isinstance(answers, dict):
+        return answers
+    return {q_idx: int(rating) for q_idx, rating in enumerate(answers) if rating}
+
+
+# ユーザープロンプトの作成
+def build_user_prompt(answers):
+    return TEMPLATE.user_prompt(answers_to_dict(answers))
+
+
+# API に送るメッセージを作成
+def build_messages(answers):
+    return [
+        {"role": "system", "content": TEMPLATE.text_system},
+        {"role": "user", "content": build_user_prompt(answers)}
+    ]
+
+
+# OpenAI APIを呼び出して分析テキストを取得
+def request_analysis_text(answers):
+    response = create_completion(build_messages(answers), MAX_TOKENS, "text", model=MODEL, temperature=TEMPERATURE)
+    return response.choices[0].message.content
+
+
+# OpenAI APIの応答をストリーミングで受け取り、テキストの断片を順に返す
+def stream_analysis_text(answers):
+    stream = create_completion(build_messages(answers), MAX_TOKENS, "text", model=MODEL, temperature=TEMPERATURE, stream=True)
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+# 分析テキストから主要タイプとスコアを抽出
+def parse_analysis(analysis_text, answers):
+    # 主要タイプを抽出（最初に言及されたタイプを採用）
+    main_type = None
+    for type_name in personality_types.keys():
+        if type_name in analysis_text:
+            main_type = type_name
+            break
+
+    # ローカル採点（バックアップ用。未回答の質問は画面の採点と同じく中央の評価で補う）
+    local_scores = score_local(answers)
+
+    # バックアップ: 主要タイプが見つからなかった場合はローカル採点の結果を採用
+    if main_type is None:
+        main_type = TYPE_NAMES[local_scores.main_type]
+
+    # スコア情報を抽出 (例: "指揮官型: 85%")
+    # タイプごとに、パーセント表記があれば最初のものを、無ければ数字のみの最初のものを採用
+    percent_scores = {}
+    number_scores = {}
+    for match in SCORE_PATTERN.finditer(analysis_text):
+        type_name, value, percent = match.groups()
+        if percent:
+            percent_scores.setdefault(type_name, int(value))
+        number_scores.setdefault(type_name, int(value))
+
+    # 見つからない場合はバックアップ値
+    scores = {t: percent_scores.get(t, number_scores.get(t, 50)) for t in TYPE_NAMES}
+
+    # すべてのタイプのスコアが見つからない場合、最もスコアの高いタイプを100%として他を相対的に設定
+    if not scores or max(scores.values(), default=0) == 0:
+        # バックアップとしてローカル採点のスコアを使用
+        scores = scores_to_dict(local_scores.scores)
+
+    return main_type, scores
+
+
+# 構造化出力用のメッセージを作成
+def build_structured_messages(answers):
+    return [
+        {"role": "system", "content": TEMPLATE.structured_system},
+        {"role": "user", "content": build_user_prompt(answers)}
+    ]
+
+
+# 構造化出力（JSON）を検証して主要タイプ・スコア・理由を取り出す
+def parse_structured_analysis(content):
+    try:
+        data = json.loads(content)
+    except (TypeError, ValueError) as e:
+        raise AnalysisParseError(f"JSON として解析できません: {e}")
+    if not isinstance(data, dict):
+        raise AnalysisParseError("JSON オブジェクトではありません")
+
+    main_type = data.get("main_type")
+    if main_type not in personality_types:
+        raise AnalysisParseError(f"不明なタイプです: {main_type}")
+
+    raw_scores = data.get("scores")
+    if not isinstance(raw_scores, dict) or set(raw_scores) != set(TYPE_NAMES):
+        raise AnalysisParseError("scores に8タイプすべてのスコアが含まれていません")
+    scores = {}
+    for type_name in TYPE_NAMES:
+        value = raw_scores[type_name]
+        if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= 100:
+            raise AnalysisParseError(f"{type_name} のスコアが 0〜100 の整数ではありません: {value}")
+        scores[type_name] = value
+
+    rationale = data.get("rationale")
+    if not isinstance(rationale, str) or not rationale.strip():
+        raise AnalysisParseError("rationale がありません")
+
+    return main_type, scores, rationale.strip()
+
+
+# 構造化出力モードで API を呼び出す
+def request_structured_analysis(answers):
+    response = create_completion(
+        build_structured_messages(answers),
+        STRUCTURED_MAX_TOKENS,
+        "structured",
+        model=STRUCTURED_MODEL,
+        temperature=TEMPERATURE,
+        response_format={"type": "json_object"}
+    )
+    with timer(PHASE_SECONDS, phase="parse"):
+        return parse_structured_analysis(response.choices[0].message.content)
+
+
+# 長文の詳細分析をストリーミングで受け取る
+def stream_narrative(answers, main_type):
+    user_prompt = TEMPLATE.narrative_prompt(answers_to_dict(answers), main_type, personality_types[main_type]["英語名"])
+    messages = [
+        {"role": "system", "content": TEMPLATE.narrative_system},
+        {"role": "user", "content": user_prompt}
+    ]
+    stream = create_completion(messages, MAX_TOKENS, "narrative", model=NARRATIVE_MODEL, temperature=TEMPERATURE, stream=True)
+    for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+# 現在の出力モードで使うモデルとプロンプトのバージョン（分析キーと結果ストアの記録に使う）
+def analysis_version():
+    if OUTPUT_MODE == "structured":
+        narrative = ""
+        if NARRATIVE_ENABLED:
+            narrative = "+narrative" if NARRATIVE_MODEL == MODEL else f"+narrative:{NARRATIVE_MODEL}"
+        return STRUCTURED_MODEL, f"{PROMPT_VERSION}-structured{narrative}"
+    return MODEL, f"{PROMPT_VERSION}-text"
+
+
+# 回答パターンごとの分析キー（キャッシュのキー、実行中タスクの共有に使う）
+def analysis_key(answers):
+    model, prompt_version = analysis_version()
+    return make_cache_key(answers_to_dict(answers), model, prompt_version, TEMPERATURE)
+
+
+# キャッシュ済みのAI分析結果を取得（無い場合は None）
+def cached_ai_result(answers, cache=None):
+    cache = cache or get_default_cache()
+    if cache is None:
+        return None
+    cached = cache.get(analysis_key(answers))
+    if cached is None:
+        return None
+    return make_result(cached["main_type"], cached["scores"], cached["analysis_text"])
+
+
+_decision_counts = {"decisions": 0, "escalated": 0}
+_decision_counts_lock = threading.Lock()
+
+
+# 回答を質問順の評価の配列に揃える（dict に無い質問は未回答）
+def answers_to_ratings(answers):
+    if not isinstance(answers, dict):
+        return answers
+    ratings = bytearray(len(questions))
+    for q_idx, rating in answers.items():
+        ratings[q_idx] = rating
+    return ratings
+
+
+# 回答をローカル採点する（適応型の出題で途中で終えた場合の未回答の質問は、中央の評価で補う）
+def score_local(answers):
+    return score_answers(fill_unanswered(answers_to_ratings(answers)))
+
+
+# 1位（main_type）と2位の正規化スコアの差のうち、未回答の質問にどう答えても保証される値
+# （1位のタイプが最小・他のタイプが最大になる場合の差。全問回答していれば採点の差と同じ。負なら1位が入れ替わりうる）
+def worst_case_margin(answers, main_type):
+    bounds = type_bounds(type_states(answers_to_ratings(answers)))
+    low = bounds[main_type][0]
+    high = max(high for t, (_, high) in enumerate(bounds) if t != main_type)
+    if low <= 0:
+        return 0.0
+    return (low - high) / low * 100.0
+
+
+# 事前生成した詳細分析（パックが無い場合、パックに無いシグネチャの場合は None）
+# count=False の場合はパックの利用件数を数えない（表示し直すたびに引く場合）
+def pack_narrative(main_type, scores, count=True):
+    pack = get_default_pack(NARRATIVE_MODEL)
+    if pack is None:
+        return None
+    if count:
+        return pack.lookup(main_type, scores)
+    return pack.get(pack.signature(main_type, scores))
+
+
+# ハイブリッド判定で診断した結果の分析テキスト（事前生成した詳細分析があれば続けて表示する）
+def confident_analysis_text(main_type, scores, count=True):
+    narrative = pack_narrative(main_type, scores, count)
+    if narrative is None:
+        return CONFIDENT_ANALYSIS_TEXT
+    return f"{CONFIDENT_ANALYSIS_TEXT}\n\n{narrative}"
+
+
+# ハイブリッド判定: ローカル採点で主要タイプがはっきりしていれば、その診断結果を返す（AI分析が必要な場合は None）
+# count=False の場合は判定の件数（AI分析に回した割合）を数えない（先行開始の判定用）
+def confident_local_result(answers, count=True):
+    if DECISION_MODE != "hybrid":
+        return None
+    scored = score_local(answers)
+    margin = scored.margin
+    if UNANSWERED in answers_to_ratings(answers):
+        # 補った評価による差ではなく、残りの回答によらない差で判定する
+        margin = worst_case_margin(answers, scored.main_type)
+    confident = margin >= HYBRID_MARGIN_THRESHOLD
+    if count:
+        with _decision_counts_lock:
+            _decision_counts["decisions"] += 1
+            _decision_counts["escalated"] += not confident
+    if not confident:
+        return None
+    main_type, scores = TYPE_NAMES[scored.main_type], scores_to_dict(scored.scores)
+    return make_result(main_type, scores, confident_analysis_text(main_type, scores, count))
+
+
+# ハイブリッド判定の件数と、AI分析に回した割合
+def decision_counts():
+    with _decision_counts_lock:
+        counts = dict(_decision_counts)
+    counts["escalation_rate"] = counts["escalated"] / counts["decisions"] if counts["decisions"] else None
+    return counts
+
+
+# 計測値の書き出しに含める、ハイブリッド判定の件数・事前生成した詳細分析の利用件数と API スケジューラーの状態
+def collect_gauges():
+    counts = decision_counts()
+    scheduler = get_scheduler().metrics()
+    pack = get_default_pack(NARRATIVE_MODEL)
+    return [
+        ("analysis_decisions", "Hybrid decisions made", counts["decisions"]),
+        ("analysis_escalated", "Hybrid decisions escalated to the LLM", counts["escalated"]),
+        ("narrative_pack_entries", "Pregenerated narratives in the loaded pack", len(pack) if pack else 0),
+        ("narrative_pack_hits", "Narratives served from the pregenerated pack", pack.hits if pack else 0),
+        ("narrative_pack_misses", "Narrative lookups not found in the pregenerated pack", pack.misses if pack else 0),
+        ("llm_scheduler_queue_depth", "Requests waiting in the LLM scheduler", scheduler["queue_depth"]),
+        ("llm_scheduler_in_flight", "LLM requests in flight", scheduler["in_flight"]),
+        ("llm_scheduler_breaker_open", "1 if the LLM circuit breaker is open", int(scheduler["state"] == "open")),
+        ("llm_scheduler_retries", "LLM request retries", scheduler["retries"]),
+        ("llm_scheduler_deadline_exceeded", "LLM requests that missed their deadline", scheduler["deadline_exceeded"]),
+        ("llm_scheduler_short_circuited", "LLM requests rejected by the open breaker", scheduler["short_circuited"]),
+    ]
+
+
+REGISTRY.register_collector(collect_gauges)
+
+
+_recent_results = OrderedDict()
+_recent_results_lock = threading.Lock()
+
+
+# 分析結果をプロセス内の共有ストアに保存（古いものから削除）
+def remember_result(key, result):
+    with _recent_results_lock:
+        _recent_results[key] = result
+        _recent_results.move_to_end(key)
+        while len(_recent_results) > RECENT_RESULTS_SIZE:
+            _recent_results.popitem(last=False)
+
+
+# 分析キーから分析テキストを取得（プロセス内 → 永続キャッシュの順に探す。無い場合は None）
+def lookup_analysis_text(key, cache=None):
+    with _recent_results_lock:
+        result = _recent_results.get(key)
+    if result is not None:
+        return result["analysis_text"]
+    cache = cache or get_default_cache()
+    if cache is None:
+        return None
+    cached = cache.get(key)
+    return cached["analysis_text"] if cached is not None else None
+
+
+# テキストを受け取りながら連結する（on_text があれば断片ごとに通知）
+def _collect(parts, on_text):
+    collected = []
+    for part in parts:
+        collected.append(part)
+        if on_text is not None:
+            on_text(part)
+    return "".join(collected)
+
+
+# AI分析を行い診断結果を作成（API エラー・検証エラーは呼び出し側で処理する）
+# 同じ回答パターンの分析結果はキャッシュから返し、API を呼び出さない
+# on_text を指定すると、表示用のテキストを受け取るたびに呼び出す（ストリーミング表示用）
+def run_ai_analysis(answers, cache=None, on_text=None):
+    cached = cached_ai_result(answers, cache)
+    if cached is not None:
+        remember_result(analysis_key(answers), cached)
+        if on_text is not None:
+            on_text(cached["analysis_text"])
+        return cached
+
+    if OUTPUT_MODE == "structured":
+        main_type, scores, analysis_text = request_structured_analysis(answers)
+        if on_text is not None:
+            on_text(analysis_text)
+        if NARRATIVE_ENABLED:
+            if on_text is not None:
+                on_text("\n\n")
+            narrative = pack_narrative(main_type, scores_to_dict(score_local(answers).scores))
+            if narrative is None:
+                narrative = _collect(stream_narrative(answers, main_type), on_text)
+            elif on_text is not None:
+                on_text(narrative)
+            analysis_text += "\n\n" + narrative
+    else:
+        if on_text is None:
+            analysis_text = request_analysis_text(answers)
+        else:
+            analysis_text = _collect(stream_analysis_text(answers), on_text)
+        with timer(PHASE_SECONDS, phase="parse"):
+            main_type, scores = parse_analysis(analysis_text, answers)
+
+    cache = cache or get_default_cache()
+    if cache is not None:
+        cache.put(analysis_key(answers), {"main_type": main_type, "scores": scores, "analysis_text": analysis_text})
+
+    # AI分析のテキスト全体も保存
+    result = make_result(main_type, scores, analysis_text)
+    remember_result(analysis_key(answers), result)
+    return result
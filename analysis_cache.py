@@ -0,0 +1,187 @@
+# AI分析結果の永続キャッシュ
+# 回答ベクトル・モデル・プロンプトのバージョン・temperature のハッシュをキーとして、
+# 解析済みの結果と analysis_text を SQLite に保存する。
+# 件数上限を超えた分は最終参照が古い順（LRU）に削除し、TTL を過ぎたものは使わない。
+# 診断 API の複数のワーカープロセスから同じファイルを使うため、書き込みを減らしている。
+#   - 最終参照時刻は ACCESS_RESOLUTION_SECONDS より古くなった場合だけ更新する（ヒットのたびには書き込まない）
+#   - 件数の確認と LRU の削除は EVICT_EVERY 回の保存ごとにまとめて行う（件数は一時的に上限を少し超える）
+#   - ヒット・ミスの累計は STATS_FLUSH_EVERY 件ごとにまとめて書き込む
+# 他のプロセスが書き込み中の場合は、BUSY_TIMEOUT_MS まで待ってから読み書きする。
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "analysis_cache.sqlite3")
+DEFAULT_MAX_ENTRIES = 50000
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60
+
+BUSY_TIMEOUT_MS = 5000
+ACCESS_RESOLUTION_SECONDS = 60 * 60
+EVICT_EVERY = 100
+STATS_FLUSH_EVERY = 100
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_access ON analysis_cache (last_access);
+CREATE TABLE IF NOT EXISTS cache_stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+# キャッシュキーを作成（回答ベクトルは質問順の整数列に正規化する）
+# 未回答の質問を含む dict は、どの質問の回答かが分かるよう [質問番号, 評価] の列にする
+def make_cache_key(answers, model, prompt_version, temperature):
+    if isinstance(answers, dict) and sorted(answers) != list(range(len(answers))):
+        vector = [[int(q_idx), int(answers[q_idx])] for q_idx in sorted(answers)]
+    elif isinstance(answers, dict):
+        vector = [int(answers[q_idx]) for q_idx in sorted(answers)]
+    else:
+        vector = [int(a) for a in answers]
+    canonical = json.dumps(
+        {"answers": vector, "model": model, "prompt_version": prompt_version, "temperature": float(temperature)},
+        sort_keys=True,
+        separators=(",", ":")
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._pending_stats = {"hits": 0, "misses": 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    # キャッシュを参照（見つからない・期限切れの場合は None）
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at, last_access FROM analysis_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM analysis_cache WHERE key = ?", (key,))
+                row = None
+
+            if row is None:
+                self.misses += 1
+                self._count("misses")
+                return None
+
+            self.hits += 1
+            if now - row[2] > ACCESS_RESOLUTION_SECONDS:
+                self._conn.execute("UPDATE analysis_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._count("hits")
+        return json.loads(row[0])
+
+    # キャッシュに保存し、上限を超えた分を LRU で削除
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analysis_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            self._puts += 1
+            if self._puts % EVICT_EVERY == 0:
+                self._evict()
+
+    def _evict(self):
+        if not self.max_entries:
+            return
+        count = self._conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM analysis_cache WHERE key IN "
+                "(SELECT key FROM analysis_cache ORDER BY last_access LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def _count(self, name):
+        self._pending_stats[name] += 1
+        if sum(self._pending_stats.values()) >= STATS_FLUSH_EVERY:
+            self._flush_stats()
+
+    # まだ書き込んでいないヒット・ミスの件数を累計に加える
+    def _flush_stats(self):
+        for name, value in self._pending_stats.items():
+            if value:
+                self._conn.execute(
+                    "INSERT INTO cache_stats (name, value) VALUES (?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                    (name, value)
+                )
+                self._pending_stats[name] = 0
+
+    # 期限切れのエントリを削除
+    def purge_expired(self):
+        if not self.ttl_seconds:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM analysis_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+        return cursor.rowcount
+
+    # ヒット・ミスの件数（このプロセス分と累計）
+    def stats(self):
+        with self._lock:
+            self._flush_stats()
+            entries = self._conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+            totals = dict(self._conn.execute("SELECT name, value FROM cache_stats").fetchall())
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "total_hits": totals.get("hits", 0),
+            "total_misses": totals.get("misses", 0)
+        }
+
+    def close(self):
+        with self._lock:
+            self._flush_stats()
+            self._evict()
+            self._conn.close()
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+# 環境変数の設定に従ってプロセス共通のキャッシュを取得（ANALYSIS_CACHE_PATH が空なら無効）
+def get_default_cache():
+    global _default_cache
+    path = os.getenv("ANALYSIS_CACHE_PATH", DEFAULT_CACHE_PATH)
+    if not path:
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = AnalysisCache(
+                path,
+                max_entries=int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+                ttl_seconds=int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS))
+            )
+    return _default_cache
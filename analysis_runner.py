@@ -0,0 +1,131 @@
+# AI分析のバックグラウンド実行
+# AI分析はスレッドプール上のタスクとして実行し、Streamlit のスクリプトスレッドを占有しない。
+# 画面側はセッションごとのタスクをポーリングして、途中までのテキストや完了した結果を表示する。
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from analysis import analysis_key, answers_to_dict, cached_ai_result, remember_result, run_ai_analysis
+from llm_scheduler import get_scheduler, CircuitOpenError, CIRCUIT_OPEN_MESSAGE
+
+DEFAULT_MAX_CONCURRENCY = 16
+
+# 完了後にこの秒数を過ぎたタスクは破棄する（画面を閉じたセッションの分）
+TASK_RETENTION_SECONDS = 10 * 60
+
+
+# 1件のAI分析タスク（ストリーミング中のテキストを途中まで参照できる）
+class AnalysisTask:
+    def __init__(self, answers, key):
+        self.answers = answers
+        self.key = key
+        self.parts = []
+        self.result = None
+        self.error = None
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self._done = threading.Event()
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def _finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.finished_at = time.monotonic()
+        self._done.set()
+
+
+# AI分析をバックグラウンドで実行し、セッションごとにタスクを管理する
+# 同じ回答パターンのタスクが実行中であれば、新しく API を呼ばずにそれを共有する
+class AnalysisRunner:
+    def __init__(self, max_workers=None):
+        max_workers = max_workers or int(os.getenv("ANALYSIS_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis")
+        self._tasks = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    # セッションの分析を開始（キャッシュ済みなら完了済みのタスクを返す）
+    def submit(self, session_key, answers):
+        answers = dict(answers_to_dict(answers))
+        key = analysis_key(answers)
+        with self._lock:
+            self._prune()
+            task = self._tasks.get(session_key)
+            if task is not None and task.key == key and task.error is None:
+                return task
+
+        cached = cached_ai_result(answers)
+        with self._lock:
+            if cached is not None:
+                remember_result(key, cached)
+                task = AnalysisTask(answers, key)
+                task.parts.append(cached["analysis_text"])
+                task._finish(result=cached)
+            else:
+                task = self._inflight.get(key)
+                if task is None:
+                    task = AnalysisTask(answers, key)
+                    if get_scheduler().is_open():
+                        # API が不調の間はスレッドを使わずに失敗させ、すぐにローカル採点を表示させる
+                        task._finish(error=CircuitOpenError(CIRCUIT_OPEN_MESSAGE))
+                    else:
+                        self._inflight[key] = task
+                        self._executor.submit(self._run, task)
+            self._tasks[session_key] = task
+        return task
+
+    # セッションのタスクを取得
+    def get(self, session_key):
+        with self._lock:
+            return self._tasks.get(session_key)
+
+    # セッションのタスクを破棄
+    def discard(self, session_key):
+        with self._lock:
+            self._tasks.pop(session_key, None)
+
+    # 実行中・待機中のタスク数
+    def pending_count(self):
+        with self._lock:
+            return len(self._inflight)
+
+    def _run(self, task):
+        try:
+            task._finish(result=run_ai_analysis(task.answers, on_text=task.parts.append))
+        except Exception as e:
+            task._finish(error=e)
+        finally:
+            with self._lock:
+                self._inflight.pop(task.key, None)
+
+    def _prune(self):
+        now = time.monotonic()
+        expired = [
+            session_key for session_key, task in self._tasks.items()
+            if task.done and now - task.finished_at > TASK_RETENTION_SECONDS
+        ]
+        for session_key in expired:
+            del self._tasks[session_key]
+
+
+# 最後の質問（last_idx。省略時は末尾の質問）の回答を、同じタイプの他の質問への回答から予測する（先行分析用）
+def predict_last_answer(answers, question_list, last_idx=None):
+    if last_idx is None:
+        last_idx = len(question_list) - 1
+    last_type = question_list[last_idx]["タイプ"]
+    same_type = [a for q_idx, a in answers.items() if question_list[q_idx]["タイプ"] == last_type]
+    pool = same_type or list(answers.values())
+    if not pool:
+        return 3
+    return min(5, max(1, int(round(sum(pool) / len(pool)))))
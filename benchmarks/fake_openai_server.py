@@ -0,0 +1,252 @@
+# 負荷試験用の OpenAI 互換サーバー（/v1/chat/completions のみ）
+# ネットワークや API キーなしで、応答の遅延・エラー率・ストリーミングの速度を再現する。
+# response_format が json_object の場合は構造化出力モードの JSON を、それ以外は
+# 「指揮官型: 85%」形式のスコアを含む分析テキストを返す。
+# --rate-limit を指定すると、--rate-window 秒あたりの上限を超えたリクエストに Retry-After 付きの 429 を返す。
+# プロバイダー側のプロンプトキャッシュも再現する。以前のリクエストと先頭が一致する部分のうち
+# --cache-min-tokens 以上・--cache-block-tokens 単位の長さをキャッシュ済みとして usage の
+# prompt_tokens_details.cached_tokens に返し、キャッシュされていない入力トークンごとに
+# --prefill-delay 秒だけ最初の応答を遅らせる。トークン数は1文字1トークンとして数える。
+#
+# 使い方:
+#   python benchmarks/fake_openai_server.py --port 8765 --latency 0.8 --error-rate 0.05 --token-delay 0.01
+#   OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=dummy streamlit run app.py
+#
+# --port 0 を指定すると空いているポートを使い、最初の行に base_url を出力する。
+import argparse
+import collections
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from type_data import TYPE_NAMES  # noqa: E402
+
+# ストリーミングで1回に送る文字数
+CHARS_PER_TOKEN = 2
+
+# プロンプトキャッシュの最小の長さと単位（トークン）
+CACHE_MIN_TOKENS = 1024
+CACHE_BLOCK_TOKENS = 128
+
+
+class FakeConfig:
+    def __init__(self, latency=0.5, jitter=0.0, error_rate=0.0, error_status=500, token_delay=0.0, seed=None,
+                 rate_limit=0, rate_window=60.0, prefill_delay=0.0, cache_min_tokens=CACHE_MIN_TOKENS,
+                 cache_block_tokens=CACHE_BLOCK_TOKENS):
+        self.latency = latency          # 最初の応答までの遅延（秒）
+        self.jitter = jitter            # 遅延のばらつき（±秒）
+        self.error_rate = error_rate    # エラー応答を返す割合（0〜1）
+        self.error_status = error_status
+        self.token_delay = token_delay  # ストリーミング時のトークンごとの遅延（秒）
+        self.rate_limit = rate_limit    # rate_window 秒あたりのリクエスト数の上限（0 は無制限）
+        self.rate_window = rate_window
+        self.prefill_delay = prefill_delay            # キャッシュされていない入力トークンごとの遅延（秒）
+        self.cache_min_tokens = cache_min_tokens
+        self.cache_block_tokens = cache_block_tokens
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.accepted_at = collections.deque()
+        self.cached_prefixes = set()
+
+    # レート制限を超える場合は、次に受け付けられるまでの秒数を返す（超えない場合は None）
+    def check_rate_limit(self, now):
+        if not self.rate_limit:
+            return None
+        while self.accepted_at and now - self.accepted_at[0] >= self.rate_window:
+            self.accepted_at.popleft()
+        if len(self.accepted_at) >= self.rate_limit:
+            return self.rate_window - (now - self.accepted_at[0])
+        self.accepted_at.append(now)
+        return None
+
+    # プロンプトの先頭のうち、以前のリクエストと一致してキャッシュ済みとみなすトークン数を返し、先頭部分を記録する
+    def cached_prefix_tokens(self, prompt):
+        cached = 0
+        for length in range(self.cache_min_tokens, len(prompt) + 1, self.cache_block_tokens):
+            digest = hashlib.sha256(prompt[:length].encode("utf-8")).digest()
+            if digest in self.cached_prefixes:
+                cached = length
+            else:
+                self.cached_prefixes.add(digest)
+        return cached
+
+
+# プロンプトの内容から決まる、再現可能なスコアと分析テキスト
+def fake_analysis(messages):
+    prompt = "".join(str(m.get("content", "")) for m in messages)
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+    scores = {t: rng.randint(20, 95) for t in TYPE_NAMES}
+    main_type = max(TYPE_NAMES, key=lambda t: scores[t])
+    rationale = f"回答の傾向から、{main_type}の特徴が最も強く表れています。" * 3
+    return main_type, scores, rationale
+
+
+def fake_content(request):
+    main_type, scores, rationale = fake_analysis(request.get("messages", []))
+    if (request.get("response_format") or {}).get("type") == "json_object":
+        return json.dumps({"main_type": main_type, "scores": scores, "rationale": rationale}, ensure_ascii=False)
+    lines = [f"あなたの継続力タイプは{main_type}です。", "", rationale, "", "各タイプのスコア:"]
+    lines.extend(f"{t}: {scores[t]}%" for t in TYPE_NAMES)
+    return "\n".join(lines)
+
+
+def token_count(text):
+    return max(1, len(text))
+
+
+# メッセージを連結したプロンプト（キャッシュの判定に使う。先頭が一致するかどうかだけを見る）
+def prompt_text(messages):
+    return "".join(f"<{m.get('role')}>{m.get('content', '')}" for m in messages)
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        config = self.server.config
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"unknown path: {self.path}", "type": "invalid_request_error"}})
+            return
+
+        with config.lock:
+            config.requests += 1
+            retry_after = config.check_rate_limit(time.monotonic())
+            if retry_after is not None:
+                config.rate_limited += 1
+        if retry_after is not None:
+            self.send_json(429, {"error": {"message": "rate limit exceeded", "type": "rate_limit_error"}},
+                           {"Retry-After": f"{retry_after:.2f}"})
+            return
+
+        prompt = prompt_text(request.get("messages", []))
+        with config.lock:
+            delay = max(0.0, config.latency + config.random.uniform(-config.jitter, config.jitter))
+            failed = config.random.random() < config.error_rate
+            if failed:
+                config.errors += 1
+            cached_tokens = config.cached_prefix_tokens(prompt) if not failed else 0
+        prompt_tokens = token_count(prompt)
+        time.sleep(delay + (prompt_tokens - cached_tokens) * config.prefill_delay)
+
+        if failed:
+            self.send_json(config.error_status, {"error": {"message": "fake server error", "type": "server_error"}})
+            return
+
+        content = fake_content(request)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": token_count(content),
+                 "total_tokens": prompt_tokens + token_count(content),
+                 "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+        base = {"id": f"chatcmpl-fake{config.requests}", "created": int(time.time()), "model": request.get("model", "fake")}
+
+        if not request.get("stream"):
+            self.send_json(200, dict(base, object="chat.completion", usage=usage, choices=[
+                {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+            ]))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send_event(choice):
+            data = json.dumps(dict(base, object="chat.completion.chunk", choices=[dict(index=0, **choice)]), ensure_ascii=False)
+            self.send_chunk(f"data: {data}\n\n")
+
+        send_event({"delta": {"role": "assistant", "content": ""}, "finish_reason": None})
+        for i in range(0, len(content), CHARS_PER_TOKEN):
+            if config.token_delay:
+                time.sleep(config.token_delay)
+            send_event({"delta": {"content": content[i:i + CHARS_PER_TOKEN]}, "finish_reason": None})
+        send_event({"delta": {}, "finish_reason": "stop"})
+        # stream_options.include_usage を指定した場合は、最後に choices が空で usage を含むチャンクを送る
+        if (request.get("stream_options") or {}).get("include_usage"):
+            data = json.dumps(dict(base, object="chat.completion.chunk", choices=[], usage=usage), ensure_ascii=False)
+            self.send_chunk(f"data: {data}\n\n")
+        self.send_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def send_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config):
+        super().__init__(address, FakeOpenAIHandler)
+        self.config = config
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+# サーバーを別スレッドで起動（同じプロセス内で使う場合）
+def start_server(config, host="127.0.0.1", port=0):
+    server = FakeOpenAIServer((host, port), config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="負荷試験用の OpenAI 互換サーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="0 で空いているポートを使う")
+    parser.add_argument("--latency", type=float, default=0.5, help="最初の応答までの遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延のばらつき（±秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="エラー応答を返す割合（0〜1）")
+    parser.add_argument("--error-status", type=int, default=500, help="エラー応答の HTTP ステータス（429 など）")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="ストリーミング時のトークンごとの遅延（秒）")
+    parser.add_argument("--rate-limit", type=int, default=0, help="--rate-window 秒あたりのリクエスト数の上限（超えると 429）")
+    parser.add_argument("--rate-window", type=float, default=60.0)
+    parser.add_argument("--prefill-delay", type=float, default=0.0, help="キャッシュされていない入力トークンごとの遅延（秒）")
+    parser.add_argument("--cache-min-tokens", type=int, default=CACHE_MIN_TOKENS, help="プロンプトキャッシュの最小の長さ（トークン）")
+    parser.add_argument("--cache-block-tokens", type=int, default=CACHE_BLOCK_TOKENS, help="プロンプトキャッシュの単位（トークン）")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    config = FakeConfig(args.latency, args.jitter, args.error_rate, args.error_status, args.token_delay, args.seed,
+                        args.rate_limit, args.rate_window, args.prefill_delay, args.cache_min_tokens,
+                        args.cache_block_tokens)
+    server = FakeOpenAIServer((args.host, args.port), config)
+    print(server.base_url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"requests: {config.requests} / errors: {config.errors} / rate limited: {config.rate_limited}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
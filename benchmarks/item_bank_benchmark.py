@@ -0,0 +1,151 @@
+# 項目バンクの読み込みの計測: 質問数・言語数・解説文の長さを増やした合成の項目バンクを作り、
+# プロセスの起動直後に質問文と1タイプ分の定義を読むまでの時間とメモリの増加量を、
+# すべての内容を読み込む方法（従来のモジュール内リテラルに相当）と比較する。
+# メモリはプロセス固有の RssAnon で比べる（mmap したファイルのページは RssFile に数えられ、
+# ページキャッシュとしてワーカー間で共有される）。
+#
+# 使い方:
+#   python benchmarks/item_bank_benchmark.py
+#   python benchmarks/item_bank_benchmark.py --cases 10:1:1 1000:10:50 --json
+#
+# ケースは「質問数:言語数:解説文の倍率」で指定する。別プロセスで計測する。
+import argparse
+import copy
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.join(APP_DIR, "tools"))
+
+from build_item_bank import load_sources, build_bank  # noqa: E402
+
+DEFAULT_CASES = ["10:1:1", "250:4:10", "1000:10:50"]
+PROSE_FIELDS = ["四柱推命", "陰陽五行"]
+
+
+# 元データ（日本語）を、質問数・言語数・解説文の長さを増やした合成データに広げる
+def synthesize_sources(base, n_items, n_languages, prose_scale):
+    sources = {}
+    for lang_idx in range(n_languages):
+        language = base["language"] if lang_idx == 0 else f"x{lang_idx:02d}"
+        source = copy.deepcopy(base)
+        source["language"] = language
+        for t in source["types"]:
+            for field in PROSE_FIELDS:
+                t[field] = f"[{language}] " + t[field] * prose_scale
+        source["items"] = [
+            {"id": f"q{i + 1:05d}", "type": base["items"][i % len(base["items"])]["type"],
+             "質問": f"[{language}] {base['items'][i % len(base['items'])]['質問']}（{i + 1}）"}
+            for i in range(n_items)
+        ]
+        sources[language] = source
+    return sources
+
+
+# 子プロセスで実行する計測コード（bank: 項目バンクから必要な分だけ / eager: 元データをすべて読み込む）
+PROBE = r"""
+import json, sys, time
+sys.path.insert(0, sys.argv[1])
+
+def rss_kb(field="RssAnon"):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+
+mode, path, language = sys.argv[2], sys.argv[3], sys.argv[4]
+import item_bank
+
+before = rss_kb()
+start = time.perf_counter()
+if mode == "bank":
+    bank = item_bank.ItemBank(path)
+    bank.question_texts(language)
+    bank.type_content(0, language)
+    load_seconds = time.perf_counter() - start
+    rss_bytes = (rss_kb() - before) * 1024
+    # 未読み込みのタイプ定義の読み込みと、キャッシュ済みの参照
+    start = time.perf_counter()
+    for type_id in range(1, len(bank.type_names)):
+        bank.type_content(type_id, language)
+    miss_seconds = (time.perf_counter() - start) / (len(bank.type_names) - 1)
+    start = time.perf_counter()
+    for _ in range(1000):
+        bank.type_content(0, language)
+    hit_seconds = (time.perf_counter() - start) / 1000
+else:
+    sources = [json.load(open(p, encoding="utf-8")) for p in path.split(",")]
+    load_seconds = time.perf_counter() - start
+    rss_bytes = (rss_kb() - before) * 1024
+    miss_seconds = hit_seconds = None
+print(json.dumps({"load_seconds": load_seconds, "rss_bytes": rss_bytes,
+                  "miss_seconds": miss_seconds, "hit_seconds": hit_seconds}))
+"""
+
+
+def probe(mode, path, language):
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE, APP_DIR, mode, path, language],
+        cwd=APP_DIR, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_case(base, case, workdir):
+    n_items, n_languages, prose_scale = (int(v) for v in case.split(":"))
+    sources = synthesize_sources(base, n_items, n_languages, prose_scale)
+    case_dir = os.path.join(workdir, case.replace(":", "_"))
+    os.makedirs(case_dir)
+    source_paths = []
+    for language, source in sources.items():
+        path = os.path.join(case_dir, f"{language}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(source, f, ensure_ascii=False)
+        source_paths.append(path)
+    bank_path = os.path.join(case_dir, "item_bank.bin")
+    with open(bank_path, "wb") as f:
+        f.write(build_bank(sources, base["language"]))
+
+    return {
+        "case": case,
+        "items": n_items,
+        "languages": n_languages,
+        "prose_scale": prose_scale,
+        "bank_bytes": os.path.getsize(bank_path),
+        "bank": probe("bank", bank_path, base["language"]),
+        "eager": probe("eager", ",".join(source_paths), base["language"])
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="項目バンクの読み込み時間とメモリ使用量の計測")
+    parser.add_argument("--cases", nargs="+", default=DEFAULT_CASES, help="質問数:言語数:解説文の倍率")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+    args = parser.parse_args(argv)
+    if not os.path.exists("/proc/self/status"):
+        print("RSS を計測できない環境です（/proc が必要）", file=sys.stderr)
+        return 1
+
+    base = load_sources()["ja"]
+    with tempfile.TemporaryDirectory() as workdir:
+        report = [run_case(base, case, workdir) for case in args.cases]
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+    for entry in report:
+        bank, eager = entry["bank"], entry["eager"]
+        print(f"質問 {entry['items']}問 × {entry['languages']}言語 × 解説文 {entry['prose_scale']}倍"
+              f"（項目バンク {entry['bank_bytes'] / 1024:.0f}KB）")
+        print(f"  項目バンク: 読み込み {bank['load_seconds'] * 1000:.2f}ms / RssAnon +{bank['rss_bytes'] / 1024:.0f}KB"
+              f" / タイプ定義 初回 {bank['miss_seconds'] * 1e6:.0f}µs・キャッシュ {bank['hit_seconds'] * 1e6:.2f}µs")
+        print(f"  すべて読み込み: 読み込み {eager['load_seconds'] * 1000:.2f}ms / RssAnon +{eager['rss_bytes'] / 1024:.0f}KB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,378 @@
+# 同時セッションの負荷試験: app.py を `streamlit run` で1インスタンス起動し、N 人の仮想ユーザーが
+# WebSocket（ブラウザと同じ /_stcore/stream のプロトコル）で同時に接続して、10問の回答ボタンの
+# クリックから AI 分析の表示までを実行する。OpenAI API の代わりに fake_openai_server.py を
+# 別プロセスで起動するため、ネットワークや API キーは不要。
+#
+# 使い方:
+#   python benchmarks/load_test.py --users 50                          # 50人を同時に実行
+#   python benchmarks/load_test.py --users 100 --ramp-seconds 10 --latency 1.5 --error-rate 0.05
+#   python benchmarks/load_test.py --users 50 --no-streaming --max-click-p95 0.5   # 上限を超えたら終了コード 1
+#
+# 計測する値:
+#   クリック: 回答ボタンを押してから、次の質問の描画（スクリプトの実行）が終わるまで（最後の質問を除く）
+#   分析: 最後の回答ボタンを押してから、AI 分析のテキストを含む結果画面の描画が終わるまで
+#   CPU・メモリ: app.py のサーバープロセスの CPU 時間と RSS（偽サーバーと仮想ユーザーの分は含まない）
+#
+# 仮想ユーザーはボタンのクリックを、ブラウザと同じくウィジェットの trigger 値と fragment_id を付けた
+# 再実行要求として送る。run_every のフラグメント（ストリーミング表示）も、ブラウザと同じ間隔で再実行を要求する。
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_SERVER_PATH = os.path.join(APP_DIR, "benchmarks", "fake_openai_server.py")
+sys.path.insert(0, APP_DIR)
+
+from type_data import questions  # noqa: E402
+from scoring import LOCAL_ANALYSIS_TEXT  # noqa: E402
+
+# サーバーの起動・分析結果の表示を待つ上限（秒）
+STARTUP_TIMEOUT_SECONDS = 60
+ANALYSIS_TIMEOUT_SECONDS = 120
+# サーバープロセスの CPU・メモリを記録する間隔（秒）
+SAMPLE_INTERVAL_SECONDS = 0.2
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# 偽サーバーを別プロセスで起動し、base_url を返す
+def start_fake_server(args):
+    command = [
+        sys.executable, FAKE_SERVER_PATH, "--port", "0",
+        "--latency", str(args.latency), "--jitter", str(args.jitter),
+        "--error-rate", str(args.error_rate), "--error-status", str(args.error_status),
+        "--token-delay", str(args.token_delay), "--seed", str(args.seed)
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    return process, process.stdout.readline().strip()
+
+
+# app.py を streamlit run で起動し、ヘルスチェックが通るまで待つ
+def start_app_server(args, base_url, port):
+    env = dict(
+        os.environ,
+        OPENAI_BASE_URL=base_url,
+        OPENAI_API_KEY="fake",
+        OPENAI_MAX_RETRIES="0",
+        ANALYSIS_CACHE_PATH="",
+        ANALYSIS_PREFETCH="False",
+        # 仮想ユーザーは10問すべてに回答する（適応型の出題では回答によって出題数が変わるため）
+        ADAPTIVE_QUESTIONS="False",
+        ANALYSIS_STREAMING=str(args.streaming),
+        ANALYSIS_OUTPUT_MODE=args.output_mode,
+        ANALYSIS_DECISION_MODE=args.decision_mode,
+        ANALYSIS_MAX_CONCURRENCY=os.getenv("ANALYSIS_MAX_CONCURRENCY", str(max(16, args.users)))
+    )
+    command = [
+        sys.executable, "-m", "streamlit", "run", "app.py",
+        "--server.headless", "true", "--server.address", "127.0.0.1", "--server.port", str(port),
+        "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"
+    ]
+    process = subprocess.Popen(command, cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    deadline = time.monotonic() + STARTUP_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"app.py の起動に失敗しました:\n{process.stderr.read()}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("app.py の起動がタイムアウトしました")
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered) + 0.5) - 1))]
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None
+    }
+
+
+# /proc から、プロセスの CPU 時間（秒）と RSS（MB）を読む
+def process_usage(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    cpu_seconds = (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    with open(f"/proc/{pid}/status") as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+    return cpu_seconds, rss_kb / 1024
+
+
+# ブラウザの代わりに1つのセッションを操作する WebSocket クライアント
+class StreamlitSession:
+    def __init__(self, connection):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        self.connection = connection
+        self.finished_status = ForwardMsg.ScriptFinishedStatus
+        self.page_script_hash = ""
+        self.cached_messages = {}
+        self.buttons = {}        # ボタンのラベル → (ウィジェット ID, フラグメント ID)
+        self.markdowns = []      # 最後の画面全体の実行で表示された markdown
+        self.error_alerts = 0    # 最後の画面全体の実行で表示された st.error の数
+        self.auto_reruns = {}    # run_every のフラグメント ID → 再実行の間隔（秒）
+
+    # スクリプトの再実行を要求（ボタンのクリックは trigger 値として送る）
+    async def rerun(self, widget=None, fragment_id=""):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = self.page_script_hash
+        if widget is not None:
+            widget_id, fragment_id = widget
+            state = msg.rerun_script.widget_states.widgets.add()
+            state.id = widget_id
+            state.trigger_value = True
+        msg.rerun_script.fragment_id = fragment_id
+        await self.connection.write_message(msg.SerializeToString(), binary=True)
+        return await self.wait_finished()
+
+    # スクリプトの実行が終わるまでメッセージを受け取る（st.rerun による途中終了は待ち続ける）
+    async def wait_finished(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        while True:
+            data = await self.connection.read_message()
+            if data is None:
+                raise ConnectionError("WebSocket が切断されました")
+            msg = ForwardMsg()
+            msg.ParseFromString(data)
+            if msg.WhichOneof("type") == "ref_hash":
+                msg = self.cached_messages[msg.ref_hash]
+            elif msg.metadata.cacheable:
+                self.cached_messages[msg.hash] = msg
+
+            kind = msg.WhichOneof("type")
+            if kind == "new_session":
+                # 画面全体の実行の開始
+                self.page_script_hash = msg.new_session.page_script_hash
+                self.markdowns = []
+                self.error_alerts = 0
+                self.auto_reruns = {}
+            elif kind == "delta":
+                self.on_delta(msg.delta)
+            elif kind == "auto_rerun":
+                self.auto_reruns[msg.auto_rerun.fragment_id] = msg.auto_rerun.interval
+            elif kind == "script_finished" and msg.script_finished != self.finished_status.FINISHED_EARLY_FOR_RERUN:
+                if msg.script_finished == self.finished_status.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("app.py の実行に失敗しました")
+                return msg.script_finished
+
+    def on_delta(self, delta):
+        if not delta.HasField("new_element"):
+            return
+        element = delta.new_element
+        kind = element.WhichOneof("type")
+        if kind == "button":
+            self.buttons[element.button.label] = (element.button.id, delta.fragment_id)
+        elif kind == "markdown":
+            self.markdowns.append(element.markdown.body)
+        elif kind == "alert" and element.alert.format == element.alert.ERROR:
+            self.error_alerts += 1
+
+    def rating_button(self, rating):
+        return next(widget for label, widget in self.buttons.items() if label.startswith(f"{rating}:"))
+
+    # run_every のフラグメントがなくなるまで、ブラウザと同じ間隔で再実行を要求する
+    async def follow_auto_reruns(self, deadline):
+        while self.auto_reruns and time.perf_counter() < deadline:
+            fragment_id, interval = next(iter(self.auto_reruns.items()))
+            await asyncio.sleep(interval)
+            await self.rerun(fragment_id=fragment_id)
+
+
+class VirtualUser:
+    def __init__(self, user_id, seed):
+        self.user_id = user_id
+        self.random = random.Random(seed)
+        self.click_seconds = []
+        self.analysis_seconds = None
+        self.analysis_ok = False
+        self.error = None
+
+    async def run(self, url, think_seconds):
+        from tornado.websocket import websocket_connect
+
+        connection = None
+        try:
+            connection = await websocket_connect(url, max_message_size=64 * 1024 * 1024)
+            session = StreamlitSession(connection)
+            await session.rerun()
+
+            for q_idx in range(len(questions)):
+                if think_seconds:
+                    await asyncio.sleep(self.random.uniform(0, 2 * think_seconds))
+                button = session.rating_button(self.random.randint(1, 5))
+                start = time.perf_counter()
+                await session.rerun(widget=button)
+                if q_idx < len(questions) - 1:
+                    self.click_seconds.append(time.perf_counter() - start)
+
+            # ストリーミング表示の場合は、分析が終わって結果画面が描き直されるまで待つ
+            await session.follow_auto_reruns(start + ANALYSIS_TIMEOUT_SECONDS)
+            self.analysis_seconds = time.perf_counter() - start
+            # AI分析に失敗した場合は、エラーとローカル採点の分析テキストが表示される
+            analysis_texts = [body for body in session.markdowns if "ai-analysis-item" in body]
+            self.analysis_ok = (
+                not session.auto_reruns and not session.error_alerts and bool(analysis_texts)
+                and not any(LOCAL_ANALYSIS_TEXT in body for body in analysis_texts)
+            )
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            if connection is not None:
+                connection.close()
+
+
+async def run_users(args, port):
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    users = [VirtualUser(i, args.seed + i) for i in range(args.users)]
+
+    async def start(i, user):
+        if args.ramp_seconds and args.users > 1:
+            await asyncio.sleep(args.ramp_seconds * i / (args.users - 1))
+        await user.run(url, args.think_seconds)
+
+    await asyncio.gather(*(start(i, user) for i, user in enumerate(users)))
+    return users
+
+
+async def sample_usage(pid, samples, stop):
+    while not stop.is_set():
+        samples.append(process_usage(pid))
+        try:
+            await asyncio.wait_for(stop.wait(), SAMPLE_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_load(args, app_pid, port):
+    samples = []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(sample_usage(app_pid, samples, stop))
+    cpu_before, rss_before = process_usage(app_pid)
+    start = time.perf_counter()
+    users = await run_users(args, port)
+    wall = time.perf_counter() - start
+    cpu_after, rss_after = process_usage(app_pid)
+    stop.set()
+    await sampler
+
+    cpu_seconds = cpu_after - cpu_before
+    clicks = [s for user in users for s in user.click_seconds]
+    analyses = [user.analysis_seconds for user in users if user.analysis_seconds is not None]
+    return {
+        "users": args.users,
+        "streaming": args.streaming,
+        "output_mode": args.output_mode,
+        "decision_mode": args.decision_mode,
+        "wall_seconds": wall,
+        "click_seconds": summarize(clicks),
+        "analysis_seconds": summarize(analyses),
+        "analysis_ok": sum(user.analysis_ok for user in users),
+        "user_errors": [user.error for user in users if user.error],
+        "cpu_seconds": cpu_seconds,
+        "cpu_utilization": cpu_seconds / wall if wall else None,
+        "rss_start_mb": rss_before,
+        "rss_end_mb": rss_after,
+        "rss_peak_mb": max([rss for _, rss in samples] + [rss_after])
+    }
+
+
+def print_report(report):
+    def row(label, stats):
+        if not stats["count"]:
+            print(f"  {label}: -")
+            return
+        print(
+            f"  {label}: p50 {stats['p50'] * 1000:.0f}ms / p95 {stats['p95'] * 1000:.0f}ms / "
+            f"p99 {stats['p99'] * 1000:.0f}ms / 最大 {stats['max'] * 1000:.0f}ms（{stats['count']}件）"
+        )
+
+    mode = "ストリーミング" if report["streaming"] else "分析完了まで待つ"
+    print(f"仮想ユーザー {report['users']}人（{mode} / {report['output_mode']} / {report['decision_mode']}） / 所要時間 {report['wall_seconds']:.1f}秒")
+    row("クリック→描画", report["click_seconds"])
+    row("最後の回答→AI分析の表示", report["analysis_seconds"])
+    print(f"  AI分析の成功: {report['analysis_ok']}/{report['users']}")
+    print(f"  サーバー CPU: {report['cpu_seconds']:.1f}秒（平均 {report['cpu_utilization']:.2f} コア）")
+    print(f"  サーバー RSS: {report['rss_start_mb']:.0f}MB → {report['rss_end_mb']:.0f}MB（最大 {report['rss_peak_mb']:.0f}MB）")
+    for error in report["user_errors"][:5]:
+        print(f"  エラー: {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="app.py の同時セッション負荷試験")
+    parser.add_argument("--users", type=int, default=20, help="同時に実行する仮想ユーザー数")
+    parser.add_argument("--ramp-seconds", type=float, default=0.0, help="全員が開始するまでの時間（秒）")
+    parser.add_argument("--think-seconds", type=float, default=0.0, help="回答の間の平均待ち時間（秒）")
+    parser.add_argument("--streaming", action=argparse.BooleanOptionalAction, default=True,
+                        help="結果画面を先に表示してAI分析をストリーミング表示する（ANALYSIS_STREAMING）")
+    parser.add_argument("--output-mode", choices=["structured", "text"], default="structured")
+    parser.add_argument("--decision-mode", choices=["llm", "hybrid"], default="llm",
+                        help="判定モード（ANALYSIS_DECISION_MODE。hybrid では主要タイプがはっきりした回答は API を呼び出さない）")
+    parser.add_argument("--latency", type=float, default=0.5, help="偽サーバーの応答遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.1, help="偽サーバーの応答遅延のばらつき（±秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="偽サーバーがエラーを返す割合（0〜1）")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--token-delay", type=float, default=0.0, help="偽サーバーのトークンごとの遅延（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-click-p95", type=float, help="クリック→描画の p95 の上限（秒）")
+    parser.add_argument("--max-analysis-p95", type=float, help="AI分析の表示までの p95 の上限（秒）")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+    args = parser.parse_args(argv)
+
+    fake_server, base_url = start_fake_server(args)
+    app_server = None
+    try:
+        port = free_port()
+        app_server = start_app_server(args, base_url, port)
+        report = asyncio.run(run_load(args, app_server.pid, port))
+    finally:
+        for process in (app_server, fake_server):
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+    failures = []
+    if report["user_errors"]:
+        failures.append(f"仮想ユーザーの実行に失敗しました: {len(report['user_errors'])}件")
+    if args.max_click_p95 is not None and (report["click_seconds"]["p95"] or 0) > args.max_click_p95:
+        failures.append(f"クリック→描画の p95 が上限を超えました: {report['click_seconds']['p95']:.3f}秒")
+    if args.max_analysis_p95 is not None and (report["analysis_seconds"]["p95"] or 0) > args.max_analysis_p95:
+        failures.append(f"AI分析の表示までの p95 が上限を超えました: {report['analysis_seconds']['p95']:.3f}秒")
+    for failure in failures:
+        print(f"NG: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
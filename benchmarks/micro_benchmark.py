@@ -0,0 +1,393 @@
+# ホットパスのマイクロベンチマークと、保存した基準値との比較
+# 次の処理の1回あたりの時間を計測し、JSON の基準値として保存する。compare は基準値と比べ、
+# 最短時間が --threshold を超えて遅くなった処理があれば終了コード 1 を返す（変更前後の比較・CI 用）。
+# 比較には repeat 回のうち最短の時間を使う（ほかの処理の割り込みによる揺れは遅くなる方向にしか出ないため）。
+#   score_single      : 1人分の回答のローカル採点
+#   score_1m          : 100万人分の回答の行列のローカル採点
+#   prompt_text       : テキストモードのメッセージの作成
+#   prompt_structured : 構造化出力モードのメッセージと詳細分析のプロンプトの作成
+#   parse_text        : 分析テキスト 200件からのタイプ・スコアの抽出（SCORE_PATTERN）
+#   parse_structured  : 構造化出力（JSON）200件の検証
+#   render_result     : 結果画面の描画（Streamlit の AppTest で app.py を再実行）
+#   session           : 10問の回答から AI分析の表示まで（偽の OpenAI 互換サーバーを使う）
+#
+# 分析テキストのコーパスは、偽サーバー（fake_openai_server.py）の応答に、表記の揺れ（全角のコロン・％、
+# パーセント記号なし、箇条書き、スコアの欠落）を加えて作る。AI分析は偽サーバーを同じプロセスで起動して使い、
+# キャッシュ・結果の保存・ハイブリッド判定・適応型の出題は無効にして、毎回 API を呼び出す10問の回答を計測する。
+#
+# 使い方:
+#   python benchmarks/micro_benchmark.py run --save .cache/micro_baseline.json   # 基準値を保存
+#   python benchmarks/micro_benchmark.py compare .cache/micro_baseline.json      # 計測して基準値と比較
+#   python benchmarks/micro_benchmark.py compare base.json --current head.json --threshold 0.2
+#   python benchmarks/micro_benchmark.py run --only "score_*" "parse_*"
+import argparse
+import fnmatch
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Callable, NamedTuple, Optional
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+FORMAT_VERSION = 1
+
+# 遅くなったとみなす最短時間の増加率（0.25 は基準値の 1.25 倍）
+DEFAULT_THRESHOLD = 0.25
+
+# 1回の計測（repeat のうち1回）の最短時間。これに届くまで呼び出し回数を増やす
+MIN_SAMPLE_SECONDS = 0.2
+
+CORPUS_SIZE = 200
+
+
+class Case(NamedTuple):
+    name: str
+    setup: Callable[[], Callable[[], object]]  # 計測する関数を返す（準備の時間は計測しない）
+    repeat: int = 7
+    threshold: Optional[float] = None          # ばらつきの大きい処理の増加率の上限（None は --threshold）
+
+
+def random_answers(rng):
+    from type_data import questions
+
+    return bytearray(rng.randint(1, 5) for _ in questions)
+
+
+# --- 計測する処理 ---
+
+def setup_score_single():
+    from scoring import score_answers
+
+    answers = random_answers(random.Random(0))
+    return lambda: score_answers(answers)
+
+
+def setup_score_1m():
+    import numpy as np
+    from scoring import score_answers
+    from type_data import questions
+
+    matrix = np.random.default_rng(0).integers(1, 6, size=(1_000_000, len(questions)))
+    return lambda: score_answers(matrix)
+
+
+def setup_prompt_text():
+    from analysis import build_messages
+
+    rng = random.Random(0)
+    answers = itertools.cycle([random_answers(rng) for _ in range(100)])
+    return lambda: build_messages(next(answers))
+
+
+def setup_prompt_structured():
+    from analysis import build_structured_messages, answers_to_dict, TEMPLATE
+    from type_data import TYPE_NAMES, personality_types
+
+    rng = random.Random(0)
+    answers = itertools.cycle([random_answers(rng) for _ in range(100)])
+
+    def build():
+        current = next(answers)
+        build_structured_messages(current)
+        return TEMPLATE.narrative_prompt(answers_to_dict(current), TYPE_NAMES[0], personality_types[TYPE_NAMES[0]]["英語名"])
+
+    return build
+
+
+# 分析テキストのコーパス（[(テキスト, 回答)]）
+def text_corpus(size=CORPUS_SIZE, seed=0):
+    from fake_openai_server import fake_content
+    from type_data import TYPE_NAMES
+
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(size):
+        answers = random_answers(rng)
+        text = fake_content({"messages": [{"role": "user", "content": f"{i}:{answers.hex()}"}]})
+        variant = i % 5
+        if variant == 1:
+            text = text.replace(": ", "：").replace("%", "％")
+        elif variant == 2:
+            text = text.replace("%", "")
+        elif variant == 3:
+            text = "\n".join(f"- {line}" if line.split(":")[0] in TYPE_NAMES else line for line in text.split("\n"))
+        elif variant == 4:
+            text = "\n".join(line for line in text.split("\n") if not line.startswith(TYPE_NAMES[i % len(TYPE_NAMES)] + ":"))
+        corpus.append((text, answers))
+    return corpus
+
+
+def setup_parse_text():
+    from analysis import parse_analysis
+
+    corpus = text_corpus()
+    return lambda: [parse_analysis(text, answers) for text, answers in corpus]
+
+
+def setup_parse_structured():
+    from analysis import parse_structured_analysis
+    from fake_openai_server import fake_content
+
+    corpus = [
+        fake_content({"messages": [{"role": "user", "content": str(i)}], "response_format": {"type": "json_object"}})
+        for i in range(CORPUS_SIZE)
+    ]
+    return lambda: [parse_structured_analysis(content) for content in corpus]
+
+
+def app_test():
+    from streamlit.testing.v1 import AppTest
+
+    return AppTest.from_file(os.path.join(APP_DIR, "app.py"), default_timeout=60)
+
+
+# 10問に回答して結果画面を表示する（回答ごとに評価のボタンをクリックする）
+def answer_all(at, rng):
+    at.run()
+    while at.session_state.result is None:
+        at.button[rng.randint(1, 5) - 1].click().run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return at
+
+
+def setup_render_result():
+    at = answer_all(app_test(), random.Random(0))
+    return lambda: at.run()
+
+
+def setup_session():
+    rng = random.Random(0)
+    return lambda: answer_all(app_test(), rng)
+
+
+CASES = [
+    Case("score_single", setup_score_single),
+    Case("score_1m", setup_score_1m, repeat=5),
+    Case("prompt_text", setup_prompt_text),
+    Case("prompt_structured", setup_prompt_structured),
+    Case("parse_text", setup_parse_text),
+    Case("parse_structured", setup_parse_structured),
+    Case("render_result", setup_render_result, repeat=5, threshold=0.5),
+    Case("session", setup_session, repeat=5, threshold=0.5),
+]
+
+
+# --- 計測 ---
+
+def timed(func, loops):
+    started = time.perf_counter()
+    for _ in range(loops):
+        func()
+    return time.perf_counter() - started
+
+
+# 1回の計測が MIN_SAMPLE_SECONDS 以上になる呼び出し回数を決めてから、repeat 回計測する（1回あたりの秒）
+def measure(func, repeat, min_seconds=MIN_SAMPLE_SECONDS):
+    loops = 1
+    while True:
+        elapsed = timed(func, loops)
+        if elapsed >= min_seconds:
+            break
+        loops = max(loops * 2, int(loops * min_seconds / max(elapsed, 1e-9) * 1.2))
+    samples = [timed(func, loops) / loops for _ in range(repeat)]
+    return {
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "max": max(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "loops": loops,
+        "repeat": repeat
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def machine_info():
+    import numpy as np
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__
+    }
+
+
+# 偽サーバーを起動し、AI分析が毎回同じ条件で API を呼び出すように設定する（分析のモジュールを読み込む前に行う）
+def prepare_environment():
+    from fake_openai_server import FakeConfig, start_server
+
+    server = start_server(FakeConfig(latency=0.0, seed=0))
+    os.environ.update(
+        OPENAI_BASE_URL=server.base_url,
+        OPENAI_API_KEY="fake",
+        ANALYSIS_CACHE_PATH="",
+        ANALYSIS_STREAMING="False",
+        ANALYSIS_OUTPUT_MODE="structured",
+        ANALYSIS_NARRATIVE="False",
+        ANALYSIS_DECISION_MODE="llm",
+        ADAPTIVE_QUESTIONS="False",
+        RESULTS_STORE_PATH="",
+        LLM_USAGE_LOG_PATH="",
+        NARRATIVE_PACK_PATH="",
+        APP_DEBUG="False"
+    )
+    return server
+
+
+def run_cases(patterns=None):
+    cases = [case for case in CASES if not patterns or any(fnmatch.fnmatch(case.name, p) for p in patterns)]
+    if not cases:
+        raise ValueError(f"一致する処理がありません: {' '.join(patterns)}（{', '.join(case.name for case in CASES)}）")
+    server = prepare_environment()
+    results = {}
+    try:
+        for case in cases:
+            results[case.name] = measure(case.setup(), case.repeat)
+            print(f"  {case.name}: {format_seconds(results[case.name]['min'])}", file=sys.stderr, flush=True)
+    finally:
+        server.shutdown()
+    return {
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "machine": machine_info(),
+        "results": results
+    }
+
+
+def format_seconds(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f}µs"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds:.2f}s"
+
+
+def load_report(path):
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    if report.get("format_version") != FORMAT_VERSION:
+        raise ValueError(f"{path} は未対応の形式です: {report.get('format_version')}")
+    return report
+
+
+def save_report(report, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+# 基準値と比べた処理ごとの (名前, 基準値, 今回, 比, 上限, 判定)
+def compare_reports(baseline, current, threshold):
+    thresholds = {case.name: case.threshold for case in CASES}
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            rows.append((name, None, result["min"], None, None, "new"))
+            continue
+        limit = 1 + (thresholds.get(name) or threshold)
+        ratio = result["min"] / base["min"]
+        rows.append((name, base["min"], result["min"], ratio, limit, "slower" if ratio > limit else "ok"))
+    return rows
+
+
+def print_results(report):
+    print(f"{'処理':<20}{'中央値':>12}{'最小':>12}{'回数':>10}")
+    for name, result in report["results"].items():
+        print(f"{name:<20}{format_seconds(result['median']):>12}{format_seconds(result['min']):>12}"
+              f"{result['loops']:>7}×{result['repeat']}")
+
+
+def print_comparison(rows):
+    print(f"{'処理':<20}{'基準値':>12}{'今回':>12}{'比':>8}  判定")
+    for name, base, current, ratio, limit, status in rows:
+        if base is None:
+            print(f"{name:<20}{'-':>12}{format_seconds(current):>12}{'-':>8}  基準値なし")
+            continue
+        label = f"遅くなりました（上限 {limit:.2f}倍）" if status == "slower" else "ok"
+        print(f"{name:<20}{format_seconds(base):>12}{format_seconds(current):>12}{ratio:>7.2f}x  {label}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ホットパスのマイクロベンチマーク")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="計測する")
+    run_parser.add_argument("--only", nargs="+", metavar="PATTERN", help="計測する処理の名前（ワイルドカード可）")
+    run_parser.add_argument("--save", metavar="PATH", help="結果を基準値として JSON で保存する")
+    run_parser.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+
+    compare_parser = subparsers.add_parser("compare", help="基準値と比較する（遅くなった処理があれば終了コード 1）")
+    compare_parser.add_argument("baseline", help="基準値の JSON")
+    compare_parser.add_argument("--current", help="比較する結果の JSON（省略時はその場で計測する）")
+    compare_parser.add_argument("--only", nargs="+", metavar="PATTERN", help="計測する処理の名前（ワイルドカード可）")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="遅くなったとみなす最短時間の増加率（0.25 は基準値の 1.25 倍）")
+    compare_parser.add_argument("--retries", type=int, default=2,
+                                help="その場で計測した場合に、遅くなった処理だけを計測し直す回数")
+    compare_parser.add_argument("--save", metavar="PATH", help="今回の結果を JSON で保存する")
+    args = parser.parse_args(argv)
+
+    try:
+        baseline = load_report(args.baseline) if args.command == "compare" else None
+        if getattr(args, "current", None):
+            current = load_report(args.current)
+        else:
+            current = run_cases(args.only)
+    except (OSError, ValueError) as e:
+        print(f"ベンチマークを実行できません: {e}", file=sys.stderr)
+        return 1
+    if args.command == "run":
+        if args.save:
+            save_report(current, args.save)
+        if args.json:
+            print(json.dumps(current, ensure_ascii=False, indent=2))
+        else:
+            print_results(current)
+        return 0
+
+    if baseline["machine"] != current["machine"]:
+        print("注意: 基準値と異なる環境で計測した結果です（比は参考値）", file=sys.stderr)
+    rows = compare_reports(baseline, current, args.threshold)
+    # その場で計測した場合は、遅くなった処理だけを計測し直して短い方の時間で判定する（一時的な揺れでは失敗しない）
+    for _ in range(0 if args.current else args.retries):
+        slower = [row[0] for row in rows if row[5] == "slower"]
+        if not slower:
+            break
+        print(f"計測し直します: {', '.join(slower)}", file=sys.stderr)
+        for name, result in run_cases(slower)["results"].items():
+            if result["min"] < current["results"][name]["min"]:
+                current["results"][name] = result
+        rows = compare_reports(baseline, current, args.threshold)
+    if args.save:
+        save_report(current, args.save)
+    print_comparison(rows)
+    slower = [row[0] for row in rows if row[5] == "slower"]
+    if slower:
+        print(f"基準値より遅くなりました: {', '.join(slower)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
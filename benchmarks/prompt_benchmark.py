@@ -0,0 +1,118 @@
+# プロンプトテンプレートのバージョンごとの入力トークン数と最初の応答までの時間の比較
+# ローカルの偽サーバー（fake_openai_server.py）に対して、バージョンごとに別プロセスで
+# ランダムな回答の AI分析（構造化出力 + 長文の詳細分析）を繰り返し、llm_usage の記録から
+# 1回あたりの入力トークン数（うちプロバイダー側のキャッシュ済み）・出力トークン数・
+# 送信から応答まで（構造化出力）と最初のテキストまで（詳細分析）の時間を比べる。
+# 偽サーバーは、キャッシュされていない入力トークンごとに --prefill-delay 秒だけ応答を遅らせる。
+#
+# 使い方:
+#   python benchmarks/prompt_benchmark.py
+#   python benchmarks/prompt_benchmark.py --versions 2 3 --diagnoses 50 --prefill-delay 0.0005 --json
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openai_server import FakeConfig, start_server  # noqa: E402
+
+# 子プロセスで実行する計測コード（環境変数でバージョンと偽サーバーを指定する）
+PROBE = r"""
+import json, random, sys
+sys.path.insert(0, sys.argv[1])
+diagnoses, seed = int(sys.argv[2]), int(sys.argv[3])
+from analysis import run_ai_analysis
+from llm_usage import get_usage_log
+from type_data import questions
+
+rng = random.Random(seed)
+for _ in range(diagnoses):
+    run_ai_analysis([rng.randint(1, 5) for _ in questions])
+print(json.dumps([usage._asdict() for usage in get_usage_log().recent()]))
+"""
+
+
+def percentile(values, p):
+    values = sorted(v for v in values if v is not None)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else None
+
+
+def mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+def run_version(version, args):
+    server = start_server(FakeConfig(latency=args.latency, prefill_delay=args.prefill_delay))
+    env = dict(
+        os.environ,
+        OPENAI_BASE_URL=server.base_url,
+        OPENAI_API_KEY="fake",
+        ANALYSIS_CACHE_PATH="",
+        ANALYSIS_OUTPUT_MODE="structured",
+        ANALYSIS_NARRATIVE="True",
+        ANALYSIS_PROMPT_VERSION=version,
+        LLM_USAGE_LOG_PATH=""
+    )
+    try:
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE, APP_DIR, str(args.diagnoses), str(args.seed)],
+            cwd=APP_DIR, env=env, check=True, capture_output=True, text=True
+        ).stdout
+    finally:
+        server.shutdown()
+    calls = json.loads(output.strip().splitlines()[-1])
+
+    report = {}
+    for purpose in ("structured", "narrative"):
+        entries = [c for c in calls if c["purpose"] == purpose]
+        input_tokens = [c["input_tokens"] for c in entries]
+        cached_tokens = [c["cached_tokens"] for c in entries]
+        report[purpose] = {
+            "calls": len(entries),
+            "input_tokens": mean(input_tokens),
+            "cached_tokens": mean(cached_tokens),
+            # キャッシュ済みの入力トークンを割り引いた課金対象の入力トークン数
+            "billed_input_tokens": mean([i - c * args.cached_discount for i, c in zip(input_tokens, cached_tokens)]),
+            "output_tokens": mean([c["output_tokens"] for c in entries]),
+            "ttft_p50": percentile([c["ttft_seconds"] for c in entries], 0.5),
+            "seconds_p50": percentile([c["seconds"] for c in entries], 0.5),
+            "estimated": any(c["estimated"] for c in entries)
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="プロンプトテンプレートのバージョンごとの入力トークン数と応答時間の比較")
+    parser.add_argument("--versions", nargs="+", default=["2", "3"], help="比べるプロンプトのバージョン")
+    parser.add_argument("--diagnoses", type=int, default=30, help="バージョンごとの診断の回数")
+    parser.add_argument("--latency", type=float, default=0.05, help="偽サーバーの応答遅延（秒）")
+    parser.add_argument("--prefill-delay", type=float, default=0.0005,
+                        help="偽サーバーの、キャッシュされていない入力トークンごとの遅延（秒）")
+    parser.add_argument("--cached-discount", type=float, default=0.5,
+                        help="キャッシュ済みの入力トークンの割引率（OpenAI は 0.5）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+    args = parser.parse_args(argv)
+
+    report = {version: run_version(version, args) for version in args.versions}
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+
+    for version, entry in report.items():
+        print(f"プロンプト v{version}（{args.diagnoses}回）")
+        for purpose, label, time_key in (("structured", "構造化出力", "seconds_p50"), ("narrative", "詳細分析", "ttft_p50")):
+            stats = entry[purpose]
+            time_label = "応答まで" if time_key == "seconds_p50" else "最初のテキストまで"
+            print(f"  {label}: 入力 {stats['input_tokens']:.0f}（キャッシュ済み {stats['cached_tokens']:.0f}・"
+                  f"課金対象 {stats['billed_input_tokens']:.0f}） / 出力 {stats['output_tokens']:.0f} トークン"
+                  f" / {time_label} p50 {stats[time_key] * 1000:.0f}ms" + ("（見積もり）" if stats["estimated"] else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+# 結果ストアのベンチマーク: 一時ファイルの結果ストアに N 件の診断結果を記録し、
+#   - record() の呼び出し時間（画面の処理が待つ時間。書き込みはバックグラウンド）
+#   - すべて書き込むまでの時間（件/秒）
+#   - 結果 ID・タイプと日時・回答ハッシュでの検索時間と、検索にインデックスが使われているか
+# を計測する。
+#
+# 使い方:
+#   python benchmarks/results_store_benchmark.py                  # 100万件
+#   python benchmarks/results_store_benchmark.py --rows 3000000 --max-query-ms 5   # 上限を超えたら終了コード 1
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from type_data import questions, TYPE_NAMES  # noqa: E402
+from results_store import ResultsStore, answer_hash, _where  # noqa: E402
+
+# 検索ごとの計測回数
+QUERY_SAMPLES = 200
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def timed(fn, samples):
+    durations = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return {"p50_ms": statistics.median(durations) * 1000, "p99_ms": percentile(durations, 99) * 1000}
+
+
+# 検索に使われるインデックス（インデックスを使わない全件走査の場合は None）
+def query_plan(store, **filters):
+    where, params = _where(**filters)
+    plan = store._conn.execute(
+        f"EXPLAIN QUERY PLAN SELECT id FROM results{where} ORDER BY created_at DESC LIMIT 100", params
+    ).fetchall()
+    detail = " / ".join(row[-1] for row in plan)
+    return None if ("SCAN results" in detail and "INDEX" not in detail) else detail
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="結果ストアの書き込み・検索の計測")
+    parser.add_argument("--rows", type=int, default=1000000, help="記録する件数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-query-ms", type=float, help="検索の p99 の上限（ミリ秒）")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    directory = tempfile.mkdtemp()
+    store = ResultsStore(os.path.join(directory, "results.sqlite3"), batch_size=1000)
+    try:
+        ids = []
+        record_durations = []
+        start = time.perf_counter()
+        for _ in range(args.rows):
+            answers = bytes(rng.randint(1, 5) for _ in questions)
+            scores = {t: rng.randint(0, 100) for t in TYPE_NAMES}
+            main_type = max(TYPE_NAMES, key=scores.get)
+            call_start = time.perf_counter()
+            ids.append(store.record(answers, main_type, scores, model="gpt-4-turbo", prompt_version="2-structured",
+                                    analysis_key=None, answer_seconds=30.0, analysis_seconds=1.0))
+            record_durations.append(time.perf_counter() - call_start)
+        store.flush()
+        write_seconds = time.perf_counter() - start
+
+        now = time.time()
+        sample_answers = bytes(rng.randint(1, 5) for _ in questions)
+        queries = {
+            "get_by_id": lambda: store.get(rng.choice(ids)),
+            "type_and_since": lambda: store.query(main_type=rng.choice(TYPE_NAMES), since=now - 3600, limit=100),
+            "answer_hash": lambda: store.query(answer_hash=answer_hash(sample_answers), limit=100),
+            "latest": lambda: store.query(limit=100)
+        }
+        report = {
+            "rows": args.rows,
+            "record_p50_us": statistics.median(record_durations) * 1e6,
+            "record_p99_us": percentile(record_durations, 99) * 1e6,
+            "write_seconds": write_seconds,
+            "rows_per_second": args.rows / write_seconds,
+            "batches": store.stats()["batches"],
+            "write_errors": store.stats()["errors"],
+            "queries": {name: timed(fn, QUERY_SAMPLES) for name, fn in queries.items()},
+            "query_plans": {
+                "type_and_since": query_plan(store, main_type=TYPE_NAMES[0], since=now - 3600),
+                "answer_hash": query_plan(store, answer_hash=answer_hash(sample_answers)),
+                "latest": query_plan(store)
+            },
+            "file_mb": os.path.getsize(store.path) / 1024 / 1024
+        }
+    finally:
+        store.close()
+        for name in os.listdir(directory):
+            os.unlink(os.path.join(directory, name))
+        os.rmdir(directory)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"{report['rows']}件 / ファイル {report['file_mb']:.0f}MB")
+        print(f"  record(): p50 {report['record_p50_us']:.1f}µs / p99 {report['record_p99_us']:.1f}µs")
+        print(f"  書き込み: {report['write_seconds']:.1f}秒（{report['rows_per_second']:.0f}件/秒、{report['batches']}回のトランザクション）")
+        for name, stats in report["queries"].items():
+            print(f"  {name}: p50 {stats['p50_ms']:.2f}ms / p99 {stats['p99_ms']:.2f}ms")
+        for name, plan in report["query_plans"].items():
+            print(f"  {name} の検索: {plan or '全件走査'}")
+
+    failures = []
+    if report["write_errors"]:
+        failures.append(f"書き込みに失敗した行があります: {report['write_errors']}件")
+    for name, plan in report["query_plans"].items():
+        if plan is None:
+            failures.append(f"{name} の検索にインデックスが使われていません")
+    if args.max_query_ms is not None:
+        for name, stats in report["queries"].items():
+            if stats["p99_ms"] > args.max_query_ms:
+                failures.append(f"{name} の p99 が上限を超えました: {stats['p99_ms']:.2f}ms")
+    for failure in failures:
+        print(f"NG: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
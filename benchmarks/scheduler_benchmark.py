@@ -0,0 +1,146 @@
+# AI分析の API スケジューラー（llm_scheduler.py）の検証
+# ローカルの偽サーバー（fake_openai_server.py）に対して、次の2つの状況を再現する。
+#   burst  : 多数のユーザーが同時に回答を終え、プロバイダーのレート制限（--rate-limit / --rate-window）を
+#            超える。スケジューラーなし（クライアントの再試行のみ）と、レート制限を合わせたスケジューラーで、
+#            429 の件数・成功数・応答時間を比べる。
+#   outage : プロバイダーがすべて 5xx を返す。サーキットブレーカーが開いた後は API を呼ばずに
+#            すぐ失敗する（呼び出し側はローカル採点に切り替える）ことを確認する。
+#
+# 使い方:
+#   python benchmarks/scheduler_benchmark.py
+#   python benchmarks/scheduler_benchmark.py --users 200 --rate-limit 40 --rate-window 2 --json
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openai_server import FakeConfig, start_server  # noqa: E402
+from llm_client import create_client  # noqa: E402
+from llm_scheduler import LLMScheduler, estimate_tokens  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "以下はユーザーの回答です。" * 20}]
+MAX_TOKENS = 400
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else None
+
+
+# users 人が同時に1回ずつ API を呼び出す（scheduler が None の場合はクライアントの再試行のみ）
+def run_burst(server, users, scheduler, client_retries):
+    client = create_client(api_key="fake", base_url=server.base_url).with_options(max_retries=client_retries)
+    latencies = []
+    outcomes = {"ok": 0, "fallback": 0}
+    max_queue_depth = 0
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def request(timeout=None):
+        options = {"timeout": timeout} if timeout is not None else {}
+        return client.chat.completions.create(model="fake", messages=MESSAGES, max_tokens=MAX_TOKENS, **options)
+
+    def user(_):
+        start = time.perf_counter()
+        try:
+            if scheduler is None:
+                request()
+            else:
+                scheduler.call(request, estimate_tokens(MESSAGES, MAX_TOKENS))
+            outcome = "ok"
+        except Exception:
+            # 画面ではローカル採点の結果を表示する
+            outcome = "fallback"
+        with lock:
+            outcomes[outcome] += 1
+            latencies.append(time.perf_counter() - start)
+
+    def sample_queue():
+        nonlocal max_queue_depth
+        while not done.wait(0.05):
+            max_queue_depth = max(max_queue_depth, scheduler.metrics()["queue_depth"])
+
+    if scheduler is not None:
+        threading.Thread(target=sample_queue, daemon=True).start()
+    before_requests, before_limited = server.config.requests, server.config.rate_limited
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        list(pool.map(user, range(users)))
+    done.set()
+    report = {
+        "seconds": time.perf_counter() - started,
+        "ok": outcomes["ok"],
+        "fallback": outcomes["fallback"],
+        "provider_requests": server.config.requests - before_requests,
+        "provider_429": server.config.rate_limited - before_limited,
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p95": percentile(latencies, 0.95)
+    }
+    if scheduler is not None:
+        report["max_queue_depth"] = max_queue_depth
+        report["scheduler"] = scheduler.metrics()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AI分析の API スケジューラーの検証")
+    parser.add_argument("--users", type=int, default=120, help="同時に回答を終えるユーザー数")
+    parser.add_argument("--rate-limit", type=int, default=30, help="偽サーバーの --rate-window 秒あたりの上限")
+    parser.add_argument("--rate-window", type=float, default=2.0)
+    parser.add_argument("--latency", type=float, default=0.2, help="偽サーバーの応答遅延（秒）")
+    parser.add_argument("--deadline", type=float, default=15.0, help="リクエストごとの期限（秒）")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+    args = parser.parse_args(argv)
+
+    # プロバイダーの上限の 9 割に合わせる
+    rpm = int(args.rate_limit * 60 / args.rate_window * 0.9)
+    report = {}
+
+    server = start_server(FakeConfig(latency=args.latency, rate_limit=args.rate_limit, rate_window=args.rate_window))
+    report["burst_client_retries"] = run_burst(server, args.users, None, client_retries=2)
+    server.shutdown()
+
+    server = start_server(FakeConfig(latency=args.latency, rate_limit=args.rate_limit, rate_window=args.rate_window))
+    # 偽サーバーはスライディングウィンドウで数えるため、まとめて送れる量はウィンドウの 1/10 にする
+    scheduler = LLMScheduler(rpm_limit=rpm, tpm_limit=0, burst_seconds=args.rate_window / 10,
+                             deadline_seconds=args.deadline, seed=0)
+    report["burst_scheduler"] = run_burst(server, args.users, scheduler, client_retries=0)
+    server.shutdown()
+
+    server = start_server(FakeConfig(latency=args.latency, error_rate=1.0, error_status=503))
+    scheduler = LLMScheduler(rpm_limit=0, tpm_limit=0, deadline_seconds=args.deadline, retry_base_seconds=0.05,
+                             breaker_failures=5, breaker_reset_seconds=60, seed=0)
+    report["outage_scheduler"] = run_burst(server, args.users, scheduler, client_retries=0)
+    server.shutdown()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return 0
+
+    labels = {
+        "burst_client_retries": f"同時 {args.users}人・上限 {args.rate_limit}件/{args.rate_window:g}秒（クライアントの再試行のみ）",
+        "burst_scheduler": f"同時 {args.users}人・上限 {args.rate_limit}件/{args.rate_window:g}秒（スケジューラー {rpm} RPM）",
+        "outage_scheduler": f"同時 {args.users}人・すべて 503（スケジューラー）"
+    }
+    for name, entry in report.items():
+        print(labels[name])
+        print(f"  成功 {entry['ok']}件 / ローカル採点 {entry['fallback']}件 / API 呼び出し {entry['provider_requests']}件"
+              f"（429: {entry['provider_429']}件）")
+        print(f"  応答時間 p50 {entry['latency_p50']:.2f}秒 / p95 {entry['latency_p95']:.2f}秒 / 全体 {entry['seconds']:.1f}秒")
+        if "scheduler" in entry:
+            metrics = entry["scheduler"]
+            print(f"  待ち行列 最大 {entry['max_queue_depth']}件 / 待ち時間 p95 {metrics['wait_seconds']['p95']:.2f}秒"
+                  f" / 再試行 {metrics['retries']}件 / 期限切れ {metrics['deadline_exceeded']}件"
+                  f" / 遮断 {metrics['short_circuited']}件（状態: {metrics['state']}）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
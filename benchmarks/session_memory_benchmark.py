@@ -0,0 +1,147 @@
+# セッション状態のメモリ計測: 結果画面まで進んだセッションを N 件作り、
+# 従来の表現（回答の dict・会話履歴・分析テキストを含む診断結果の dict）と
+# compact_state の表現（回答のバイト列・ResultRef）で、1000 セッションあたりのメモリを比較する。
+#
+# 使い方:
+#   python benchmarks/session_memory_benchmark.py                 # 10000 セッションで計測
+#   python benchmarks/session_memory_benchmark.py --sessions 50000 --json
+#
+# tracemalloc で確保したメモリ量を、別プロセスで RSS の増加量を計測する。
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tracemalloc
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from type_data import questions, RATING_LABELS, TYPE_NAMES  # noqa: E402
+from scoring import local_result  # noqa: E402
+from compact_state import new_answers, make_result_ref  # noqa: E402
+
+# 分析テキストの長さの目安（MAX_TOKENS=1500 の日本語テキスト）
+ANALYSIS_TEXT_LENGTH = 1500
+
+
+def random_ratings(rng):
+    return [rng.randint(1, 5) for _ in questions]
+
+
+# 従来のセッション状態
+def legacy_session(ratings, analysis_text):
+    messages = []
+    answers = {}
+    for q_idx, rating in enumerate(ratings):
+        messages.append({"role": "assistant", "content": f"質問 {q_idx + 1}/{len(questions)}: {questions[q_idx]['質問']}"})
+        messages.append({"role": "user", "content": f"{rating}: {RATING_LABELS[rating]}"})
+        answers[q_idx] = rating
+    result = local_result(answers, analysis_text=analysis_text)
+    return {
+        "messages": messages,
+        "current_question": len(questions),
+        "answers": answers,
+        "analysis_complete": True,
+        "type_result": result
+    }
+
+
+# compact_state のセッション状態（分析テキストは共有ストア側に置くためキーだけを持つ）
+def compact_session(ratings, analysis_key):
+    answers = new_answers()
+    answers[:] = bytes(ratings)
+    return {
+        "current_question": len(questions),
+        "answers": answers,
+        "result": make_result_ref(local_result(answers), analysis_key)
+    }
+
+
+def build_sessions(kind, count, seed):
+    rng = random.Random(seed)
+    sessions = []
+    for i in range(count):
+        ratings = random_ratings(rng)
+        if kind == "legacy":
+            # セッションごとに別の文字列（同じ回答でも Streamlit のセッションでは別オブジェクトになる）
+            text = f"{i:08d}" + "分" * (ANALYSIS_TEXT_LENGTH - 8)
+            sessions.append(legacy_session(ratings, text))
+        else:
+            sessions.append(compact_session(ratings, f"{i:064x}"))
+    return sessions
+
+
+def traced_bytes(kind, count, seed):
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    sessions = build_sessions(kind, count, seed)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del sessions
+    return size
+
+
+# 子プロセスで実行する RSS の計測コード
+RSS_PROBE = r"""
+import json, sys
+sys.path.insert(0, sys.argv[1])
+import session_memory_benchmark as bench
+
+def rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+
+bench.build_sessions(sys.argv[2], 10, 0)
+before = rss_kb()
+sessions = bench.build_sessions(sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
+print(json.dumps({"rss_bytes": (rss_kb() - before) * 1024}))
+"""
+
+
+def rss_bytes(kind, count, seed):
+    if not os.path.exists("/proc/self/status"):
+        return None
+    output = subprocess.run(
+        [sys.executable, "-c", RSS_PROBE, os.path.dirname(os.path.abspath(__file__)), kind, str(count), str(seed)],
+        cwd=APP_DIR, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])["rss_bytes"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="セッション状態のメモリ使用量の比較")
+    parser.add_argument("--sessions", type=int, default=10000, help="作成するセッション数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+    args = parser.parse_args(argv)
+
+    per_1000 = 1000 / args.sessions
+    report = {"sessions": args.sessions}
+    for kind in ("legacy", "compact"):
+        traced = traced_bytes(kind, args.sessions, args.seed)
+        rss = rss_bytes(kind, args.sessions, args.seed)
+        report[kind] = {
+            "traced_kb_per_1000": traced * per_1000 / 1024,
+            "rss_kb_per_1000": rss * per_1000 / 1024 if rss is not None else None
+        }
+    report["traced_ratio"] = report["legacy"]["traced_kb_per_1000"] / report["compact"]["traced_kb_per_1000"]
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"{args.sessions} セッション / タイプ数 {len(TYPE_NAMES)}（1000 セッションあたり）")
+        for kind, label in (("legacy", "従来"), ("compact", "コンパクト")):
+            entry = report[kind]
+            rss = f"{entry['rss_kb_per_1000']:.1f}KB" if entry["rss_kb_per_1000"] is not None else "-"
+            print(f"  {label}: tracemalloc {entry['traced_kb_per_1000']:.1f}KB / RSS {rss}")
+        print(f"  削減率: {report['traced_ratio']:.1f}倍")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
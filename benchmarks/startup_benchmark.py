@@ -0,0 +1,109 @@
+# 起動ベンチマーク: 新しいプロセスで app.py を実行し、最初の質問が表示されるまでの
+# 経過時間と最大メモリ使用量（RSS）を計測する。あわせて、質問画面の表示までに
+# 重いライブラリ（描画・データフレーム・画像・OpenAI クライアントなど）が読み込まれていないかを確認する。
+#
+# 使い方:
+#   python benchmarks/startup_benchmark.py                    # 5回計測して中央値を表示
+#   python benchmarks/startup_benchmark.py --max-seconds 2.5 --max-rss-mb 250   # 予算を超えたら終了コード 1
+#   python benchmarks/startup_benchmark.py --json             # 結果を JSON で出力
+#
+# Streamlit 自体の読み込み時間を分けるため、空のスクリプトを同じ方法で実行した値も計測し、差分を表示する。
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 質問画面の表示までに読み込まれてはいけないモジュール
+# （Streamlit 自体が読み込むものは、空のスクリプトでの計測結果と比較して除外する）
+DEFERRED_MODULES = ["matplotlib", "plotly", "pandas", "PIL", "openai", "httpx", "numpy"]
+
+# 子プロセスで実行する計測コード
+PROBE = r"""
+import json, resource, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=60).run()
+elapsed = time.perf_counter() - start
+rendered = any("質問 1/" in m.value for m in at.markdown)
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+loaded = sorted({name.split(".")[0] for name in sys.modules} & set(json.loads(sys.argv[2])))
+print(json.dumps({"seconds": elapsed, "rss_mb": rss_kb / 1024, "rendered": rendered, "loaded": loaded}))
+"""
+
+
+def run_probe(script_path):
+    env = dict(os.environ, ANALYSIS_CACHE_PATH="")
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE, script_path, json.dumps(DEFERRED_MODULES)],
+        cwd=APP_DIR, env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure(script_path, runs):
+    samples = [run_probe(script_path) for _ in range(runs)]
+    return {
+        "seconds": statistics.median(s["seconds"] for s in samples),
+        "rss_mb": statistics.median(s["rss_mb"] for s in samples),
+        "rendered": all(s["rendered"] for s in samples),
+        "loaded": sorted({name for s in samples for name in s["loaded"]})
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="app.py の起動時間・メモリの計測")
+    parser.add_argument("--runs", type=int, default=5, help="計測回数（中央値を採用）")
+    parser.add_argument("--max-seconds", type=float, help="最初の質問表示までの時間の上限（Streamlit 自体の分を除く）")
+    parser.add_argument("--max-rss-mb", type=float, help="最大 RSS の上限（MB）")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+    args = parser.parse_args(argv)
+
+    with tempfile.NamedTemporaryFile("w", suffix=".py", delete=False) as empty:
+        empty.write("import streamlit as st\nst.markdown('質問 1/')\n")
+    try:
+        baseline = measure(empty.name, args.runs)
+    finally:
+        os.unlink(empty.name)
+    app = measure(os.path.join(APP_DIR, "app.py"), args.runs)
+
+    report = {
+        "app_seconds": app["seconds"],
+        "app_rss_mb": app["rss_mb"],
+        "streamlit_seconds": baseline["seconds"],
+        "streamlit_rss_mb": baseline["rss_mb"],
+        "app_overhead_seconds": app["seconds"] - baseline["seconds"],
+        "app_overhead_rss_mb": app["rss_mb"] - baseline["rss_mb"],
+        "first_question_rendered": app["rendered"],
+        "deferred_modules_loaded": sorted(set(app["loaded"]) - set(baseline["loaded"]))
+    }
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"最初の質問まで: {report['app_seconds']:.3f}秒 / RSS {report['app_rss_mb']:.1f}MB")
+        print(f"  うち Streamlit: {report['streamlit_seconds']:.3f}秒 / RSS {report['streamlit_rss_mb']:.1f}MB")
+        print(f"  app.py の追加分: {report['app_overhead_seconds']:.3f}秒 / RSS {report['app_overhead_rss_mb']:.1f}MB")
+        print(f"  読み込まれた遅延対象モジュール: {', '.join(report['deferred_modules_loaded']) or 'なし'}")
+
+    failures = []
+    if not app["rendered"]:
+        failures.append("最初の質問が表示されませんでした")
+    if report["deferred_modules_loaded"]:
+        failures.append(f"質問画面の表示までに読み込まれたモジュールがあります: {', '.join(report['deferred_modules_loaded'])}")
+    if args.max_seconds is not None and report["app_overhead_seconds"] > args.max_seconds:
+        failures.append(f"起動時間が上限を超えました: {report['app_overhead_seconds']:.3f}秒 > {args.max_seconds}秒")
+    if args.max_rss_mb is not None and report["app_rss_mb"] > args.max_rss_mb:
+        failures.append(f"RSS が上限を超えました: {report['app_rss_mb']:.1f}MB > {args.max_rss_mb}MB")
+
+    for failure in failures:
+        print(f"NG: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
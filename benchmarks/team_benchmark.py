@@ -0,0 +1,107 @@
+# チーム構成の分析のベンチマーク: ランダムな回答と所属の名簿（CSV / JSONL / 結果 ID）を一時ファイルに作り、
+#   - 名簿の読み込み時間
+#   - 分析の時間（初回）と、同じ名簿を再び分析したとき（キャッシュ済み）の時間
+# を計測する。
+#
+# 使い方:
+#   python benchmarks/team_benchmark.py                                  # 5万人・200所属
+#   python benchmarks/team_benchmark.py --people 200000 --max-seconds 1  # 読み込み + 分析が上限を超えたら終了コード 1
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+
+from type_data import questions, TYPE_NAMES  # noqa: E402
+from results_store import ResultsStore  # noqa: E402
+from team_analytics import load_roster, analyze_team, clear_cache  # noqa: E402
+
+
+def write_rosters(directory, people, groups, seed):
+    rng = np.random.default_rng(seed)
+    answers = rng.integers(1, 6, size=(people, len(questions)))
+    group_names = [f"部署{g:03d}" for g in rng.integers(0, groups, size=people)]
+
+    csv_path = os.path.join(directory, "roster.csv")
+    with open(csv_path, "w", encoding="utf-8") as f:
+        f.write("id,group," + ",".join(f"q{i + 1}" for i in range(len(questions))) + "\n")
+        for i in range(people):
+            f.write(f"u{i},{group_names[i]}," + ",".join(map(str, answers[i])) + "\n")
+
+    jsonl_path = os.path.join(directory, "roster.jsonl")
+    with open(jsonl_path, "w", encoding="utf-8") as f:
+        for i in range(people):
+            f.write(json.dumps({"id": f"u{i}", "group": group_names[i], "answers": answers[i].tolist()},
+                               ensure_ascii=False) + "\n")
+
+    # 結果ストアに記録し、結果 ID で指定する名簿
+    store = ResultsStore(os.path.join(directory, "results.sqlite3"), batch_size=5000)
+    scores = {t: 50 for t in TYPE_NAMES}
+    result_ids = [store.record(bytes(row.astype(np.uint8)), TYPE_NAMES[0], scores) for row in answers]
+    store.flush()
+    ids_path = os.path.join(directory, "roster_ids.csv")
+    with open(ids_path, "w", encoding="utf-8") as f:
+        f.write("id,group,result_id\n")
+        for i in range(people):
+            f.write(f"u{i},{group_names[i]},{result_ids[i]}\n")
+    return {"csv": (csv_path, "csv"), "jsonl": (jsonl_path, "jsonl"), "result_id": (ids_path, "csv")}, store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="チーム構成の分析のベンチマーク")
+    parser.add_argument("--people", type=int, default=50000, help="名簿の人数")
+    parser.add_argument("--groups", type=int, default=200, help="所属の数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-seconds", type=float, help="読み込み + 分析（初回）の上限（秒）")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+    args = parser.parse_args(argv)
+
+    report = {}
+    with tempfile.TemporaryDirectory() as directory:
+        rosters, store = write_rosters(directory, args.people, args.groups, args.seed)
+        try:
+            for name, (path, input_format) in rosters.items():
+                clear_cache()
+                started = time.perf_counter()
+                roster = load_roster(path, input_format, store)
+                loaded = time.perf_counter()
+                analysis = analyze_team(roster)
+                analyzed = time.perf_counter()
+                analyze_team(roster)
+                cached = time.perf_counter()
+                report[name] = {
+                    "people": len(roster.ids),
+                    "groups": len(roster.group_names),
+                    "load_seconds": loaded - started,
+                    "analyze_seconds": analyzed - loaded,
+                    "cached_seconds": cached - analyzed,
+                    "total_seconds": analyzed - started,
+                    "complementarity": analysis["overall"]["complementarity"]
+                }
+        finally:
+            store.close()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        for name, entry in report.items():
+            print(f"{name}: {entry['people']}人・{entry['groups']}所属 / 読み込み {entry['load_seconds'] * 1000:.0f}ms"
+                  f" / 分析 {entry['analyze_seconds'] * 1000:.0f}ms（キャッシュ済み {entry['cached_seconds'] * 1000:.1f}ms）"
+                  f" / 合計 {entry['total_seconds'] * 1000:.0f}ms")
+
+    if args.max_seconds is not None:
+        slow = [name for name, entry in report.items() if entry["total_seconds"] > args.max_seconds]
+        if slow:
+            print(f"上限 {args.max_seconds}秒を超えました: {', '.join(slow)}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
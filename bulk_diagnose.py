@@ -0,0 +1,280 @@
+# 回答データの一括診断 CLI
+# CSV / JSONL の回答データを少しずつ読み込み、ローカル採点をプロセスプールで並列に行い、
+# 結果を JSONL / CSV に逐次書き出す（ファイルサイズによらずメモリ使用量は一定）。
+#
+# 使い方:
+#   python bulk_diagnose.py answers.csv -o results.jsonl
+#   python bulk_diagnose.py answers.jsonl -o results.csv --workers 8 --llm --llm-concurrency 16
+#
+# 入力形式（回答は questions と同じ順序の 1〜5 の評価）:
+#   CSV   : 1行1件。"id" 列があれば識別子として使い、残りの列を回答として扱う
+#   JSONL : [5, 4, ...] の配列、または {"id": ..., "answers": [5, 4, ...]}
+#
+# --llm でも、ハイブリッド判定（ANALYSIS_DECISION_MODE=hybrid）で主要タイプがはっきりしている回答は
+# API を呼び出さない。
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+import numpy as np
+from dotenv import load_dotenv
+
+from type_data import questions
+from analysis import run_ai_analysis, confident_local_result, decision_counts
+from llm_usage import get_usage_log
+from scoring import score_answers, scores_to_dict, make_result, TYPE_NAMES
+
+DEFAULT_CHUNK_SIZE = 2000
+LIST_SEPARATOR = " / "
+
+
+# 読み込めなかった行（回答の代わりに渡し、score_chunk でその行のエラーとして出力する）
+class RowError(str):
+    pass
+
+
+# 入力ファイルから (id, 回答リスト) を1件ずつ読み込む
+def iter_answer_rows(stream, input_format):
+    if input_format == "jsonl":
+        for line_no, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_no, RowError(f"{line_no}行目を JSON として解析できません: {e.msg}")
+                continue
+            if isinstance(record, dict):
+                yield record.get("id", line_no), record.get("answers")
+            else:
+                yield line_no, record
+    else:
+        reader = csv.reader(stream)
+        header = next(reader, None)
+        if header is None:
+            return
+        # 先頭行が数値だけならヘッダー無しとみなす
+        if all(cell.strip().isdigit() for cell in header):
+            rows = _chain_first(header, reader)
+            id_column = None
+        else:
+            rows = reader
+            id_column = header.index("id") if "id" in header else None
+        for row_no, row in enumerate(rows, start=1):
+            if not row:
+                continue
+            if id_column is None:
+                yield row_no, row
+            elif len(row) <= id_column:
+                yield row_no, RowError(f"{reader.line_num}行目に id の列がありません")
+            else:
+                yield row[id_column], row[:id_column] + row[id_column + 1:]
+
+
+def _chain_first(first, rest):
+    yield first
+    yield from rest
+
+
+# 評価を整数に変換（CSV の文字列は数字だけを受け付ける。4.7・"4.7"・true などの整数でない値は None）
+def parse_rating(value):
+    if isinstance(value, str):
+        value = value.strip()
+        return int(value) if value.isascii() and value.isdigit() else None
+    if isinstance(value, bool) or not isinstance(value, int):
+        return None
+    return value
+
+
+# 回答を検証して整数リストに変換（不正な場合は None）
+def validate_answers(answers):
+    if not isinstance(answers, (list, tuple)) or len(answers) != len(questions):
+        return None
+    ratings = [parse_rating(a) for a in answers]
+    if any(r is None or r < 1 or r > 5 for r in ratings):
+        return None
+    return ratings
+
+
+# ワーカープロセス: チャンク単位でまとめて採点する
+def score_chunk(chunk):
+    ids = []
+    rows = []
+    records = []
+    for row_id, answers in chunk:
+        if isinstance(answers, RowError):
+            records.append({"id": row_id, "error": str(answers)})
+            continue
+        ratings = validate_answers(answers)
+        if ratings is None:
+            records.append({"id": row_id, "error": f"回答は{len(questions)}個の1〜5の整数で指定してください"})
+        else:
+            records.append(None)
+            ids.append(row_id)
+            rows.append(ratings)
+
+    if rows:
+        scored = score_answers(np.array(rows, dtype=np.uint8))
+        results = iter(zip(ids, rows, scored.main_type, scored.scores))
+        for i, record in enumerate(records):
+            if record is None:
+                row_id, ratings, main_type, scores = next(results)
+                result = make_result(TYPE_NAMES[main_type], scores_to_dict(scores), None)
+                records[i] = {"id": row_id, "answers": ratings, **result}
+    return records
+
+
+# イテレータを指定サイズのチャンクに分割
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# 実行中のタスク数を上限 max_pending に抑えつつ、入力順に結果を返す
+def bounded_map(executor, fn, iterable, max_pending):
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+# LLM による診断結果（主要タイプ・スコア・詳細分析テキスト）で置き換える（同じ回答パターンはキャッシュを利用）
+# 分析テキストと主要タイプ・スコアが食い違わないよう、採点結果の項目もまとめて置き換える。
+# ハイブリッド判定で主要タイプがはっきりしている回答は、API を呼び出さずに採点結果の説明を付ける。
+# AI分析に失敗した場合は採点結果のまま analysis_error を付ける
+def add_narrative(record):
+    if "error" in record:
+        return record
+    result = confident_local_result(record["answers"])
+    if result is None:
+        try:
+            result = run_ai_analysis(record["answers"])
+        except Exception as e:
+            record["analysis_error"] = str(e)
+            return record
+    record.update(result)
+    return record
+
+
+# 診断結果を JSONL / CSV に書き出す
+class ResultWriter:
+    def __init__(self, stream, output_format):
+        self.stream = stream
+        self.output_format = output_format
+        if output_format == "csv":
+            self.writer = csv.writer(stream)
+            self.writer.writerow(
+                ["id", "main_type", "english_name"]
+                + TYPE_NAMES
+                + ["strengths", "recommended_roles", "growth_points", "analysis_text", "error"]
+            )
+
+    def write(self, record):
+        if self.output_format == "jsonl":
+            record = {k: v for k, v in record.items() if k != "answers"}
+            self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+            return
+        if "error" in record:
+            self.writer.writerow([record["id"], "", ""] + [""] * len(TYPE_NAMES) + ["", "", "", "", record["error"]])
+            return
+        self.writer.writerow(
+            [record["id"], record["main_type"], record["english_name"]]
+            + [record["scores"][t] for t in TYPE_NAMES]
+            + [
+                LIST_SEPARATOR.join(record["strengths"]),
+                LIST_SEPARATOR.join(record["recommended_roles"]),
+                LIST_SEPARATOR.join(record["growth_points"]),
+                record.get("analysis_text") or "",
+                record.get("analysis_error", "")
+            ]
+        )
+
+
+# ファイル名の拡張子から形式を推定
+def guess_format(path, default):
+    if path and path != "-":
+        ext = os.path.splitext(path)[1].lower()
+        if ext in (".jsonl", ".ndjson"):
+            return "jsonl"
+        if ext == ".csv":
+            return "csv"
+    return default
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="継続力タイプの一括診断")
+    parser.add_argument("input", help="回答データ（CSV / JSONL、- で標準入力）")
+    parser.add_argument("-o", "--output", default="-", help="出力先（JSONL / CSV、- で標準出力）")
+    parser.add_argument("--input-format", choices=["csv", "jsonl"], help="入力形式（省略時は拡張子から推定）")
+    parser.add_argument("--output-format", choices=["csv", "jsonl"], help="出力形式（省略時は拡張子から推定）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="採点に使うプロセス数")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="1タスクあたりの件数")
+    parser.add_argument("--llm", action="store_true", help="OpenAI API で詳細分析テキストも生成する")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="OpenAI API の同時リクエスト数")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    load_dotenv()
+
+    input_format = args.input_format or guess_format(args.input, "csv")
+    output_format = args.output_format or guess_format(args.output, "jsonl")
+
+    if args.input == "-":
+        in_stream = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig")
+    else:
+        in_stream = open(args.input, encoding="utf-8-sig", newline="")
+    if args.output == "-":
+        out_stream = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", newline="")
+    else:
+        out_stream = open(args.output, "w", encoding="utf-8", newline="")
+
+    total = 0
+    errors = 0
+    with in_stream, out_stream, ProcessPoolExecutor(max_workers=args.workers) as pool:
+        writer = ResultWriter(out_stream, output_format)
+        chunks = iter_chunks(iter_answer_rows(in_stream, input_format), args.chunk_size)
+        scored_chunks = bounded_map(pool, score_chunk, chunks, args.workers * 2)
+        records = (record for chunk in scored_chunks for record in chunk)
+
+        if args.llm:
+            llm_pool = ThreadPoolExecutor(max_workers=args.llm_concurrency)
+            records = bounded_map(llm_pool, add_narrative, records, args.llm_concurrency * 2)
+
+        try:
+            for record in records:
+                writer.write(record)
+                total += 1
+                errors += "error" in record
+        finally:
+            if args.llm:
+                llm_pool.shutdown(cancel_futures=True)
+
+    print(f"{total}件を診断しました（エラー {errors}件）", file=sys.stderr)
+    counts = decision_counts()
+    if args.llm and counts["decisions"]:
+        print(f"AI分析 {counts['escalated']}件 / ハイブリッド判定 {counts['decisions']}件"
+              f"（{counts['escalation_rate']:.1%}）", file=sys.stderr)
+    for purpose, usage in get_usage_log().summary().items():
+        print(f"API {purpose}: {usage['calls']}回 / 入力 {usage['input_tokens']}トークン"
+              f"（キャッシュ済み {usage['cached_ratio']:.0%}） / 出力 {usage['output_tokens']}トークン", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
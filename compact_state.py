@@ -0,0 +1,63 @@
+# セッション状態のコンパクトな表現
+# 回答は質問数ぶんのバイト列（1〜5、0 は未回答）、診断結果はタイプ番号・スコアのバイト列・
+# AI分析キー・判定の方法だけを保持する。タイプの説明や分析テキストなどの長い文字列はセッションに持たず、
+# 表示するときに共有データ（personality_types、分析結果のストア／キャッシュ）から引く。
+from typing import NamedTuple, Optional
+
+from type_data import questions, TYPE_NAMES, TYPE_IDS
+
+# 分析テキストが見つからなかった場合（キャッシュの保存期間切れなど）の表示
+MISSING_ANALYSIS_TEXT = "AIによる分析結果の保存期間が過ぎたため、表示できません。"
+
+# 診断結果の判定の方法（結果ストアの source 列と同じ値）
+SOURCE_AI = "ai"          # AI が判定
+SOURCE_LOCAL = "local"    # AI分析に失敗したためローカル採点
+SOURCE_HYBRID = "hybrid"  # ローカル採点で主要タイプがはっきりしていたため AI を使わずに判定
+
+
+class ResultRef(NamedTuple):
+    type_id: int                 # 主要タイプの番号（TYPE_NAMES の添字）
+    scores: bytes                # TYPE_NAMES 順のスコア（0〜100）
+    analysis_key: Optional[str]  # AI分析キー（None はローカル採点のみ）
+    source: str                  # 判定の方法（SOURCE_*）
+
+
+# 未回答の回答ベクトルを作成
+def new_answers():
+    return bytearray(len(questions))
+
+
+# 回答済みの質問だけを {質問番号: 評価} の dict にする
+def answered_dict(answers):
+    return {q_idx: rating for q_idx, rating in enumerate(answers) if rating}
+
+
+# 診断結果の dict を ResultRef に変換（source を省略した場合は AI分析キーの有無で決める）
+def make_result_ref(result, analysis_key=None, source=None):
+    return ResultRef(
+        TYPE_IDS[result["main_type"]],
+        bytes(min(100, max(0, int(result["scores"][t]))) for t in TYPE_NAMES),
+        analysis_key,
+        source or (SOURCE_AI if analysis_key else SOURCE_LOCAL)
+    )
+
+
+# ResultRef のスコアを {タイプ名: スコア} の dict にする
+def result_scores(ref):
+    return dict(zip(TYPE_NAMES, ref.scores))
+
+
+# ResultRef から表示用の診断結果 dict を作成（pending の場合、分析テキストは None）
+def resolve_result(ref, pending=False):
+    from scoring import make_result, LOCAL_ANALYSIS_TEXT
+    from analysis import lookup_analysis_text, confident_analysis_text
+
+    if pending:
+        analysis_text = None
+    elif ref.source == SOURCE_HYBRID:
+        analysis_text = confident_analysis_text(TYPE_NAMES[ref.type_id], result_scores(ref), count=False)
+    elif ref.analysis_key is None:
+        analysis_text = LOCAL_ANALYSIS_TEXT
+    else:
+        analysis_text = lookup_analysis_text(ref.analysis_key) or MISSING_ANALYSIS_TEXT
+    return make_result(TYPE_NAMES[ref.type_id], result_scores(ref), analysis_text)
@@ -0,0 +1,95 @@
+# 継続力タイプ診断のコア処理（Streamlit の画面・診断 API の両方から使う）
+# Streamlit に依存せず、セッションの状態も持たない。1件の回答から次の順で診断結果を作る。
+#   1. ハイブリッド判定: ローカル採点で主要タイプがはっきりしていれば、AI を使わずに診断する
+#   2. AI分析（分析キャッシュと API スケジューラーを通す）
+#   3. AI分析に失敗した場合はローカル採点の結果
+# 適応型の出題で途中で終えた場合などの未回答の質問は、中央の評価で補って採点する。
+from typing import NamedTuple, Optional
+
+from adaptive import fill_unanswered
+from analysis import run_ai_analysis, analysis_key, analysis_version, confident_local_result, answers_to_ratings
+from compact_state import SOURCE_AI, SOURCE_LOCAL, SOURCE_HYBRID
+from llm_scheduler import SchedulerError
+from scoring import local_result, LOCAL_ANALYSIS_TEXT
+from type_data import questions
+
+
+class Diagnosis(NamedTuple):
+    result: dict                   # 診断結果（scoring.make_result の dict）
+    source: str                    # 判定の方法（compact_state.SOURCE_*）
+    analysis_key: Optional[str]    # AI分析キー（AI で判定した場合のみ）
+    error: Optional[Exception]     # AI分析に失敗した場合のエラー
+
+
+# 回答の形式が正しくない
+class InvalidAnswers(ValueError):
+    pass
+
+
+# 回答（質問順の評価のリスト。None または 0 は未回答）を検証してバイト列に変換する
+def parse_answers(ratings):
+    if not isinstance(ratings, (list, tuple)) or len(ratings) != len(questions):
+        raise InvalidAnswers(f"回答は{len(questions)}個の評価のリストで指定してください")
+    answers = bytearray(len(questions))
+    for q_idx, rating in enumerate(ratings):
+        if rating is None or rating == 0:
+            continue
+        if isinstance(rating, bool) or not isinstance(rating, int) or not 1 <= rating <= 5:
+            raise InvalidAnswers(f"{q_idx + 1}問目の評価が1〜5の整数ではありません: {rating!r}")
+        answers[q_idx] = rating
+    if not any(answers):
+        raise InvalidAnswers("回答済みの質問がありません")
+    return answers
+
+
+# ローカル採点のみの診断結果（analysis_text=None は AI分析の完了待ちの表示用）
+def fallback_result(answers, analysis_text=LOCAL_ANALYSIS_TEXT):
+    return local_result(fill_unanswered(answers_to_ratings(answers)), analysis_text=analysis_text)
+
+
+# ハイブリッド判定で AI を使わずに診断できる場合はその診断（AI分析が必要な場合は None）
+def confident_diagnosis(answers, count=True):
+    result = confident_local_result(answers, count=count)
+    return Diagnosis(result, SOURCE_HYBRID, None, None) if result is not None else None
+
+
+# 完了したAI分析の結果、または失敗した場合のローカル採点の結果
+def ai_or_fallback(answers, result=None, error=None):
+    if error is not None:
+        return Diagnosis(fallback_result(answers), SOURCE_LOCAL, None, error)
+    return Diagnosis(result, SOURCE_AI, analysis_key(answers), None)
+
+
+# 1件の回答を診断する（use_ai=False の場合はローカル採点のみ）
+# on_text を指定すると、AI分析のテキストを受け取るたびに呼び出す
+# gate=False の場合はハイブリッド判定を行わない（判定済みの呼び出し側が、判定の件数を二重に数えないようにする）
+def diagnose(answers, use_ai=True, on_text=None, gate=True):
+    if not use_ai:
+        return Diagnosis(fallback_result(answers, analysis_text=None), SOURCE_LOCAL, None, None)
+    if gate:
+        decided = confident_diagnosis(answers)
+        if decided is not None:
+            return decided
+    try:
+        return ai_or_fallback(answers, result=run_ai_analysis(answers, on_text=on_text))
+    except Exception as e:
+        return ai_or_fallback(answers, error=e)
+
+
+# AI分析のエラーの表示内容（混雑・API の不調でローカル採点に切り替えた場合は、エラーとして扱わない）
+def error_message(error):
+    if error is None or isinstance(error, SchedulerError):
+        return None
+    return f"分析中にエラーが発生しました: {str(error)}"
+
+
+# 診断を JSON に変換できる dict にする（診断 API の応答）
+def diagnosis_to_dict(diagnosis):
+    model, prompt_version = analysis_version() if diagnosis.source == SOURCE_AI else (None, None)
+    return dict(
+        diagnosis.result,
+        source=diagnosis.source,
+        model=model,
+        prompt_version=prompt_version,
+        analysis_error=error_message(diagnosis.error)
+    )
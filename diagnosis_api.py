@@ -0,0 +1,237 @@
+# 継続力タイプ診断の HTTP API（ASGI アプリケーション）
+# LMS・人事ポータルなどのサーバーから回答を送って診断結果を受け取る。状態を持たないため、
+# 複数のワーカープロセス・ロードバランサーの背後で動かせる。診断は diagnosis.py のコア処理で行い、
+# 分析キャッシュ（ANALYSIS_CACHE_PATH）と API スケジューラーは Streamlit の画面と共通の設定を使う。
+#
+# 起動:
+#   uvicorn diagnosis_api:app --host 0.0.0.0 --port 8000 --workers 4
+#   （同じ OpenAI のクォータを使うプロセスの合計数を LLM_PROCESSES に指定する）
+#
+# エンドポイント:
+#   GET  /health               : 稼働状況
+#   GET  /v1/questions         : 質問・評価ラベル（回答の順序）
+#   POST /v1/diagnoses         : {"answers": [5, 4, ...], "use_ai": true} → 診断結果
+#   POST /v1/diagnoses/batch   : {"items": [{"id": "u1", "answers": [...]}, ...], "use_ai": true} → {"results": [...]}
+#   GET  /metrics              : 計測値（Prometheus のテキスト形式）
+#
+# 回答は質問順の1〜5の評価のリスト（null は未回答）。API_KEYS を指定した場合は
+# "Authorization: Bearer <キー>" が必要になる。
+import asyncio
+import hmac
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+# 環境変数の読み込み（診断のモジュールは読み込み時に設定を読むため、先に読み込む）
+load_dotenv()
+
+import metrics  # noqa: E402
+from diagnosis import diagnose, diagnosis_to_dict, parse_answers, InvalidAnswers  # noqa: E402
+from type_data import questions, RATING_LABELS, TYPE_NAMES  # noqa: E402
+
+# 同時に実行する診断の数（AI分析の待ちを含む）
+MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "16"))
+# 1回のバッチで受け付ける件数と、リクエスト本文の上限（バイト）
+MAX_BATCH_SIZE = int(os.getenv("API_MAX_BATCH_SIZE", "500"))
+MAX_BODY_BYTES = int(os.getenv("API_MAX_BODY_BYTES", str(1024 * 1024)))
+# 受け付ける API キー（カンマ区切り。空の場合は認証しない）
+API_KEYS = [key.strip() for key in os.getenv("API_KEYS", "").split(",") if key.strip()]
+
+REQUEST_SECONDS = metrics.REGISTRY.histogram("api_request_seconds", "Diagnosis API request latency", ["route", "status"])
+
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="diagnosis-api")
+
+logger = logging.getLogger(__name__)
+
+
+# API のエラー（HTTP ステータスとエラーの種類）
+class APIError(Exception):
+    def __init__(self, status, code, message):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+
+async def read_body(receive):
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise APIError(400, "disconnected", "リクエストの受信中に接続が切れました")
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise APIError(413, "body_too_large", f"リクエスト本文は{MAX_BODY_BYTES}バイト以下にしてください")
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            return b"".join(chunks)
+
+
+async def read_json(receive):
+    try:
+        body = json.loads(await read_body(receive) or b"null")
+    except ValueError:
+        raise APIError(400, "invalid_json", "リクエスト本文が JSON ではありません")
+    if not isinstance(body, dict):
+        raise APIError(400, "invalid_json", "リクエスト本文は JSON オブジェクトで指定してください")
+    return body
+
+
+async def send_json(send, status, body):
+    data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json; charset=utf-8"), (b"content-length", str(len(data)).encode())]
+    })
+    await send({"type": "http.response.body", "body": data})
+
+
+async def send_text(send, status, text, content_type=b"text/plain; charset=utf-8"):
+    data = text.encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type), (b"content-length", str(len(data)).encode())]
+    })
+    await send({"type": "http.response.body", "body": data})
+
+
+# API キーを確認する（hmac.compare_digest は ASCII 以外の文字を含む str を比較できないため、バイト列で比較する）
+def check_api_key(scope):
+    if not API_KEYS:
+        return
+    headers = dict(scope.get("headers") or [])
+    authorization = headers.get(b"authorization", b"")
+    token = authorization[7:] if authorization.startswith(b"Bearer ") else b""
+    if not any(hmac.compare_digest(token, key.encode("utf-8")) for key in API_KEYS):
+        raise APIError(401, "unauthorized", "API キーが正しくありません")
+
+
+def use_ai_option(body):
+    use_ai = body.get("use_ai", True)
+    if not isinstance(use_ai, bool):
+        raise APIError(400, "invalid_option", "use_ai は true / false で指定してください")
+    return use_ai
+
+
+# 1件の診断（スレッドプールで実行する）
+async def run_diagnosis(answers, use_ai):
+    loop = asyncio.get_running_loop()
+    diagnosis = await loop.run_in_executor(_executor, diagnose, answers, use_ai)
+    return diagnosis_to_dict(diagnosis)
+
+
+def health():
+    from llm_scheduler import get_scheduler
+
+    return {"status": "ok", "questions": len(questions), "llm": get_scheduler().metrics()["state"]}
+
+
+def question_list():
+    return {
+        "questions": [{"index": i, "text": q["質問"], "type": q["タイプ"]} for i, q in enumerate(questions)],
+        "rating_labels": {str(rating): label for rating, label in RATING_LABELS.items()},
+        "types": TYPE_NAMES
+    }
+
+
+async def post_diagnosis(receive):
+    body = await read_json(receive)
+    try:
+        answers = parse_answers(body.get("answers"))
+    except InvalidAnswers as e:
+        raise APIError(422, "invalid_answers", str(e))
+    return await run_diagnosis(answers, use_ai_option(body))
+
+
+# 複数件の診断（入力順に結果を返す。回答が正しくない項目は、その項目だけエラーを返す）
+async def post_batch(receive):
+    body = await read_json(receive)
+    items = body.get("items")
+    if not isinstance(items, list) or not items:
+        raise APIError(422, "invalid_items", "items は診断する回答のリストで指定してください")
+    if len(items) > MAX_BATCH_SIZE:
+        raise APIError(413, "batch_too_large", f"1回のバッチは{MAX_BATCH_SIZE}件以下にしてください")
+    use_ai = use_ai_option(body)
+
+    async def run_item(item):
+        item_id = item.get("id") if isinstance(item, dict) else None
+        try:
+            answers = parse_answers(item.get("answers") if isinstance(item, dict) else None)
+        except InvalidAnswers as e:
+            return {"id": item_id, "error": {"code": "invalid_answers", "message": str(e)}}
+        return dict(await run_diagnosis(answers, use_ai), id=item_id)
+
+    return {"results": await asyncio.gather(*(run_item(item) for item in items))}
+
+
+ROUTES = {
+    ("GET", "/health"): "health",
+    ("GET", "/v1/questions"): "questions",
+    ("POST", "/v1/diagnoses"): "diagnoses",
+    ("POST", "/v1/diagnoses/batch"): "batch",
+    ("GET", "/metrics"): "metrics",
+}
+
+
+async def handle_http(scope, receive, send):
+    method, path = scope["method"], scope["path"].rstrip("/") or "/"
+    route = ROUTES.get((method, path))
+    started = time.perf_counter()
+    status = 200
+    try:
+        if route is None:
+            if any(p == path for _, p in ROUTES):
+                raise APIError(405, "method_not_allowed", f"{path} は {method} に対応していません")
+            raise APIError(404, "not_found", f"{path} はありません")
+        if route == "health":
+            await send_json(send, 200, health())
+            return
+        check_api_key(scope)
+        if route == "questions":
+            await send_json(send, 200, question_list())
+        elif route == "metrics":
+            await send_text(send, 200, metrics.render(), b"text/plain; version=0.0.4; charset=utf-8")
+        elif route == "diagnoses":
+            await send_json(send, 200, await post_diagnosis(receive))
+        else:
+            await send_json(send, 200, await post_batch(receive))
+    except APIError as e:
+        status = e.status
+        await send_json(send, e.status, {"error": {"code": e.code, "message": e.message}})
+    except Exception:
+        # 想定外のエラーは記録して 500 を返す（応答を送り始めた後の場合は送れないため、記録だけ残る）
+        status = 500
+        logger.exception("診断 API の処理中にエラーが発生しました: %s %s", method, path)
+        try:
+            await send_json(send, 500, {"error": {"code": "internal_error", "message": "サーバーでエラーが発生しました"}})
+        except Exception:
+            pass
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route=route or "unknown", status=status)
+
+
+async def handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            _executor.shutdown(wait=False, cancel_futures=True)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+# ASGI アプリケーション
+async def app(scope, receive, send):
+    if scope["type"] == "http":
+        await handle_http(scope, receive, send)
+    elif scope["type"] == "lifespan":
+        await handle_lifespan(receive, send)
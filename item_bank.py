@@ -0,0 +1,86 @@
+# 項目バンク（質問・評価ラベル・タイプ定義）の読み込み
+# tools/build_item_bank.py が assets/item_bank/<言語>.json から作成した data/item_bank.bin を読む。
+# ファイルは mmap で開き、起動時に読むのはヘッダー（タイプ名・質問 ID・質問とタイプの索引）だけ。
+# 質問文・評価ラベル・タイプ定義（四柱推命・陰陽五行などの長文）は、言語・タイプごとに
+# 初めて使うときに読み込み、件数に上限のあるキャッシュに保持する。mmap のページは
+# プロセス間で共有されるため、内容や言語が増えてもワーカーごとのメモリ使用量はほぼ増えない。
+import functools
+import json
+import mmap
+import os
+import struct
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATH = os.path.join(ROOT_DIR, "data", "item_bank.bin")
+
+# ファイル先頭: マジック、形式のバージョン、ヘッダー（JSON）の長さ
+MAGIC = b"ITEMBANK"
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct("<8sII")
+
+# 言語・タイプごとに保持するタイプ定義の件数
+DEFAULT_CACHE_SIZE = 64
+
+
+class ItemBank:
+    def __init__(self, path=DEFAULT_PATH, cache_size=DEFAULT_CACHE_SIZE):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_size = PREAMBLE.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"項目バンクのファイルではありません: {path}")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"未対応の項目バンクの形式です: {version}（対応: {FORMAT_VERSION}）")
+        header = json.loads(self._mm[PREAMBLE.size:PREAMBLE.size + header_size])
+        self._body_offset = PREAMBLE.size + header_size
+        self._sections = header["sections"]
+
+        self.bank_version = header["bank_version"]
+        self.content_hash = header["content_hash"]
+        self.default_language = header["default_language"]
+        self.languages = tuple(header["languages"])
+        self.type_names = tuple(header["type_names"])
+        self.type_ids = {name: type_id for type_id, name in enumerate(self.type_names)}
+        self.item_ids = tuple(header["item_ids"])
+        # 質問ごとのタイプ番号と、タイプごとの質問番号
+        self.item_types = tuple(header["item_types"])
+        self.type_items = tuple(tuple(items) for items in header["type_items"])
+
+        # インスタンスごとに上限付きのキャッシュを持つ
+        self.question_texts = functools.lru_cache(maxsize=cache_size)(self._question_texts)
+        self.rating_labels = functools.lru_cache(maxsize=cache_size)(self._rating_labels)
+        self.type_content = functools.lru_cache(maxsize=cache_size)(self._type_content)
+
+    def _read(self, entry):
+        offset, size = entry
+        start = self._body_offset + offset
+        return json.loads(self._mm[start:start + size])
+
+    def _section(self, language):
+        if language not in self._sections:
+            raise KeyError(f"項目バンクに言語 {language} がありません（{', '.join(self.languages)}）")
+        return self._sections[language]
+
+    # 質問文（質問番号の順のタプル）
+    def _question_texts(self, language):
+        return tuple(self._read(self._section(language)["questions"]))
+
+    # 評価ラベル（{評価: ラベル}）
+    def _rating_labels(self, language):
+        return {int(rating): label for rating, label in self._read(self._section(language)["rating_labels"]).items()}
+
+    # タイプ定義（英語名・説明・強み・推奨役割・育成ポイント・四柱推命・陰陽五行の dict）
+    def _type_content(self, type_id, language):
+        return self._read(self._section(language)["types"][type_id])
+
+    def close(self):
+        self._mm.close()
+
+
+# プロセス共通の項目バンク（パスとキャッシュの件数は環境変数で変更できる）
+@functools.lru_cache(maxsize=None)
+def get_default_bank():
+    path = os.getenv("ITEM_BANK_PATH") or DEFAULT_PATH
+    cache_size = int(os.getenv("ITEM_BANK_CACHE_SIZE", str(DEFAULT_CACHE_SIZE)))
+    return ItemBank(path, cache_size)
@@ -0,0 +1,230 @@
+# 回答ログの項目統計（ストリーミング集計）
+# 回答ベクトルの JSONL / CSV をチャンク単位で読み込み、質問ごとの平均・分散、質問間の相関、
+# タイプごとの信頼性係数（Cronbach の α）、タイプの分布を1回の走査で求める。
+# 集計はオンラインの累積量（件数・平均ベクトル・偏差の積和行列）だけを保持するため、
+# 件数によらずメモリ使用量は一定で、並列に集計した部分結果（シャード）を後からマージできる。
+#
+# 使い方:
+#   python item_stats.py answers.jsonl -o report.json
+#   python item_stats.py shard1.jsonl --state-out shard1.state.json     # 部分結果を保存
+#   python item_stats.py --merge shard1.state.json shard2.state.json -o report.json
+#
+# 入力形式は bulk_diagnose.py と同じ（results_store.py export の JSONL もそのまま使える）。
+# 1〜5 以外の値や未回答を含む行は集計せず、件数だけを数える。
+import argparse
+import io
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from type_data import questions, TYPE_NAMES, TYPE_ITEMS
+from scoring import score_answers
+from bulk_diagnose import iter_answer_rows, validate_answers, iter_chunks, bounded_map, guess_format, DEFAULT_CHUNK_SIZE
+
+RATINGS = [1, 2, 3, 4, 5]
+
+
+# 項目統計の累積量（チャンクごとに更新し、他の累積量とマージできる）
+class ItemStats:
+    def __init__(self, n_items=len(questions), n_types=len(TYPE_NAMES)):
+        self.count = 0
+        self.invalid = 0
+        self.mean = np.zeros(n_items)
+        # 平均からの偏差の積和（Σ(x - mean)(x - mean)^T）。分散・共分散はこれを (count - 1) で割る
+        self.comoment = np.zeros((n_items, n_items))
+        self.rating_counts = np.zeros((n_items, len(RATINGS)), dtype=np.int64)
+        self.type_counts = np.zeros(n_types, dtype=np.int64)
+
+    # N×質問数 の回答行列を追加
+    def update(self, matrix):
+        matrix = np.asarray(matrix, dtype=np.float64)
+        if not len(matrix):
+            return self
+        batch = ItemStats(*self.shape)
+        batch.count = len(matrix)
+        batch.mean = matrix.mean(axis=0)
+        centered = matrix - batch.mean
+        batch.comoment = centered.T @ centered
+        batch.rating_counts = np.stack([(matrix == r).sum(axis=0) for r in RATINGS], axis=1)
+        batch.type_counts = np.bincount(score_answers(matrix).main_type, minlength=len(self.type_counts))
+        return self.merge(batch)
+
+    # 別の累積量をマージ（Chan らの並列アルゴリズムで平均と偏差の積和を合成する）
+    def merge(self, other):
+        self.invalid += other.invalid
+        if other.count == 0:
+            return self
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.comoment = self.comoment + other.comoment + np.outer(delta, delta) * (self.count * other.count / total)
+        self.mean = self.mean + delta * (other.count / total)
+        self.count = total
+        self.rating_counts = self.rating_counts + other.rating_counts
+        self.type_counts = self.type_counts + other.type_counts
+        return self
+
+    @property
+    def shape(self):
+        return len(self.mean), len(self.type_counts)
+
+    def covariance(self):
+        if self.count < 2:
+            return np.full_like(self.comoment, np.nan)
+        return self.comoment / (self.count - 1)
+
+    def correlation(self):
+        covariance = self.covariance()
+        std = np.sqrt(np.diag(covariance))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return covariance / np.outer(std, std)
+
+    # 指定した質問群の Cronbach の α（質問が1つ、または合計点の分散が 0 の場合は None）
+    def cronbach_alpha(self, item_indexes):
+        k = len(item_indexes)
+        if k < 2 or self.count < 2:
+            return None
+        covariance = self.covariance()[np.ix_(item_indexes, item_indexes)]
+        total_variance = covariance.sum()
+        if total_variance <= 0:
+            return None
+        return float(k / (k - 1) * (1 - np.trace(covariance) / total_variance))
+
+    # 部分結果の保存用（JSON に変換できる dict）
+    def to_state(self):
+        return {
+            "count": self.count,
+            "invalid": self.invalid,
+            "mean": self.mean.tolist(),
+            "comoment": self.comoment.tolist(),
+            "rating_counts": self.rating_counts.tolist(),
+            "type_counts": self.type_counts.tolist()
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        stats = cls(len(state["mean"]), len(state["type_counts"]))
+        stats.count = state["count"]
+        stats.invalid = state["invalid"]
+        stats.mean = np.array(state["mean"], dtype=np.float64)
+        stats.comoment = np.array(state["comoment"], dtype=np.float64)
+        stats.rating_counts = np.array(state["rating_counts"], dtype=np.int64)
+        stats.type_counts = np.array(state["type_counts"], dtype=np.int64)
+        return stats
+
+    # 集計結果のレポート
+    def report(self):
+        variances = np.diag(self.covariance())
+        correlation = self.correlation()
+        items = []
+        for q_idx, q in enumerate(questions):
+            items.append({
+                "index": q_idx,
+                "question": q["質問"],
+                "type": q["タイプ"],
+                "mean": _round(self.mean[q_idx]),
+                "variance": _round(variances[q_idx]),
+                "std": _round(np.sqrt(variances[q_idx])),
+                "rating_counts": dict(zip(map(str, RATINGS), self.rating_counts[q_idx].tolist()))
+            })
+
+        reliability = {}
+        for type_name, item_indexes in zip(TYPE_NAMES, TYPE_ITEMS):
+            alpha = self.cronbach_alpha(item_indexes)
+            reliability[type_name] = {"items": item_indexes, "alpha": _round(alpha) if alpha is not None else None}
+
+        return {
+            "count": self.count,
+            "invalid": self.invalid,
+            "items": items,
+            "correlation": [[_round(v) for v in row] for row in correlation],
+            "reliability": reliability,
+            "type_distribution": {
+                t: {"count": int(c), "ratio": _round(c / self.count) if self.count else None}
+                for t, c in zip(TYPE_NAMES, self.type_counts)
+            }
+        }
+
+
+def _round(value, digits=4):
+    value = float(value)
+    return None if np.isnan(value) else round(value, digits)
+
+
+# ワーカープロセス: 1チャンク分の累積量を作る
+def stats_chunk(chunk):
+    rows = []
+    invalid = 0
+    for _, answers in chunk:
+        ratings = validate_answers(answers)
+        if ratings is None:
+            invalid += 1
+        else:
+            rows.append(ratings)
+    stats = ItemStats()
+    stats.invalid = invalid
+    if rows:
+        stats.update(np.array(rows, dtype=np.uint8))
+    return stats
+
+
+# 入力ストリームを集計して累積量に加える
+def accumulate(stats, stream, input_format, pool, workers, chunk_size):
+    chunks = iter_chunks(iter_answer_rows(stream, input_format), chunk_size)
+    for partial in bounded_map(pool, stats_chunk, chunks, workers * 2):
+        stats.merge(partial)
+    return stats
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="回答ログの項目統計（平均・分散・相関・信頼性・タイプ分布）")
+    parser.add_argument("inputs", nargs="*", help="回答データ（CSV / JSONL、- で標準入力）")
+    parser.add_argument("-o", "--output", default="-", help="レポートの出力先（JSON、- で標準出力）")
+    parser.add_argument("--input-format", choices=["csv", "jsonl"], help="入力形式（省略時は拡張子から推定）")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="集計に使うプロセス数")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="1タスクあたりの件数")
+    parser.add_argument("--merge", nargs="+", default=[], metavar="STATE", help="マージする部分結果（--state-out で保存したもの）")
+    parser.add_argument("--state-out", help="集計した累積量（部分結果）の保存先")
+    args = parser.parse_args(argv)
+    if not args.inputs and not args.merge:
+        parser.error("回答データか --merge の部分結果を指定してください")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    stats = ItemStats()
+    for path in args.merge:
+        with open(path, encoding="utf-8") as f:
+            stats.merge(ItemStats.from_state(json.load(f)))
+
+    if args.inputs:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            for path in args.inputs:
+                input_format = args.input_format or guess_format(path, "csv")
+                if path == "-":
+                    stream = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig")
+                else:
+                    stream = open(path, encoding="utf-8-sig", newline="")
+                with stream:
+                    accumulate(stats, stream, input_format, pool, args.workers, args.chunk_size)
+
+    if args.state_out:
+        with open(args.state_out, "w", encoding="utf-8") as f:
+            json.dump(stats.to_state(), f)
+
+    report = json.dumps(stats.report(), ensure_ascii=False, indent=2)
+    if args.output == "-":
+        print(report)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(report + "\n")
+    print(f"{stats.count}件を集計しました（対象外 {stats.invalid}件）", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+# 共有 OpenAI クライアント
+# プロセス内で1つのクライアント（keep-alive の接続プール・タイムアウト付き）を共有する
+import os
+import threading
+
+DEFAULT_TIMEOUT_SECONDS = 60.0
+DEFAULT_CONNECT_TIMEOUT_SECONDS = 5.0
+DEFAULT_MAX_CONNECTIONS = 20
+# 再試行は llm_scheduler がバックオフ・期限・サーキットブレーカーと合わせて行うため、クライアントでは行わない
+DEFAULT_MAX_RETRIES = 0
+
+_client = None
+_client_lock = threading.Lock()
+
+
+# 接続プールとタイムアウトを設定した OpenAI クライアントを作成
+def create_client(api_key=None, base_url=None):
+    # openai / httpx は読み込みに時間がかかるため、初めてクライアントを作るときに読み込む
+    import httpx
+    import openai
+
+    max_connections = int(os.getenv("OPENAI_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS))
+    timeout = httpx.Timeout(
+        float(os.getenv("OPENAI_TIMEOUT_SECONDS", DEFAULT_TIMEOUT_SECONDS)),
+        connect=float(os.getenv("OPENAI_CONNECT_TIMEOUT_SECONDS", DEFAULT_CONNECT_TIMEOUT_SECONDS))
+    )
+    http_client = httpx.Client(
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=60.0
+        )
+    )
+    return openai.OpenAI(
+        api_key=api_key or os.getenv("OPENAI_API_KEY"),
+        base_url=base_url or os.getenv("OPENAI_BASE_URL") or None,
+        timeout=timeout,
+        max_retries=int(os.getenv("OPENAI_MAX_RETRIES", DEFAULT_MAX_RETRIES)),
+        http_client=http_client
+    )
+
+
+# プロセス共通のクライアントを取得
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = create_client()
+    return _client
@@ -0,0 +1,349 @@
+# AI分析の API 呼び出しのスケジューラー
+# プロセス内のすべての API 呼び出しをここで受け付け、次の制御を行う。
+#   - レート制限: 1分あたりのリクエスト数（RPM）とトークン数（TPM）のトークンバケット。
+#     待ち時間を先に予約するため、到着順に送信される。
+#   - 期限: リクエストごとの期限（秒）。レート制限の待ちが期限を超える場合はすぐに諦め、
+#     API 呼び出しのタイムアウトも期限の残り時間に合わせる。タイムアウトは1回の読み取りごとにかかるため、
+#     ストリーミングの応答は stream_until() で読み、期限を過ぎたら途中で打ち切る。
+#   - 再試行: 429・5xx・タイムアウト・接続エラーは、ジッター付きの指数バックオフで再試行する
+#     （429 の Retry-After があればそれ以上待つ）。
+#   - サーキットブレーカー: 連続して失敗した場合は一定時間 API を呼ばずに CircuitOpenError を送出し、
+#     呼び出し側はすぐにローカル採点に切り替える。時間が過ぎたら1件だけ試して復旧を確認する。
+# 待ち行列の長さや待ち時間などは metrics() で参照できる。
+# 複数のプロセス（Streamlit と診断 API のワーカーなど）で同じクォータを使う場合は、プロセス数を
+# LLM_PROCESSES に指定する。LLM_RPM_LIMIT / LLM_TPM_LIMIT をプロセス数で割った値を各プロセスの上限にする。
+import collections
+import os
+import random
+import threading
+import time
+
+DEFAULT_RPM_LIMIT = 500
+DEFAULT_TPM_LIMIT = 300000
+# バケットの容量（何秒分のリクエストをまとめて送れるか）
+DEFAULT_BURST_SECONDS = 10.0
+DEFAULT_DEADLINE_SECONDS = 30.0
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_RETRY_BASE_SECONDS = 0.5
+DEFAULT_RETRY_MAX_SECONDS = 8.0
+DEFAULT_BREAKER_FAILURES = 5
+DEFAULT_BREAKER_RESET_SECONDS = 30.0
+
+# 待ち時間の統計に使う直近の件数
+WAIT_SAMPLES = 1000
+
+CIRCUIT_OPEN_MESSAGE = "AI分析の API が不調のため、呼び出しを停止しています"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class SchedulerError(RuntimeError):
+    pass
+
+
+# サーキットブレーカーが開いているため API を呼ばなかった
+class CircuitOpenError(SchedulerError):
+    pass
+
+
+# 期限までに API の応答を得られない（レート制限の待ち・再試行を含む）
+class DeadlineExceeded(SchedulerError):
+    pass
+
+
+# 再試行しても 429・5xx・タイムアウト・接続エラーが続いた
+class ProviderUnavailable(SchedulerError):
+    pass
+
+
+# トークンバケット（tokens は予約によって負になり、その分だけ後の呼び出しが待つ）
+class TokenBucket:
+    def __init__(self, per_minute, burst_seconds=DEFAULT_BURST_SECONDS):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # amount を使えるようになるまでの秒数
+    def wait_time(self, amount, now):
+        self._refill(now)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def take(self, amount):
+        self.tokens -= amount
+
+    # 見積もりより実際の使用量が少なかった分を戻す（多かった場合は負の値で追加で差し引く）
+    def credit(self, amount):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+# メッセージと最大出力トークン数から、使用トークン数を多めに見積もる（日本語はおおよそ1文字1トークン）
+def estimate_tokens(messages, max_tokens):
+    return sum(len(str(m.get("content", ""))) for m in messages) + max_tokens
+
+
+# 再試行する（プロバイダーの不調を示す）エラーか
+def is_retryable(error):
+    import openai
+
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+# 429 などの応答の Retry-After（秒）。無い場合は None
+def retry_after_seconds(error):
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LLMScheduler:
+    def __init__(self, rpm_limit=DEFAULT_RPM_LIMIT, tpm_limit=DEFAULT_TPM_LIMIT, burst_seconds=DEFAULT_BURST_SECONDS,
+                 deadline_seconds=DEFAULT_DEADLINE_SECONDS, max_retries=DEFAULT_MAX_RETRIES,
+                 retry_base_seconds=DEFAULT_RETRY_BASE_SECONDS, retry_max_seconds=DEFAULT_RETRY_MAX_SECONDS,
+                 breaker_failures=DEFAULT_BREAKER_FAILURES, breaker_reset_seconds=DEFAULT_BREAKER_RESET_SECONDS,
+                 seed=None):
+        # 上限が 0 の場合はレート制限しない
+        self._requests = TokenBucket(rpm_limit, burst_seconds) if rpm_limit > 0 else None
+        self._tokens = TokenBucket(tpm_limit, burst_seconds) if tpm_limit > 0 else None
+        self.deadline_seconds = deadline_seconds
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.breaker_failures = breaker_failures
+        self.breaker_reset_seconds = breaker_reset_seconds
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+
+        self._queue_depth = 0
+        self._in_flight = 0
+        self._waits = collections.deque(maxlen=WAIT_SAMPLES)
+        self._counts = collections.Counter()
+
+    # 期限の時刻（time.monotonic() の値）
+    def deadline_at(self, deadline_seconds=None):
+        return time.monotonic() + (deadline_seconds or self.deadline_seconds)
+
+    # fn(timeout) で API を呼び出す。timeout は期限までの残り秒数
+    # tokens はレート制限に使う見積もりトークン数。応答に usage があれば実際の使用量で精算する
+    # deadline（deadline_at() の値）を指定すると、deadline_seconds の代わりにその時刻を期限にする
+    def call(self, fn, tokens=0, deadline_seconds=None, deadline=None):
+        if deadline is None:
+            deadline = self.deadline_at(deadline_seconds)
+        attempt = 0
+        while True:
+            self._admit()
+            self._acquire(tokens, deadline)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._release_probe()
+                self._count("deadline_exceeded")
+                raise DeadlineExceeded("AI分析の期限を過ぎました")
+
+            with self._lock:
+                self._in_flight += 1
+                self._counts["attempts"] += 1
+            try:
+                result = fn(remaining)
+            except Exception as e:
+                retryable = is_retryable(e)
+                if retryable:
+                    self._record_failure()
+                else:
+                    # 4xx など（API 自体は応答している）はブレーカーの失敗に数えない
+                    self._record_success()
+                if not retryable:
+                    self._count("failures")
+                    raise
+                if attempt >= self.max_retries:
+                    self._count("failures")
+                    raise ProviderUnavailable(f"AI分析の API に接続できません: {e}") from e
+                delay = self._backoff(attempt, retry_after_seconds(e))
+                if time.monotonic() + delay >= deadline:
+                    self._count("deadline_exceeded")
+                    raise DeadlineExceeded(f"再試行する前に AI分析の期限を過ぎます: {e}") from e
+                self._count("retries")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+
+            self._record_success()
+            self._settle(tokens, result)
+            self._count("successes")
+            return result
+
+    # ストリーミングの応答のチャンクを期限まで返す（期限を過ぎたら応答を閉じて DeadlineExceeded）
+    # 少しずつチャンクが届き続ける応答は読み取りごとのタイムアウトにかからないため、ここで打ち切る
+    def stream_until(self, stream, deadline):
+        try:
+            for chunk in stream:
+                if time.monotonic() > deadline:
+                    self._count("deadline_exceeded")
+                    raise DeadlineExceeded("AI分析の応答を受け取り終える前に期限を過ぎました")
+                yield chunk
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+
+    # サーキットブレーカーの状態を確認する（開いていれば CircuitOpenError）
+    def _admit(self):
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.breaker_reset_seconds:
+                # 時間が過ぎたら1件だけ試す
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN:
+                if self._probe_in_flight:
+                    self._counts["short_circuited"] += 1
+                    raise CircuitOpenError(CIRCUIT_OPEN_MESSAGE)
+                self._probe_in_flight = True
+            elif self._state == OPEN:
+                self._counts["short_circuited"] += 1
+                raise CircuitOpenError(CIRCUIT_OPEN_MESSAGE)
+
+    # レート制限の待ち時間を予約して待つ（期限を超える場合は待たずに DeadlineExceeded）
+    def _acquire(self, tokens, deadline):
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self._requests is not None:
+                wait = max(wait, self._requests.wait_time(1, now))
+            if self._tokens is not None and tokens:
+                wait = max(wait, self._tokens.wait_time(tokens, now))
+            if now + wait >= deadline:
+                self._counts["deadline_exceeded"] += 1
+                self._release_probe_locked()
+                raise DeadlineExceeded(f"レート制限の待ち時間（{wait:.1f}秒）が AI分析の期限を超えます")
+            if self._requests is not None:
+                self._requests.take(1)
+            if self._tokens is not None and tokens:
+                self._tokens.take(tokens)
+            self._waits.append(wait)
+            self._queue_depth += 1
+        try:
+            if wait > 0:
+                time.sleep(wait)
+        finally:
+            with self._lock:
+                self._queue_depth -= 1
+
+    # 応答の usage（実際の使用トークン数）で見積もりとの差を精算する
+    def _settle(self, tokens, result):
+        usage = getattr(result, "usage", None)
+        total = getattr(usage, "total_tokens", None)
+        if self._tokens is None or not tokens or not total:
+            return
+        with self._lock:
+            self._tokens.credit(tokens - total)
+
+    def _backoff(self, attempt, retry_after):
+        delay = self._random.uniform(0, min(self.retry_max_seconds, self.retry_base_seconds * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(self.retry_max_seconds, retry_after))
+        return delay
+
+    def _record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def _record_failure(self):
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == HALF_OPEN or self._consecutive_failures >= self.breaker_failures:
+                if self._state != OPEN:
+                    self._counts["breaker_opened"] += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def _release_probe(self):
+        with self._lock:
+            self._release_probe_locked()
+
+    def _release_probe_locked(self):
+        if self._state == HALF_OPEN:
+            self._probe_in_flight = False
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    # サーキットブレーカーが開いているか（API を呼ばずにローカル採点にするべきか）
+    def is_open(self):
+        with self._lock:
+            return self._state == OPEN and time.monotonic() - self._opened_at < self.breaker_reset_seconds
+
+    # 現在の状態と累計の件数
+    def metrics(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            counts = dict(self._counts)
+            metrics = {
+                "state": self._state,
+                "queue_depth": self._queue_depth,
+                "in_flight": self._in_flight,
+                "consecutive_failures": self._consecutive_failures
+            }
+
+        def percentile(p):
+            return waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+
+        metrics["wait_seconds"] = {"p50": percentile(0.5), "p95": percentile(0.95), "max": waits[-1] if waits else 0.0}
+        for name in ("attempts", "successes", "failures", "retries", "deadline_exceeded", "short_circuited", "breaker_opened"):
+            metrics[name] = counts.get(name, 0)
+        return metrics
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+# プロセスごとの上限（0 は無制限のまま）
+def share_limit(limit, processes):
+    return max(1, limit // processes) if limit else 0
+
+
+# 環境変数の設定でスケジューラーを作成
+def create_scheduler():
+    processes = max(1, int(os.getenv("LLM_PROCESSES", "1")))
+    return LLMScheduler(
+        rpm_limit=share_limit(int(os.getenv("LLM_RPM_LIMIT", DEFAULT_RPM_LIMIT)), processes),
+        tpm_limit=share_limit(int(os.getenv("LLM_TPM_LIMIT", DEFAULT_TPM_LIMIT)), processes),
+        burst_seconds=float(os.getenv("LLM_BURST_SECONDS", DEFAULT_BURST_SECONDS)),
+        deadline_seconds=float(os.getenv("LLM_DEADLINE_SECONDS", DEFAULT_DEADLINE_SECONDS)),
+        max_retries=int(os.getenv("LLM_MAX_RETRIES", DEFAULT_MAX_RETRIES)),
+        retry_base_seconds=float(os.getenv("LLM_RETRY_BASE_SECONDS", DEFAULT_RETRY_BASE_SECONDS)),
+        retry_max_seconds=float(os.getenv("LLM_RETRY_MAX_SECONDS", DEFAULT_RETRY_MAX_SECONDS)),
+        breaker_failures=int(os.getenv("LLM_BREAKER_FAILURES", DEFAULT_BREAKER_FAILURES)),
+        breaker_reset_seconds=float(os.getenv("LLM_BREAKER_RESET_SECONDS", DEFAULT_BREAKER_RESET_SECONDS))
+    )
+
+
+# プロセス共通のスケジューラーを取得
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = create_scheduler()
+    return _scheduler
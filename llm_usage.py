@@ -0,0 +1,118 @@
+# AI分析の API 呼び出しごとの入出力トークン数と所要時間の記録
+# analysis.create_completion が呼び出しごとに CallUsage を1件記録する。
+# 直近の記録と、用途（structured / text / narrative）ごとの合計をプロセス内に保持し、
+# LLM_USAGE_LOG_PATH を指定した場合は1行1件の JSONL にも追記する。
+# トークン数はプロバイダーの usage を使う。ストリーミングで usage が返されない場合は
+# 文字数から見積もり、estimated を True にする。
+# 時間とトークン数は metrics.py のヒストグラム・カウンターにも記録する。
+import collections
+import json
+import os
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from metrics import LLM_REQUEST_SECONDS, LLM_TOKENS
+
+# 直近の記録を保持する件数
+RECENT_CALLS = 1000
+
+# usage が無い場合の見積もり（日本語はおおよそ1文字1トークン）
+CHARS_PER_TOKEN = 1
+
+
+class CallUsage(NamedTuple):
+    purpose: str                   # structured / text / narrative
+    model: str
+    prompt_version: str
+    input_tokens: int
+    cached_tokens: int             # 入力のうちプロバイダー側のプロンプトキャッシュから読まれたトークン数
+    output_tokens: int
+    queue_seconds: float           # 送信までの待ち時間（スケジューラーの待ち・再試行を含む）
+    ttft_seconds: Optional[float]  # 送信から最初のテキストを受け取るまで（ストリーミングのみ）
+    seconds: float                 # 送信から応答を受け取り終えるまで
+    estimated: bool                # トークン数を文字数から見積もったか
+
+
+# usage（応答のオブジェクト、またはストリーミングの最後のチャンクの dict）から値を取り出す
+def usage_value(usage, name, default=0):
+    if usage is None:
+        return default
+    value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+    return default if value is None else value
+
+
+# usage から (入力, キャッシュ済みの入力, 出力) のトークン数を取り出す
+def usage_tokens(usage):
+    details = usage_value(usage, "prompt_tokens_details", None)
+    return (
+        usage_value(usage, "prompt_tokens"),
+        usage_value(details, "cached_tokens"),
+        usage_value(usage, "completion_tokens")
+    )
+
+
+# テキストのトークン数の見積もり
+def estimate_text_tokens(text):
+    return len(text) // CHARS_PER_TOKEN
+
+
+class UsageLog:
+    def __init__(self, path=None, recent_size=RECENT_CALLS):
+        self.path = path
+        self._lock = threading.Lock()
+        self._recent = collections.deque(maxlen=recent_size)
+        self._totals = {}
+
+    # 1回の呼び出しを記録する
+    def record(self, usage):
+        LLM_REQUEST_SECONDS.observe(usage.queue_seconds, purpose=usage.purpose, stage="queue")
+        if usage.ttft_seconds is not None:
+            LLM_REQUEST_SECONDS.observe(usage.ttft_seconds, purpose=usage.purpose, stage="ttft")
+        LLM_REQUEST_SECONDS.observe(usage.seconds, purpose=usage.purpose, stage="total")
+        LLM_TOKENS.inc(usage.input_tokens, purpose=usage.purpose, kind="input")
+        LLM_TOKENS.inc(usage.cached_tokens, purpose=usage.purpose, kind="cached")
+        LLM_TOKENS.inc(usage.output_tokens, purpose=usage.purpose, kind="output")
+        with self._lock:
+            self._recent.append(usage)
+            totals = self._totals.setdefault(usage.purpose, {
+                "calls": 0, "input_tokens": 0, "cached_tokens": 0, "output_tokens": 0, "seconds": 0.0
+            })
+            totals["calls"] += 1
+            totals["input_tokens"] += usage.input_tokens
+            totals["cached_tokens"] += usage.cached_tokens
+            totals["output_tokens"] += usage.output_tokens
+            totals["seconds"] += usage.seconds
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(dict(usage._asdict(), at=time.time()), ensure_ascii=False) + "\n")
+
+    # 直近の記録（古い順）
+    def recent(self):
+        with self._lock:
+            return list(self._recent)
+
+    # 用途ごとの合計と、1回あたりの平均
+    def summary(self):
+        with self._lock:
+            totals = {purpose: dict(values) for purpose, values in self._totals.items()}
+        for values in totals.values():
+            calls = values["calls"]
+            values["input_tokens_per_call"] = values["input_tokens"] / calls
+            values["output_tokens_per_call"] = values["output_tokens"] / calls
+            values["cached_ratio"] = values["cached_tokens"] / values["input_tokens"] if values["input_tokens"] else 0.0
+            values["seconds_per_call"] = values["seconds"] / calls
+        return totals
+
+
+_usage_log = None
+_usage_log_lock = threading.Lock()
+
+
+# プロセス共通の記録を取得（LLM_USAGE_LOG_PATH を指定すると JSONL にも追記する）
+def get_usage_log():
+    global _usage_log
+    with _usage_log_lock:
+        if _usage_log is None:
+            _usage_log = UsageLog(os.getenv("LLM_USAGE_LOG_PATH") or None)
+    return _usage_log
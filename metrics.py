@@ -0,0 +1,269 @@
+# 処理時間などの計測（ヒストグラム・カウンター）と Prometheus のテキスト形式での書き出し
+# 標準ライブラリだけを使い、起動時に読み込んでも重いライブラリを読み込まない。
+# ヒストグラムは固定のバケットに数えるだけなので、1回の記録は数マイクロ秒で終わる。
+#
+# 書き出し（どちらも省略時は無効）:
+#   METRICS_PORT : 指定したポートで /metrics を HTTP で返す（Prometheus から収集する）
+#                  ポートを使えない場合は警告を記録し、HTTP では返さない
+#   METRICS_PATH : METRICS_WRITE_INTERVAL_SECONDS ごとに同じ内容をファイルに書き出す
+#
+# 使い方:
+#   with metrics.timer(metrics.PHASE_SECONDS, phase="rerun"):
+#       main()
+#   metrics.LLM_TOKENS.inc(120, purpose="structured", kind="input")
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 処理時間のバケットの上限（秒）
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+DEFAULT_WRITE_INTERVAL_SECONDS = 15.0
+
+logger = logging.getLogger(__name__)
+
+
+# ラベルの値の組をキーにする（ラベル名の順は固定）
+def _label_key(label_names, labels):
+    return tuple(str(labels.get(name, "")) for name in label_names)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(label_names, key, extra=()):
+    pairs = list(zip(label_names, key)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # ラベルの値の組 → [バケットごとの件数..., 上限超え, 合計, 件数, 最大]
+
+    def observe(self, value, **labels):
+        key = _label_key(self.label_names, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0, 0, value]
+            series[index] += 1
+            series[-3] += value
+            series[-2] += 1
+            if value > series[-1]:
+                series[-1] = value
+
+    # ラベルの値の組ごとの (バケットごとの件数, 合計, 件数, 最大)
+    def snapshot(self):
+        with self._lock:
+            return {key: (series[:-3], series[-3], series[-2], series[-1]) for key, series in self._series.items()}
+
+    # バケットの件数から分位点を見積もる（バケット内は線形に補間し、最大値を超えないようにする）
+    def quantile(self, q, **labels):
+        entry = self.snapshot().get(_label_key(self.label_names, labels))
+        return estimate_quantile(self.buckets, entry[0], q, entry[3]) if entry else None
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count, _) in sorted(self.snapshot().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.label_names, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.snapshot().items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+# バケットごとの件数から分位点を見積もる（maximum を指定した場合は、それを上限にする）
+def estimate_quantile(buckets, counts, q, maximum=None):
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    cumulative = 0
+    lower = 0.0
+    estimate = None
+    for bound, count in zip(buckets + (float("inf"),), counts):
+        if count and cumulative + count >= rank:
+            estimate = lower if bound == float("inf") else lower + (bound - lower) * (rank - cumulative) / count
+            break
+        cumulative += count
+        lower = bound
+    if estimate is None:
+        estimate = lower
+    if maximum is not None:
+        estimate = min(estimate, maximum)
+    return estimate
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, label_names, buckets))
+
+    def counter(self, name, help_text, label_names=()):
+        return self.register(Counter(name, help_text, label_names))
+
+    # 書き出すときに現在の値を返す関数を登録する（fn は [(名前, 説明, 値), ...] を返す。ゲージとして書き出す）
+    def register_collector(self, fn):
+        with self._lock:
+            if fn not in self._collectors:
+                self._collectors.append(fn)
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics)
+
+    # Prometheus のテキスト形式
+    def render(self):
+        with self._lock:
+            metrics, collectors = list(self._metrics), list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collect in collectors:
+            for name, help_text, value in collect():
+                if value is None:
+                    continue
+                lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {_format_value(value)}"])
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# アプリの各処理の時間（phase: import / theme / rerun / click / display_result / parse）
+PHASE_SECONDS = REGISTRY.histogram("app_phase_seconds", "Time spent in each app phase", ["phase"])
+# AI分析の API 呼び出しの時間（stage: queue = 送信までの待ち / ttft = 最初のテキストまで / total = 応答を受け取り終えるまで）
+LLM_REQUEST_SECONDS = REGISTRY.histogram("llm_request_seconds", "LLM API call latency by stage", ["purpose", "stage"])
+# AI分析の API 呼び出しのトークン数（kind: input / cached / output）
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "LLM API tokens", ["purpose", "kind"])
+
+
+# with ブロックの処理時間を記録する
+@contextmanager
+def timer(histogram, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+
+def render():
+    return REGISTRY.render()
+
+
+# ファイルに書き出す（読み込み途中のファイルが見えないよう、一時ファイルから置き換える）
+def write_file(path):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp_path, path)
+
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def _serve(port):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    try:
+        server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    except OSError as e:
+        # 同じポートを使う別のプロセス（複数のワーカーなど）がある場合も、アプリケーションは止めない
+        logger.warning("計測値の HTTP サーバーを起動できません（ポート %s）: %s", port, e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def _write_loop(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            write_file(path)
+        except OSError:
+            pass
+
+
+# 環境変数で指定された書き出しをプロセスごとに1回だけ開始する（何度呼んでもよい）
+def start_exporters():
+    global _exporters_started
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+        port = os.getenv("METRICS_PORT")
+        if port:
+            _serve(int(port))
+        path = os.getenv("METRICS_PATH")
+        if path:
+            interval = float(os.getenv("METRICS_WRITE_INTERVAL_SECONDS", DEFAULT_WRITE_INTERVAL_SECONDS))
+            threading.Thread(target=_write_loop, args=(path, interval), name="metrics-writer", daemon=True).start()
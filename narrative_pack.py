@@ -0,0 +1,145 @@
+# 事前生成した詳細分析（ナラティブパック）の読み込み
+# tools/pregenerate_narratives.py が、よく現れる結果のシグネチャ（主要タイプ × スコアの傾向）ごとに
+# 生成した詳細分析をまとめたファイル（data/narrative_pack.bin）を mmap で読み取り専用に開く。
+# パックにあるシグネチャの結果は、API を呼び出さずにその詳細分析を表示する。
+#
+# シグネチャは「主要タイプ:各タイプの段階」（例: "指揮官型:10000101"）。段階は、ローカル採点の
+# 正規化スコア（最高のタイプが 100 の整数）をパックのヘッダーにある境界（level_bounds）で分けた番号で、
+# TYPE_NAMES の順に並べる。
+#
+# ファイルの構成:
+#   先頭 16 バイト: マジック "NARRPACK"、形式のバージョン、ヘッダーの長さ（リトルエンディアン）
+#   ヘッダー（JSON）: パックのバージョン、生成に使ったモデル・プロンプトのハッシュ、項目バンクの内容のハッシュ、
+#                    段階の境界、母集団に占める割合、シグネチャ → 本体の (オフセット, 長さ)
+#   本体: シグネチャごとの詳細分析（UTF-8 を zlib で圧縮したもの）
+import bisect
+import functools
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from item_bank import ROOT_DIR
+from prompt_templates import profile_prompt_hash
+from type_data import TYPE_NAMES
+
+DEFAULT_PATH = os.path.join(ROOT_DIR, "data", "narrative_pack.bin")
+
+# ファイル先頭: マジック、形式のバージョン、ヘッダー（JSON）の長さ
+MAGIC = b"NARRPACK"
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct("<8sII")
+
+logger = logging.getLogger(__name__)
+
+
+# 正規化スコア（{タイプ名: 0〜100}）の段階の番号（TYPE_NAMES の順）
+def profile_levels(scores, level_bounds):
+    return [bisect.bisect_right(level_bounds, int(scores[t])) for t in TYPE_NAMES]
+
+
+def make_signature(main_type, levels):
+    return f"{main_type}:{''.join(map(str, levels))}"
+
+
+# パックのバイト列を作る（entries は {シグネチャ: 詳細分析}、header はヘッダーに加える項目）
+def build_pack(entries, header):
+    blob = bytearray()
+    index = {}
+    for signature in sorted(entries):
+        data = zlib.compress(entries[signature].encode("utf-8"), 9)
+        index[signature] = [len(blob), len(data)]
+        blob.extend(data)
+    header_bytes = json.dumps(dict(header, entries=index), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)) + header_bytes + bytes(blob)
+
+
+class NarrativePack:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_size = PREAMBLE.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"ナラティブパックのファイルではありません: {path}")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"未対応のナラティブパックの形式です: {version}（対応: {FORMAT_VERSION}）")
+        header = json.loads(self._mm[PREAMBLE.size:PREAMBLE.size + header_size])
+        self._body_offset = PREAMBLE.size + header_size
+        self._entries = header.pop("entries")
+
+        self.pack_version = header["pack_version"]
+        self.model = header["model"]
+        self.prompt_hash = header["prompt_hash"]
+        self.content_hash = header["content_hash"]
+        self.level_bounds = tuple(header["level_bounds"])
+        self.coverage = header.get("coverage")
+        self.header = header
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, signature):
+        return signature in self._entries
+
+    def signature(self, main_type, scores):
+        return make_signature(main_type, profile_levels(scores, self.level_bounds))
+
+    def get(self, signature):
+        entry = self._entries.get(signature)
+        if entry is None:
+            return None
+        offset, size = entry
+        start = self._body_offset + offset
+        return zlib.decompress(self._mm[start:start + size]).decode("utf-8")
+
+    # 主要タイプとローカル採点の正規化スコアに合う詳細分析（パックに無い場合は None）
+    def lookup(self, main_type, scores):
+        text = self.get(self.signature(main_type, scores))
+        with self._lock:
+            if text is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return text
+
+    def close(self):
+        self._mm.close()
+
+
+# パックが現在の設定で生成したものでない理由（一致する場合は None）
+# model は API で詳細分析を生成する場合のモデル。項目バンク・モデル・プロンプトのどれかが異なるパックは使わない
+def mismatch_reason(pack, model, content_hash):
+    if pack.content_hash != content_hash:
+        return "項目バンクの質問・タイプが異なります"
+    if pack.model != model:
+        return f"生成したモデル（{pack.model}）が現在の設定（{model}）と異なります"
+    if pack.prompt_hash != profile_prompt_hash(len(pack.level_bounds) + 1):
+        return "生成したプロンプトが現在のプロンプトと異なります"
+    return None
+
+
+# プロセス共通のパック（NARRATIVE_PACK_PATH で変更できる。空にすると使わない）
+# ファイルが無い場合と、現在の設定と異なる項目バンク・モデル・プロンプトで生成したパックの場合は None
+@functools.lru_cache(maxsize=None)
+def get_default_pack(model):
+    from item_bank import get_default_bank
+
+    path = os.getenv("NARRATIVE_PACK_PATH", DEFAULT_PATH)
+    if not path or not os.path.exists(path):
+        return None
+    pack = NarrativePack(path)
+    reason = mismatch_reason(pack, model, get_default_bank().content_hash)
+    if reason is not None:
+        logger.warning("ナラティブパック %s を使いません: %s（tools/pregenerate_narratives.py で作り直してください）",
+                       path, reason)
+        pack.close()
+        return None
+    return pack
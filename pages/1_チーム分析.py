@@ -0,0 +1,176 @@
+# チーム分析のページ
+# 名簿（CSV / JSONL）または保存した診断結果から、所属ごとのタイプ構成・目標構成との差・
+# タイプ別スコアの重心・五行の相性によるペアの提案を表示する（集計は team_analytics.py）。
+# 読み込んだ名簿は内容ごとに、分析結果は名簿のハッシュと目標構成ごとにキャッシュするため、
+# 目標構成や表示する所属を変えても名簿を読み込み直さない。
+import io
+import json
+from datetime import datetime, time as dt_time
+
+import streamlit as st
+from dotenv import load_dotenv
+
+from theme import theme_style
+from type_data import TYPE_NAMES
+
+# 環境変数の読み込み
+load_dotenv()
+
+# ページ設定
+st.set_page_config(
+    page_title="チーム分析 | AI継続力タイプ診断",
+    page_icon="🔮",
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
+st.markdown(theme_style(), unsafe_allow_html=True)
+
+
+# アップロードされた名簿を読み込む（同じ内容のファイルは読み込み直さない）
+@st.cache_data(max_entries=8, show_spinner=False)
+def load_uploaded_roster(data, input_format):
+    from results_store import get_default_store
+    from team_analytics import load_roster
+
+    return load_roster(io.BytesIO(data), input_format, get_default_store())
+
+
+# 結果ストアの診断結果を名簿にする（新しい結果を反映するため、一定時間ごとに読み込み直す）
+@st.cache_data(ttl=60, max_entries=8, show_spinner=False)
+def load_store_roster(since, until):
+    from results_store import get_default_store
+    from team_analytics import roster_from_store
+
+    store = get_default_store()
+    if store is None:
+        return None
+    return roster_from_store(store, since=since, until=until)
+
+
+# 目標構成とタイプ別の割合の比較グラフ
+def share_chart(types):
+    import plotly.graph_objects as go
+
+    figure = go.Figure([
+        go.Bar(name="現在", x=types.index, y=types["割合"] * 100, marker_color="#4A4A4A"),
+        go.Bar(name="目標", x=types.index, y=types["目標"] * 100, marker_color="#B0B0B0")
+    ])
+    figure.update_layout(
+        barmode="group",
+        yaxis=dict(title="%"),
+        margin=dict(l=0, r=0, t=10, b=0),
+        height=320,
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)"
+    )
+    return figure
+
+
+def day_start(value):
+    return datetime.combine(value, dt_time.min).timestamp() if value else None
+
+
+def select_roster():
+    source = st.radio("名簿", ["名簿ファイル", "保存した診断結果"], horizontal=True)
+    if source == "名簿ファイル":
+        uploaded = st.file_uploader(
+            "名簿（CSV / JSONL）", type=["csv", "jsonl", "ndjson"],
+            help="id・group（所属）と、質問順の回答（answers 列、または回答の列）か result_id（結果ID）を含むファイル"
+        )
+        if uploaded is None:
+            return None
+        input_format = "csv" if uploaded.name.lower().endswith(".csv") else "jsonl"
+        return load_uploaded_roster(uploaded.getvalue(), input_format)
+
+    col1, col2 = st.columns(2)
+    since = col1.date_input("開始日", value=None)
+    until = col2.date_input("終了日（この日を含まない）", value=None)
+    roster = load_store_roster(day_start(since), day_start(until))
+    if roster is None:
+        st.warning("診断結果の保存が無効です（RESULTS_STORE_PATH）")
+    return roster
+
+
+def select_target():
+    target = {}
+    with st.expander("目標構成（タイプごとの人数の比）"):
+        columns = st.columns(4)
+        for i, type_name in enumerate(TYPE_NAMES):
+            target[type_name] = columns[i % 4].number_input(
+                type_name, min_value=0.0, value=1.0, step=1.0, key=f"team_target_{type_name}"
+            )
+    return target
+
+
+def display_report(report):
+    from team_analytics import report_frames
+
+    frames = report_frames(report)
+    overall = report["overall"]
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("人数", f"{report['size']:,}")
+    col2.metric("所属", len(report["groups"]))
+    col3.metric("チームの補完度", f"{overall['complementarity']:.3f}")
+    if report["invalid"]:
+        st.caption(f"回答を読み込めなかった {report['invalid']} 行は集計していません")
+
+    st.markdown("### タイプ構成と目標構成との差")
+    st.plotly_chart(share_chart(frames["types"]), use_container_width=True, config={"displayModeBar": False})
+    st.dataframe(frames["types"], use_container_width=True)
+    st.caption("「加えたときの補完度」は、そのタイプの人を1人加えたときの、チームの人との補完度の平均です")
+
+    st.markdown("### 補完度の高いペア")
+    if len(frames["pairings"]):
+        st.dataframe(frames["pairings"], hide_index=True, use_container_width=True)
+        partners = [f"{t} → {partner}" for t, partner in report["best_partners"].items() if partner]
+        st.markdown("タイプごとの最も補完度の高い相手（名簿にいるタイプから）: " + "、".join(partners))
+    else:
+        st.markdown("名簿に2タイプ以上いる場合に提案します。")
+    elements = report["elements"]
+    st.caption("補完度は各タイプの陰陽五行（" + "、".join(
+        f"{t}: {e['polarity']}の{e['element']}" for t, e in elements.items()
+    ) + "）と、バランスのために取り入れるとよい要素から求めています")
+
+    if len(report["groups"]) > 1:
+        st.markdown("### 所属ごとのタイプ構成")
+        st.dataframe(frames["groups"], use_container_width=True)
+
+    if len(frames["centroids"]):
+        st.markdown("### 主要タイプごとの平均スコア")
+        st.dataframe(frames["centroids"], use_container_width=True)
+
+    st.download_button(
+        "分析結果を JSON で保存",
+        json.dumps(report, ensure_ascii=False, indent=2),
+        file_name=f"team_report_{report['roster_hash']}.json",
+        mime="application/json"
+    )
+
+
+def main():
+    st.markdown("## チーム分析")
+    st.markdown("部署やチームの継続力タイプの構成を、目標構成や五行の相性と比べて確認できます。")
+
+    try:
+        roster = select_roster()
+    except ValueError as e:
+        st.error(f"名簿を読み込めません: {e}")
+        return
+    if roster is None:
+        return
+    if not roster.ids:
+        st.info("集計できる回答がありません")
+        return
+
+    from team_analytics import analyze_team
+
+    try:
+        report = analyze_team(roster, select_target())
+    except ValueError as e:
+        st.error(str(e))
+        return
+    display_report(report)
+
+
+main()
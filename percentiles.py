@@ -0,0 +1,98 @@
+# 母集団との比較（タイプ別のパーセンタイルと主要タイプの多さの順位）の読み込み
+# tools/build_percentiles.py が事前に作成した表（data/percentiles.bin）を mmap で開き、
+# 結果画面の表示ごとの集計はせずに、回答から表を1回ずつ引くだけで求める。
+#
+# タイプ別のスコア（タイプの質問の平均評価）は、そのタイプの質問への回答だけで決まる。
+# そのため表はタイプごとに、タイプの質問の評価を5進数にした番号（評価 1〜5 → 桁 0〜4）で引く
+# パーセンタイル（uint16、0.01% 単位）の配列になっている。全回答の組（5^10 通り）を番号にした
+# 表と同じ値を返し、大きさはタイプごとに 5^(質問数) 件で済む。
+# パーセンタイルは「母集団でそのタイプのスコアがより低い割合 + 同じ割合の半分」。
+#
+# ファイルの構成:
+#   先頭 16 バイト: マジック "PCTTABLE"、形式のバージョン、ヘッダーの長さ（リトルエンディアン）
+#   ヘッダー（JSON）: 項目バンクの内容のハッシュ、母集団（uniform / results）と件数、タイプ名、
+#                    タイプごとの質問番号、主要タイプの割合、本体の各タイプの表の (オフセット, 件数)
+#   本体: タイプごとのパーセンタイルの配列
+import functools
+import json
+import mmap
+import os
+import struct
+
+from item_bank import ROOT_DIR
+
+DEFAULT_PATH = os.path.join(ROOT_DIR, "data", "percentiles.bin")
+
+# ファイル先頭: マジック、形式のバージョン、ヘッダー（JSON）の長さ
+MAGIC = b"PCTTABLE"
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct("<8sII")
+
+# 表の値（パーセンタイル × SCALE の uint16）
+VALUE = struct.Struct("<H")
+SCALE = 100
+
+
+# 評価（1〜5）の列を5進数の番号にする（先頭の評価が最下位の桁）
+def encode_ratings(ratings):
+    index = 0
+    for rating in reversed(ratings):
+        index = index * 5 + (rating - 1)
+    return index
+
+
+class PercentileTable:
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_size = PREAMBLE.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"パーセンタイル表のファイルではありません: {path}")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"未対応のパーセンタイル表の形式です: {version}（対応: {FORMAT_VERSION}）")
+        header = json.loads(self._mm[PREAMBLE.size:PREAMBLE.size + header_size])
+        self._body_offset = PREAMBLE.size + header_size
+
+        self.content_hash = header["content_hash"]
+        self.population = header["population"]
+        self.population_size = header["population_size"]
+        self.type_names = tuple(header["type_names"])
+        self.type_items = tuple(tuple(items) for items in header["type_items"])
+        self._offsets = [offset for offset, _ in header["sections"]]
+        # 主要タイプの割合と、多い順の順位（1 が最も多い）
+        self.type_shares = dict(zip(self.type_names, header["type_shares"]))
+        ordered = sorted(self.type_names, key=lambda name: -self.type_shares[name])
+        self.type_ranks = {name: ordered.index(name) + 1 for name in self.type_names}
+
+    # タイプ別のパーセンタイル（{タイプ名: 0〜100}。回答は質問順の 1〜5 の評価で、未回答を含まないこと）
+    def type_percentiles(self, answers):
+        percentiles = {}
+        for type_name, items, offset in zip(self.type_names, self.type_items, self._offsets):
+            index = encode_ratings([answers[q_idx] for q_idx in items])
+            value, = VALUE.unpack_from(self._mm, self._body_offset + offset + index * VALUE.size)
+            percentiles[type_name] = value / SCALE
+        return percentiles
+
+    # 主要タイプの母集団での割合（0〜1）と多い順の順位
+    def type_frequency(self, main_type):
+        return self.type_shares[main_type], self.type_ranks[main_type]
+
+    def close(self):
+        self._mm.close()
+
+
+# プロセス共通の表（PERCENTILE_TABLE_PATH で変更できる）
+# ファイルが無い場合と、現在の項目バンクと異なる質問から作成した表の場合は None
+@functools.lru_cache(maxsize=None)
+def get_default_table():
+    from item_bank import get_default_bank
+
+    path = os.getenv("PERCENTILE_TABLE_PATH") or DEFAULT_PATH
+    if not os.path.exists(path):
+        return None
+    table = PercentileTable(path)
+    if table.content_hash != get_default_bank().content_hash:
+        table.close()
+        return None
+    return table
@@ -0,0 +1,174 @@
+# AI分析のプロンプトテンプレート（バージョンごと）
+# 各バージョンは、出力モードごとの system プロンプトと、回答からユーザープロンプトを作る関数を持つ。
+# system プロンプトは回答によらない固定の文字列で、プロセスの起動時に1回だけ作る。
+#
+#   "2" : 従来の形式。質問文と評価ラベル（例: "5 (とてもそう思う)"）を回答ごとにユーザープロンプトに並べる
+#   "3" : 圧縮形式。タイプの説明・質問の凡例・回答の形式を system プロンプトの先頭に1回だけ書き、
+#         ユーザープロンプトは「回答: 5314-2--35」のような評価の数字列だけにする。
+#         system プロンプトはすべての呼び出しでバイト単位で同じため、プロバイダー側の
+#         プロンプトキャッシュ（同じ先頭部分の再利用）が効く
+#
+# テンプレートの内容を変更した場合は、新しいバージョンを追加する（バージョンは分析キャッシュのキーに含まれる）
+import hashlib
+import json
+from typing import Callable, NamedTuple
+
+from type_data import questions, personality_types, RATING_LABELS, TYPE_NAMES
+
+
+class PromptTemplate(NamedTuple):
+    version: str
+    text_system: str                     # テキストモード（自由記述の分析）
+    structured_system: str               # 構造化出力モード（JSON）
+    narrative_system: str                # 長文の詳細分析
+    user_prompt: Callable                # 回答の dict → ユーザープロンプト
+    narrative_prompt: Callable           # 回答の dict・主要タイプ・英語名 → 詳細分析のユーザープロンプト
+
+
+TYPE_DESCRIPTIONS = """各タイプの特徴:
+1. 指揮官型 (Commander): 目標設定とリーダーシップに優れ、他者を導く能力がある
+2. 分析者型 (Analyzer): 論理的分析と詳細な検討を得意とする
+3. 実行者型 (Implementer): 計画を具体的な行動に移し、効率的に実行する
+4. 創造者型 (Creator): 新しいアイデアと革新的な解決策を生み出す
+5. 調整者型 (Coordinator): チーム内の協力促進と効果的なコミュニケーションを確立する
+6. 安定者型 (Stabilizer): 一貫性と信頼性をもって業務を遂行し、安定した結果を提供する
+7. 完遂者型 (Finisher): 高い品質基準を持ち、細部に注意しながらプロジェクトを完遂する
+8. 触媒型 (Catalyst): 変化を促進し、他者にインスピレーションを与える
+"""
+
+STRUCTURED_OUTPUT_FORMAT = f"""次の形式の JSON オブジェクトのみを出力してください。
+{{"main_type": "<タイプ名>", "scores": {{{", ".join(f'"{t}": <0-100の整数>' for t in TYPE_NAMES)}}}, "rationale": "<判断理由を200字以内で>"}}
+"""
+
+
+# --- バージョン 2（従来の形式） ---
+
+V2_TEXT_SYSTEM = f"""
+あなたは性格診断の専門家です。ユーザーの回答パターンを分析し、8つの継続力タイプ（指揮官型、分析者型、実行者型、創造者型、調整者型、安定者型、完遂者型、触媒型）から最も適切なタイプを特定してください。
+
+{TYPE_DESCRIPTIONS}
+以下の回答に基づいて、最も当てはまる継続力タイプを1つ決定し、なぜそのタイプだと判断したかの理由も説明してください。また、各タイプのスコア（0-100の数値）も提供してください。
+"""
+
+V2_STRUCTURED_SYSTEM = f"""あなたは性格診断の専門家です。ユーザーの回答パターンから、8つの継続力タイプのうち最も当てはまるタイプを1つ決定してください。
+
+{TYPE_DESCRIPTIONS}
+{STRUCTURED_OUTPUT_FORMAT}"""
+
+V2_NARRATIVE_SYSTEM = """
+あなたは性格診断の専門家です。ユーザーの回答パターンと診断された継続力タイプをもとに、仕事への取り組み方の特徴、強みの活かし方、成長のためのアドバイスを詳しく説明してください。
+"""
+
+
+# 質問文と評価ラベルを回答ごとに並べる
+def v2_answer_lines(answers):
+    user_responses = []
+    for q_idx, rating in answers.items():
+        question = questions[q_idx]["質問"]
+        rating_text = RATING_LABELS.get(rating, "")
+        user_responses.append(f"質問: {question}\n回答: {rating} ({rating_text})")
+    return "\n\n".join(user_responses)
+
+
+def v2_user_prompt(answers):
+    return f"以下はユーザーの回答です：\n\n{v2_answer_lines(answers)}\n\nこの回答パターンから判断される継続力タイプとその理由、および各タイプのスコアを教えてください。"
+
+
+def v2_narrative_prompt(answers, main_type, english_name):
+    return f"{v2_user_prompt(answers)}\n\n診断された継続力タイプ: {main_type} ({english_name})"
+
+
+# --- バージョン 3（圧縮形式） ---
+
+# 回答の数字列で未回答を表す文字
+UNANSWERED_MARK = "-"
+
+# すべての出力モードで共通の先頭部分（タイプの説明・質問の凡例・回答の形式）
+V3_LEGEND = (
+    "あなたは性格診断の専門家です。継続力タイプ診断の回答を分析します。\n\n"
+    f"{TYPE_DESCRIPTIONS}\n"
+    "質問（番号: 測るタイプ / 質問文）:\n"
+    + "".join(f"Q{i + 1}: {q['タイプ']} / {q['質問']}\n" for i, q in enumerate(questions))
+    + "\n回答の形式: 「回答:」の後に Q1 から順に評価を1文字ずつ並べる（"
+    + ", ".join(f"{rating}={label}" for rating, label in sorted(RATING_LABELS.items()))
+    + f", {UNANSWERED_MARK}=未回答）。\n\n"
+)
+
+V3_TEXT_SYSTEM = V3_LEGEND + (
+    "回答に基づいて、最も当てはまる継続力タイプを1つ決定し、なぜそのタイプだと判断したかの理由も説明してください。"
+    "また、各タイプのスコア（0-100の数値）を「タイプ名: 数値%」の形式で提供してください。\n"
+)
+
+V3_STRUCTURED_SYSTEM = V3_LEGEND + "回答から、8つの継続力タイプのうち最も当てはまるタイプを1つ決定してください。\n" + STRUCTURED_OUTPUT_FORMAT
+
+V3_NARRATIVE_SYSTEM = V3_LEGEND + (
+    "回答と診断された継続力タイプをもとに、仕事への取り組み方の特徴、強みの活かし方、成長のためのアドバイスを詳しく説明してください。\n"
+)
+
+
+# 回答を Q1 から順の評価の数字列にする（例: "5314-2--35"）
+def encode_answers(answers):
+    return "".join(str(answers[q_idx]) if q_idx in answers else UNANSWERED_MARK for q_idx in range(len(questions)))
+
+
+def v3_user_prompt(answers):
+    return f"回答: {encode_answers(answers)}"
+
+
+def v3_narrative_prompt(answers, main_type, english_name):
+    return f"回答: {encode_answers(answers)}\n診断: {main_type} ({english_name})"
+
+
+# --- 事前生成する詳細分析（tools/pregenerate_narratives.py） ---
+# 個別の回答ではなく、主要タイプと各タイプのスコアの段階（結果のシグネチャ）から、同じ傾向の人に共通する
+# 詳細分析を生成する。内容を変更するとハッシュが変わり、以前のパック・チェックポイントとは混ざらない
+
+PROFILE_NARRATIVE_SYSTEM = (
+    "あなたは性格診断の専門家です。継続力タイプ診断の結果（診断された主要タイプと、各タイプのスコアの段階）をもとに、"
+    "仕事への取り組み方の特徴、強みの活かし方、成長のためのアドバイスを詳しく説明してください。"
+    "回答者本人に語りかける文体で書き、スコアの数値や段階の名前はそのまま書かないでください。\n\n"
+    f"{TYPE_DESCRIPTIONS}"
+)
+
+
+# 段階の名前（段階の数ごと）
+def profile_level_names(n_levels):
+    if n_levels == 2:
+        return ("低め", "高め")
+    if n_levels == 3:
+        return ("低め", "中程度", "高め")
+    return tuple(f"{i + 1}/{n_levels}" for i in range(n_levels))
+
+
+def profile_narrative_prompt(main_type, english_name, levels, n_levels):
+    names = profile_level_names(n_levels)
+    profile = ", ".join(f"{t}={names[level]}" for t, level in zip(TYPE_NAMES, levels) if t != main_type)
+    return f"診断: {main_type} ({english_name})\n他のタイプのスコア: {profile}"
+
+
+def profile_narrative_messages(main_type, levels, n_levels):
+    user_prompt = profile_narrative_prompt(main_type, personality_types[main_type]["英語名"], levels, n_levels)
+    return [
+        {"role": "system", "content": PROFILE_NARRATIVE_SYSTEM},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+# プロンプトの内容のハッシュ（パック・チェックポイントが現在のプロンプトで生成したものかの確認に使う）
+def profile_prompt_hash(n_levels):
+    sample = profile_narrative_messages(TYPE_NAMES[0], [0] * len(TYPE_NAMES), n_levels)
+    return hashlib.sha256(json.dumps(sample, ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+
+
+TEMPLATES = {
+    "2": PromptTemplate("2", V2_TEXT_SYSTEM, V2_STRUCTURED_SYSTEM, V2_NARRATIVE_SYSTEM, v2_user_prompt, v2_narrative_prompt),
+    "3": PromptTemplate("3", V3_TEXT_SYSTEM, V3_STRUCTURED_SYSTEM, V3_NARRATIVE_SYSTEM, v3_user_prompt, v3_narrative_prompt),
+}
+LATEST_VERSION = "3"
+
+
+# バージョンを指定してテンプレートを取得
+def get_template(version):
+    if version not in TEMPLATES:
+        raise ValueError(f"未知のプロンプトのバージョンです: {version}（{', '.join(TEMPLATES)}）")
+    return TEMPLATES[version]
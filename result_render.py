@@ -0,0 +1,91 @@
+# 結果画面の描画部品
+# タイプごとに変わらない結果カードの HTML はタイプごとに1回だけ作成してメモ化し、
+# スコア分布のグラフは整数に丸めたスコアの組ごとにメモ化する。
+# 結果画面の1回の描画で送る要素数を、項目ごとの st.markdown / st.progress から数個に減らす。
+import functools
+
+from type_data import personality_types, TYPE_NAMES
+
+# メモ化するグラフの数（スコアの組み合わせごと）
+CHART_CACHE_SIZE = 4096
+
+
+def _item_list(items, css_class):
+    return "".join(f'<div class="{css_class}">{item}</div>' for item in items)
+
+
+# 結果カード（タイプ名・概要・強み・推奨役割・育成ポイント・四柱推命・陰陽五行）の HTML
+@functools.lru_cache(maxsize=None)
+def type_card_html(main_type):
+    info = personality_types[main_type]
+    return (
+        f'<div class="result-card">'
+        f'<h2 class="personality-title">{main_type} ({info["英語名"]})</h2>'
+        f'<h3>継続力タイプの概要</h3><p>{info["説明"]}</p>'
+        f'<h3>強み</h3>{_item_list(info["強み"], "strength-item")}'
+        f'<h3>推奨役割</h3>{_item_list(info["推奨役割"], "role-item")}'
+        f'<h3>育成ポイント</h3>{_item_list(info["育成ポイント"], "growth-item")}'
+        f'<h3>四柱推命からの解釈</h3><div class="eastern-philosophy-item">{info["四柱推命"]}</div>'
+        f'<h3>陰陽五行からの解釈</h3><div class="eastern-philosophy-item">{info["陰陽五行"]}</div>'
+        f'</div>'
+    )
+
+
+# スコアの dict を、グラフのキャッシュキー（TYPE_NAMES 順の整数タプル）に変換
+def score_key(scores):
+    return tuple(int(scores.get(t, 0)) for t in TYPE_NAMES)
+
+
+# 未回答の質問を含むタイプの表示名
+ESTIMATED_LABEL = "未回答（推定）"
+
+
+# スコア分布の横棒グラフ（plotly は初めて描画するときに読み込む）
+# estimated は TYPE_NAMES 順の、未回答の質問を含むかどうか。含むタイプは薄い色で「未回答（推定）」と表示する
+@functools.lru_cache(maxsize=CHART_CACHE_SIZE)
+def score_chart(score_tuple, estimated=None):
+    import plotly.graph_objects as go
+
+    estimated = estimated or (False,) * len(TYPE_NAMES)
+    # 上から TYPE_NAMES の順に並べる
+    names = [f"{t}<br>{ESTIMATED_LABEL}" if e else t for t, e in zip(TYPE_NAMES, estimated)][::-1]
+    values = list(reversed(score_tuple))
+    figure = go.Figure(
+        go.Bar(
+            x=values,
+            y=names,
+            orientation="h",
+            text=[f"{v}%" for v in values],
+            textposition="outside",
+            marker_color=["#B0B0B0" if e else "#4A4A4A" for e in reversed(estimated)],
+            hovertemplate="%{y}: %{x}%<extra></extra>"
+        )
+    )
+    figure.update_layout(
+        xaxis=dict(range=[0, 115], visible=False),
+        yaxis=dict(tickfont=dict(size=14)),
+        margin=dict(l=0, r=0, t=10, b=0),
+        height=360,
+        plot_bgcolor="rgba(0,0,0,0)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        showlegend=False
+    )
+    return figure
+
+
+# 母集団との比較（主要タイプの多さの順位とタイプ別のパーセンタイル）の Markdown
+# estimated（TYPE_NAMES 順の、未回答の質問を含むかどうか）が真のタイプは、推定値と分かるように表示する
+def comparison_markdown(main_type, percentiles, share, rank, population, population_size, estimated=None):
+    estimated = estimated or (False,) * len(TYPE_NAMES)
+    basis = "すべての回答の組み合わせ" if population == "uniform" else f"これまでの診断結果（{population_size}件）"
+    lines = [
+        f"{main_type}は全体の **{share * 100:.1f}%**（{len(TYPE_NAMES)}タイプ中 {rank} 番目に多いタイプ）です。",
+        ""
+    ]
+    for t, e in zip(TYPE_NAMES, estimated):
+        top = f"上位 {max(1, round(100 - percentiles[t]))}%"
+        lines.append(f"- {t}: {top}（推定）" if e else f"- {t}: {top}")
+    lines.extend(["", f"※ {basis}との比較"])
+    if any(estimated):
+        lines.append("※（推定）は未回答の質問を含むタイプで、出題しなかった質問を中央の評価として求めた目安です")
+    return "\n".join(lines)
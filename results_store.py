@@ -0,0 +1,400 @@
+# 診断結果の保存（結果ストア）
+# 完了した診断ごとに、回答ベクトル・主要タイプ・スコア・モデルとプロンプトのバージョン・所要時間を
+# SQLite（WAL モード）に記録する（回答とスコアは TYPE_NAMES 順のバイト列で保存する）。
+# record() はキューに入れるだけで、書き込みはバックグラウンドのスレッドがまとめて
+# 1つのトランザクションで行う（画面の処理はディスクへの書き込みを待たない）。
+# 書き込めなかった行はエラーの件数に数えて捨て、スレッドは書き込みを続ける。close() の後の record() も
+# エラーに数え、flush() はすぐに戻る。
+# 結果 ID での再表示と、タイプ・日時・回答ハッシュでの絞り込みはインデックスで検索する。
+#
+# 使い方（エクスポート）:
+#   python results_store.py export -o results.jsonl
+#   python results_store.py export -o results.csv --type 指揮官型 --since 2026-01-01
+import argparse
+import csv
+import hashlib
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from type_data import TYPE_NAMES
+
+DEFAULT_STORE_PATH = os.path.join(".cache", "results.sqlite3")
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_FLUSH_SECONDS = 0.5
+# 結果 ID でまとめて検索するときの1回のクエリの件数（SQLite の変数の上限より小さくする）
+LOOKUP_BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    answers BLOB NOT NULL,
+    answer_hash TEXT NOT NULL,
+    main_type TEXT NOT NULL,
+    scores BLOB NOT NULL,
+    source TEXT NOT NULL,
+    model TEXT,
+    prompt_version TEXT,
+    analysis_key TEXT,
+    answer_seconds REAL,
+    analysis_seconds REAL
+);
+CREATE INDEX IF NOT EXISTS idx_results_type_created ON results (main_type, created_at);
+CREATE INDEX IF NOT EXISTS idx_results_created ON results (created_at);
+CREATE INDEX IF NOT EXISTS idx_results_answer_hash ON results (answer_hash);
+"""
+
+COLUMNS = [
+    "id", "created_at", "answers", "answer_hash", "main_type", "scores", "source",
+    "model", "prompt_version", "analysis_key", "answer_seconds", "analysis_seconds"
+]
+INSERT_SQL = f"INSERT OR REPLACE INTO results ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+# 書き込みスレッドへの指示
+_FLUSH = object()
+_STOP = object()
+
+
+# 回答ベクトルのハッシュ（同じ回答パターンの結果の検索に使う）
+def answer_hash(answers):
+    return hashlib.sha256(bytes(answers)).hexdigest()[:16]
+
+
+# 保存した行を dict に変換
+def row_to_record(row):
+    record = dict(zip(COLUMNS, row))
+    record["answers"] = list(record["answers"])
+    record["scores"] = dict(zip(TYPE_NAMES, record["scores"]))
+    return record
+
+
+# 絞り込み条件の WHERE 句（since / until は UNIX 時刻）
+def _where(main_type=None, since=None, until=None, answer_hash=None):
+    conditions = []
+    params = []
+    if main_type is not None:
+        conditions.append("main_type = ?")
+        params.append(main_type)
+    if since is not None:
+        conditions.append("created_at >= ?")
+        params.append(since)
+    if until is not None:
+        conditions.append("created_at < ?")
+        params.append(until)
+    if answer_hash is not None:
+        conditions.append("answer_hash = ?")
+        params.append(answer_hash)
+    return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class ResultsStore:
+    def __init__(self, path=DEFAULT_STORE_PATH, batch_size=DEFAULT_BATCH_SIZE, flush_seconds=DEFAULT_FLUSH_SECONDS):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.written = 0
+        self.batches = 0
+        self.errors = 0
+        self.last_error = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = _connect(path)
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+        # 書き込み待ちの行（書き込みが終わるまでは get() でここから返す）
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._queue = queue.Queue()
+        # 書き込みのスレッドが終了したか（キューに入れるときと同じロックで確認する）
+        self._stopped = False
+        self._stopped_lock = threading.Lock()
+        self._writer = threading.Thread(target=self._write_loop, name="results-writer", daemon=True)
+        self._writer.start()
+
+    # 診断結果を記録して結果 ID を返す（書き込みはバックグラウンドで行う）
+    def record(self, answers, main_type, scores, model=None, prompt_version=None, analysis_key=None,
+               answer_seconds=None, analysis_seconds=None, source=None):
+        result_id = uuid.uuid4().hex
+        answers = bytes(answers)
+        row = (
+            result_id, time.time(), answers, answer_hash(answers), main_type,
+            bytes(min(100, max(0, int(scores[t]))) for t in TYPE_NAMES),
+            source or ("ai" if analysis_key else "local"),
+            model, prompt_version, analysis_key, answer_seconds, analysis_seconds
+        )
+        with self._pending_lock:
+            self._pending[result_id] = row
+        if not self._enqueue(row):
+            self._discard([row], "結果ストアは閉じられています")
+        return result_id
+
+    # 書き込みのスレッドにキューで渡す（スレッドが終了していれば False）
+    def _enqueue(self, item):
+        with self._stopped_lock:
+            if self._stopped:
+                return False
+            self._queue.put(item)
+            return True
+
+    def _write_loop(self):
+        conn = None
+        stopping = False
+        try:
+            conn = _connect(self.path)
+            while not stopping:
+                item = self._queue.get()
+                batch = []
+                taken = 1
+                try:
+                    # 1件目を受け取ったら、batch_size 件になるか flush_seconds が過ぎるまで待ってまとめる
+                    deadline = time.monotonic() + self.flush_seconds
+                    while True:
+                        if item is _STOP:
+                            stopping = True
+                            break
+                        if item is _FLUSH:
+                            break
+                        batch.append(item)
+                        if len(batch) >= self.batch_size:
+                            break
+                        try:
+                            item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                        except queue.Empty:
+                            break
+                        taken += 1
+                    if batch:
+                        self._write_batch(conn, batch)
+                finally:
+                    for _ in range(taken):
+                        self._queue.task_done()
+        except Exception as e:
+            self.last_error = str(e)
+        finally:
+            # 以降はキューに入れさせず、残っている行はエラーに数えて捨てる（flush() が待ち続けないようにする）
+            with self._stopped_lock:
+                self._stopped = True
+            self._drain()
+            if conn is not None:
+                conn.close()
+
+    def _write_batch(self, conn, batch):
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(INSERT_SQL, batch)
+            conn.execute("COMMIT")
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            # SQLite のエラーに限らず（値を変換できない行など）、まとめた行をエラーに数えて書き込みを続ける
+            try:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            self._discard(batch, str(e))
+            return
+        with self._pending_lock:
+            for row in batch:
+                self._pending.pop(row[0], None)
+
+    # 書き込めなかった行をエラーに数えて、書き込み待ちから除く
+    def _discard(self, rows, error):
+        self.errors += len(rows)
+        self.last_error = error
+        with self._pending_lock:
+            for row in rows:
+                self._pending.pop(row[0], None)
+
+    # 書き込みのスレッドが終了した後にキューに残っている行を捨てる
+    def _drain(self):
+        rows = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP and item is not _FLUSH:
+                rows.append(item)
+            self._queue.task_done()
+        if rows:
+            self._discard(rows, "結果ストアの書き込みが終了しました")
+
+    # 書き込み待ちの行をすべて書き込むまで待つ（書き込みのスレッドが終了している場合はすぐに戻る）
+    def flush(self):
+        if self._enqueue(_FLUSH):
+            self._queue.join()
+
+    # 結果 ID から診断結果を取得（見つからない場合は None）
+    def get(self, result_id):
+        with self._pending_lock:
+            row = self._pending.get(result_id)
+        if row is None:
+            with self._lock:
+                row = self._conn.execute(
+                    f"SELECT {', '.join(COLUMNS)} FROM results WHERE id = ?", (result_id,)
+                ).fetchone()
+        return row_to_record(row) if row is not None else None
+
+    # 結果 ID ごとの回答（{結果 ID: 回答のバイト列}。見つからない ID は含まない）
+    def get_answers(self, result_ids):
+        result_ids = list(dict.fromkeys(result_ids))
+        found = {}
+        with self._pending_lock:
+            for result_id in result_ids:
+                row = self._pending.get(result_id)
+                if row is not None:
+                    found[result_id] = row[2]
+        missing = [result_id for result_id in result_ids if result_id not in found]
+        with self._lock:
+            for start in range(0, len(missing), LOOKUP_BATCH_SIZE):
+                batch = missing[start:start + LOOKUP_BATCH_SIZE]
+                found.update(self._conn.execute(
+                    f"SELECT id, answers FROM results WHERE id IN ({', '.join('?' * len(batch))})", batch
+                ).fetchall())
+        return found
+
+    # 条件に合う診断結果を新しい順に取得（書き込み待ちの行は含まない）
+    def query(self, main_type=None, since=None, until=None, answer_hash=None, limit=100):
+        where, params = _where(main_type, since, until, answer_hash)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM results{where} ORDER BY created_at DESC LIMIT ?",
+                params + [limit]
+            ).fetchall()
+        return [row_to_record(row) for row in rows]
+
+    # 条件に合う診断結果の件数（タイプごと）
+    def count_by_type(self, since=None, until=None):
+        where, params = _where(since=since, until=until)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT main_type, COUNT(*) FROM results{where} GROUP BY main_type", params
+            ).fetchall()
+        return dict(rows)
+
+    # 条件に合う診断結果を古い順に1件ずつ返す（エクスポート用。別の接続で読み込む）
+    def iter_results(self, main_type=None, since=None, until=None, answer_hash=None):
+        where, params = _where(main_type, since, until, answer_hash)
+        conn = sqlite3.connect(self.path)
+        try:
+            cursor = conn.execute(f"SELECT {', '.join(COLUMNS)} FROM results{where} ORDER BY created_at", params)
+            for row in cursor:
+                yield row_to_record(row)
+        finally:
+            conn.close()
+
+    # 書き込み件数とエラー件数
+    def stats(self):
+        with self._pending_lock:
+            pending = len(self._pending)
+        return {"written": self.written, "batches": self.batches, "pending": pending,
+                "errors": self.errors, "last_error": self.last_error}
+
+    # 書き込み待ちの行を書き込んでから閉じる
+    def close(self):
+        if self._enqueue(_STOP):
+            self._writer.join()
+        with self._lock:
+            self._conn.close()
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+# 環境変数の設定に従ってプロセス共通の結果ストアを取得（RESULTS_STORE_PATH が空なら無効）
+def get_default_store():
+    global _default_store
+    path = os.getenv("RESULTS_STORE_PATH", DEFAULT_STORE_PATH)
+    if not path:
+        return None
+    with _default_store_lock:
+        if _default_store is None:
+            import atexit
+
+            _default_store = ResultsStore(
+                path,
+                batch_size=int(os.getenv("RESULTS_STORE_BATCH_SIZE", DEFAULT_BATCH_SIZE)),
+                flush_seconds=float(os.getenv("RESULTS_STORE_FLUSH_SECONDS", DEFAULT_FLUSH_SECONDS))
+            )
+            # プロセスの終了時に書き込み待ちの行を書き込む
+            atexit.register(_default_store.close)
+    return _default_store
+
+
+# 日付（YYYY-MM-DD）または日時（ISO 形式）を UNIX 時刻に変換
+def parse_time(value):
+    return datetime.fromisoformat(value).timestamp()
+
+
+def export_results(store, stream, output_format, **filters):
+    count = 0
+    if output_format == "csv":
+        writer = csv.writer(stream)
+        writer.writerow(
+            ["id", "created_at", "answers", "main_type"] + TYPE_NAMES
+            + ["source", "model", "prompt_version", "answer_seconds", "analysis_seconds"]
+        )
+    for record in store.iter_results(**filters):
+        record["created_at"] = datetime.fromtimestamp(record["created_at"]).isoformat(timespec="seconds")
+        if output_format == "csv":
+            writer.writerow(
+                [record["id"], record["created_at"], "".join(map(str, record["answers"])), record["main_type"]]
+                + [record["scores"][t] for t in TYPE_NAMES]
+                + [record["source"], record["model"] or "", record["prompt_version"] or "",
+                   record["answer_seconds"] if record["answer_seconds"] is not None else "",
+                   record["analysis_seconds"] if record["analysis_seconds"] is not None else ""]
+            )
+        else:
+            stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="保存した診断結果のエクスポート")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export = subparsers.add_parser("export", help="診断結果を CSV / JSONL に書き出す")
+    export.add_argument("-o", "--output", default="-", help="出力ファイル（- で標準出力）")
+    export.add_argument("--output-format", choices=["jsonl", "csv"], help="出力形式（省略時は拡張子から判定）")
+    export.add_argument("--path", default=os.getenv("RESULTS_STORE_PATH") or DEFAULT_STORE_PATH, help="結果ストアのパス")
+    export.add_argument("--type", dest="main_type", choices=TYPE_NAMES, help="主要タイプで絞り込む")
+    export.add_argument("--since", type=parse_time, help="この日時以降の結果（例: 2026-01-01）")
+    export.add_argument("--until", type=parse_time, help="この日時より前の結果")
+    args = parser.parse_args(argv)
+
+    output_format = args.output_format or ("csv" if args.output.lower().endswith(".csv") else "jsonl")
+    store = ResultsStore(args.path)
+    try:
+        if args.output == "-":
+            count = export_results(store, sys.stdout, output_format,
+                                   main_type=args.main_type, since=args.since, until=args.until)
+        else:
+            with open(args.output, "w", encoding="utf-8", newline="") as f:
+                count = export_results(store, f, output_format,
+                                       main_type=args.main_type, since=args.since, until=args.until)
+    finally:
+        store.close()
+    print(f"{count}件を書き出しました", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
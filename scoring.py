@@ -0,0 +1,108 @@
+# 継続力タイプのローカル採点エンジン
+# 質問×タイプの重み行列を事前に作り、1件の回答でも (N×質問数) の回答行列でも
+# 1回の行列演算でタイプ別スコアを求める。Streamlit 画面と一括診断の両方から使う。
+from typing import NamedTuple
+
+import numpy as np
+
+from type_data import questions, personality_types, TYPE_NAMES, ITEM_TYPES
+
+# 回答値 0 は「未回答」を表す（評価は 1〜5）
+UNANSWERED = 0
+
+
+# 質問×タイプの所属行列を作成（item_types は質問ごとのタイプ番号）
+def build_membership_matrix(item_types, n_types):
+    membership = np.zeros((len(item_types), n_types), dtype=np.float64)
+    membership[np.arange(len(item_types)), list(item_types)] = 1.0
+    return membership
+
+
+MEMBERSHIP = build_membership_matrix(ITEM_TYPES, len(TYPE_NAMES))
+TYPE_COUNTS = MEMBERSHIP.sum(axis=0)
+
+# 全問回答済みの場合の重み行列（回答ベクトル @ WEIGHTS = タイプ別平均）
+WEIGHTS = MEMBERSHIP / np.where(TYPE_COUNTS > 0, TYPE_COUNTS, 1.0)
+
+
+class ScoreResult(NamedTuple):
+    main_type: np.ndarray  # 主要タイプの番号（TYPE_NAMES の添字）
+    scores: np.ndarray     # 最高スコアを 100 とした正規化スコア
+    margin: np.ndarray     # 1位と2位の正規化スコアの差
+    averages: np.ndarray   # タイプ別の平均評価（1〜5）
+
+
+# 回答（{質問番号: 評価} の dict、長さ Q の配列、N×Q の行列）を N×Q の行列に変換
+def to_answer_matrix(answers):
+    if isinstance(answers, dict):
+        row = np.zeros(len(questions), dtype=np.float64)
+        for q_idx, rating in answers.items():
+            row[q_idx] = rating
+        return row[np.newaxis, :], True
+
+    matrix = np.asarray(answers, dtype=np.float64)
+    if matrix.ndim == 1:
+        return matrix[np.newaxis, :], True
+    return matrix, False
+
+
+# 回答をまとめて採点する
+def score_answers(answers):
+    matrix, single = to_answer_matrix(answers)
+    if matrix.shape[1] != len(questions):
+        raise ValueError(f"回答数が質問数と一致しません: {matrix.shape[1]} != {len(questions)}")
+
+    answered = matrix != UNANSWERED
+    if answered.all():
+        averages = matrix @ WEIGHTS
+    else:
+        # 未回答を含む場合は回答済みの質問だけで平均を取る
+        sums = matrix @ MEMBERSHIP
+        counts = answered @ MEMBERSHIP
+        averages = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+
+    # 最高スコアを100%として正規化（回答が無い場合は一律50）
+    max_score = averages.max(axis=1, keepdims=True)
+    scores = np.divide(averages, max_score, out=np.full_like(averages, 0.5), where=max_score > 0) * 100.0
+
+    # 同点の場合は TYPE_NAMES の先頭側を採用（従来の max(dict) と同じ）
+    main_type = scores.argmax(axis=1)
+    top2 = np.partition(scores, -2, axis=1)[:, -2:]
+    margin = top2[:, 1] - top2[:, 0]
+
+    if single:
+        return ScoreResult(int(main_type[0]), scores[0], float(margin[0]), averages[0])
+    return ScoreResult(main_type, scores, margin, averages)
+
+
+# 正規化スコア配列を {タイプ名: 整数スコア} に変換
+def scores_to_dict(scores):
+    return {t: int(s) for t, s in zip(TYPE_NAMES, scores)}
+
+
+# 診断結果の dict を作成
+def make_result(main_type, scores, analysis_text):
+    info = personality_types[main_type]
+    return {
+        "main_type": main_type,
+        "english_name": info["英語名"],
+        "description": info["説明"],
+        "scores": scores,
+        "strengths": info["強み"],
+        "recommended_roles": info["推奨役割"],
+        "growth_points": info["育成ポイント"],
+        "analysis_text": analysis_text
+    }
+
+
+# AI分析を行えなかった場合の分析テキスト
+LOCAL_ANALYSIS_TEXT = "AIによる分析を行えませんでした。基本的な統計分析の結果を表示しています。"
+
+# ハイブリッド判定で、ローカル採点だけで主要タイプを決めた場合の分析テキスト
+CONFIDENT_ANALYSIS_TEXT = "回答の傾向から主要タイプがはっきり判定できたため、回答の採点結果をもとに診断しています。"
+
+
+# ローカル採点のみで診断結果を作成
+def local_result(answers, analysis_text=LOCAL_ANALYSIS_TEXT):
+    scored = score_answers(answers)
+    return make_result(TYPE_NAMES[scored.main_type], scores_to_dict(scored.scores), analysis_text)
@@ -0,0 +1,424 @@
+# チーム構成の分析（CLI と Streamlit のページ pages/1_チーム分析.py から使う）
+# 名簿（所属と回答、または保存した診断結果の結果 ID）から、次をまとめて求める。
+#   - 所属ごと・全体の継続力タイプの分布と、目標構成（既定は8タイプ均等）との差
+#   - 主要タイプごとのタイプ別スコアの重心（平均評価）と、所属ごとの平均スコア
+#   - 五行の相性によるタイプ間の補完度と、チームの補完度・ペアの提案
+# 採点と集計は名簿全体の行列に対する numpy の演算で行い、5万人でも1秒未満で終わる。
+# 結果は名簿の内容のハッシュと目標構成ごとにプロセス内にキャッシュする。
+#
+# 五行の相性は、各タイプの「陰陽五行」の解説（陰陽・五行の要素・バランスのために取り入れるとよい要素）
+# から読み取る。タイプ a と b の補完度（0〜1）は次の合計を 3 で割ったもの。
+#   a が取り入れるとよい要素が b の要素である（1）、その逆（1）、相生（木→火→土→金→水→木）の関係にある（0.5）、
+#   陰陽が異なる（0.5）
+#
+# 使い方:
+#   python team_analytics.py roster.csv
+#   python team_analytics.py roster.jsonl -o report.json --target target.json
+#   python team_analytics.py --from-store --since 2026-01-01
+#
+# 名簿の形式（CSV / JSONL。results_store.py export の出力もそのまま使える）:
+#   id        : 識別子（省略時は行番号）
+#   group     : 所属（部署・チームなど。省略時はすべて同じ所属）
+#   result_id : 結果ストアの結果 ID（回答の代わりに指定できる）
+#   answers   : 質問順の評価（JSONL は配列、CSV は "5425314523" のような数字の列）。
+#               CSV では answers 列の代わりに、上記以外の列を質問順の評価として扱う
+# 評価 0（未回答）は画面の採点と同じく中央の評価で補う。
+import argparse
+import collections
+import functools
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from adaptive import NEUTRAL_RATING, UNANSWERED
+from scoring import score_answers
+from type_data import questions, personality_types, TYPE_NAMES
+
+# 五行の要素（相生の順）
+ELEMENTS = ("木", "火", "土", "金", "水")
+
+# 名簿の列のうち、回答以外の列
+RESERVED_COLUMNS = ("id", "group", "result_id", "answers")
+
+# group を指定しない場合の所属名
+DEFAULT_GROUP = "（所属なし）"
+
+# 提案するペアの数
+TOP_PAIRINGS = 5
+
+# 分析結果をキャッシュする名簿の数
+DEFAULT_CACHE_SIZE = 32
+
+
+class FiveElements(NamedTuple):
+    polarity: str    # 陰 / 陽
+    element: str     # 木・火・土・金・水
+    balance: tuple   # バランスのために取り入れるとよい要素
+
+
+class Roster(NamedTuple):
+    ids: list
+    groups: np.ndarray      # 所属の番号（group_names の添字）
+    group_names: list
+    answers: np.ndarray     # N×質問数 の評価（未回答は中央の評価で補ったもの）
+    invalid: list           # 読み込めなかった行の [(id, 理由), ...]
+
+
+# タイプの「陰陽五行」の解説から陰陽・要素・取り入れるとよい要素を読み取る
+def parse_five_elements(text):
+    match = re.match(r"(陰|陽)の(木|火|土|金|水)", text)
+    clause = re.search(r"バランスを(?:保つ|取る)ためには[^。]*", text)
+    balance = tuple(dict.fromkeys(re.findall(r"([木火土金水])（", clause.group(0)))) if clause else ()
+    if match is None or not balance:
+        raise ValueError(f"陰陽五行の解説から要素を読み取れません: {text[:30]}")
+    return FiveElements(match.group(1), match.group(2), balance)
+
+
+@functools.lru_cache(maxsize=None)
+def type_elements():
+    return tuple(parse_five_elements(personality_types[t]["陰陽五行"]) for t in TYPE_NAMES)
+
+
+# タイプ間の補完度の行列（タイプ数×タイプ数、0〜1、対称）
+@functools.lru_cache(maxsize=None)
+def complement_matrix():
+    elements = type_elements()
+    index = {element: i for i, element in enumerate(ELEMENTS)}
+    own = np.zeros((len(TYPE_NAMES), len(ELEMENTS)))
+    wanted = np.zeros((len(TYPE_NAMES), len(ELEMENTS)))
+    for t, entry in enumerate(elements):
+        own[t, index[entry.element]] = 1.0
+        wanted[t, [index[element] for element in entry.balance]] = 1.0
+    yang = np.array([entry.polarity == "陽" for entry in elements])
+
+    supplies = wanted @ own.T                                      # a が取り入れるとよい要素を b が持つ
+    generates = own @ np.roll(np.eye(len(ELEMENTS)), 1, axis=1) @ own.T   # a の要素が b の要素を生む
+    matrix = (supplies + supplies.T + 0.5 * np.maximum(generates, generates.T)
+              + 0.5 * (yang[:, np.newaxis] != yang[np.newaxis, :])) / 3.0
+    matrix.flags.writeable = False
+    return matrix
+
+
+# 名簿の1つのセルの回答（配列、または "5425..." の数字の列）をリストにする（読み込めない場合は None）
+def _parse_answer_cell(value):
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith("["):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                return None
+        elif value.isdigit():
+            return [int(c) for c in value]
+        else:
+            return None
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return None
+
+
+# 回答の行列（欠損は NaN）を検証し、未回答を補った名簿を作る
+def make_roster(ids, groups, matrix):
+    matrix = np.asarray(matrix, dtype=np.float64).reshape(len(ids), len(questions))
+    valid = np.isfinite(matrix).all(axis=1)
+    valid &= ((matrix == np.rint(matrix)) & (matrix >= 0) & (matrix <= 5)).all(axis=1)
+    valid &= (matrix != UNANSWERED).any(axis=1)
+    invalid = [(ids[i], f"回答は{len(questions)}個の0〜5の整数で指定してください（0 は未回答）")
+               for i in np.flatnonzero(~valid)]
+
+    answers = np.where(matrix[valid] == UNANSWERED, NEUTRAL_RATING, matrix[valid]).astype(np.uint8)
+    codes, group_names = pd.factorize(np.asarray(groups, dtype=object)[valid], sort=True)
+    return Roster([ids[i] for i in np.flatnonzero(valid)], codes.astype(np.int64), list(group_names), answers, invalid)
+
+
+# 表の値を数値の行列にする（数値でない値は NaN）
+def _numeric_matrix(frame):
+    try:
+        return frame.to_numpy(dtype=np.float64)
+    except (TypeError, ValueError):
+        return frame.apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+
+
+def read_roster_frame(source, input_format):
+    if input_format == "jsonl":
+        return pd.read_json(source, lines=True, dtype=False)
+    return pd.read_csv(source, dtype=str, keep_default_na=False)
+
+
+# 名簿のファイル（パスまたはファイルオブジェクト）を読み込む
+# result_id を指定した行の回答は store（ResultsStore）から読み込む
+def load_roster(source, input_format="csv", store=None):
+    frame = read_roster_frame(source, input_format)
+    n = len(frame)
+    ids = list(frame["id"]) if "id" in frame else list(range(1, n + 1))
+    groups = [DEFAULT_GROUP] * n
+    if "group" in frame:
+        groups = frame["group"].fillna("").astype(str).replace("", DEFAULT_GROUP).tolist()
+    matrix = np.full((n, len(questions)), np.nan)
+
+    if "answers" in frame:
+        parsed = [_parse_answer_cell(value) for value in frame["answers"]]
+        rows = [i for i, ratings in enumerate(parsed) if ratings is not None and len(ratings) == len(questions)]
+        if rows:
+            matrix[rows] = _numeric_matrix(pd.DataFrame([parsed[i] for i in rows]))
+    else:
+        columns = [c for c in frame.columns if c not in RESERVED_COLUMNS]
+        if len(columns) == len(questions):
+            matrix = _numeric_matrix(frame[columns])
+
+    if "result_id" in frame:
+        result_ids = frame["result_id"].fillna("").astype(str).to_numpy()
+        rows = np.flatnonzero(result_ids != "")
+        if len(rows):
+            if store is None:
+                raise ValueError("result_id を指定した名簿には結果ストアが必要です")
+            found = store.get_answers(result_ids[rows].tolist())
+            missing = bytes(len(questions))  # 見つからない結果 ID は回答なし（読み込めなかった行）として扱う
+            blob = b"".join(found.get(result_id, missing) for result_id in result_ids[rows])
+            matrix[rows] = np.frombuffer(blob, dtype=np.uint8).reshape(len(rows), len(questions))
+    return make_roster(ids, groups, matrix)
+
+
+# 結果ストアの診断結果をそのまま名簿にする（所属はすべて同じ）
+def roster_from_store(store, since=None, until=None, main_type=None):
+    ids = []
+    rows = []
+    for record in store.iter_results(main_type=main_type, since=since, until=until):
+        ids.append(record["id"])
+        rows.append(record["answers"])
+    if not rows:
+        return make_roster([], [], np.zeros((0, len(questions))))
+    return make_roster(ids, [DEFAULT_GROUP] * len(ids), np.array(rows, dtype=np.float64))
+
+
+# 名簿の内容のハッシュ（所属と回答が同じなら、行の識別子が違っても同じ分析結果になる）
+def roster_hash(roster):
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(roster.answers).tobytes())
+    digest.update(roster.groups.astype("<i8").tobytes())
+    digest.update(json.dumps(roster.group_names, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+# 目標構成（{タイプ名: 人数または割合}。None は均等）をタイプ順の割合にする
+def target_shares(target=None):
+    if not target:
+        return np.full(len(TYPE_NAMES), 1.0 / len(TYPE_NAMES))
+    unknown = [t for t in target if t not in TYPE_NAMES]
+    if unknown:
+        raise ValueError(f"不明なタイプです: {', '.join(unknown)}")
+    weights = np.array([float(target.get(t, 0)) for t in TYPE_NAMES])
+    if (weights < 0).any() or weights.sum() <= 0:
+        raise ValueError("目標構成は0以上の値で、合計が0より大きくなるように指定してください")
+    return weights / weights.sum()
+
+
+def _by_type(values, digits=4):
+    return {t: int(v) if digits == 0 else round(float(v), digits) for t, v in zip(TYPE_NAMES, values)}
+
+
+# 分析結果の dict（JSON に変換できる形）を作る
+def compute_report(roster, shares):
+    started = time.perf_counter()
+    n_types = len(TYPE_NAMES)
+    n_groups = len(roster.group_names)
+    complement = complement_matrix()
+    report = {"size": len(roster.ids), "invalid": len(roster.invalid), "type_names": TYPE_NAMES}
+
+    if len(roster.ids):
+        scored = score_answers(roster.answers)
+        main_type, averages = scored.main_type, scored.averages
+    else:
+        main_type, averages = np.zeros(0, dtype=np.int64), np.zeros((0, n_types))
+
+    # 所属×タイプの人数と、所属ごとのタイプ別の平均スコア・主要タイプごとの重心（タイプ別の平均評価）
+    counts = np.bincount(roster.groups * n_types + main_type, minlength=n_groups * n_types).reshape(n_groups, n_types)
+    sizes = counts.sum(axis=1)
+    group_shares = counts / np.maximum(sizes, 1)[:, np.newaxis]
+    group_profiles = np.stack([np.bincount(roster.groups, weights=averages[:, j], minlength=n_groups)
+                               for j in range(n_types)], axis=1) / np.maximum(sizes, 1)[:, np.newaxis]
+    type_counts = counts.sum(axis=0)
+    centroids = np.stack([np.bincount(main_type, weights=averages[:, j], minlength=n_types)
+                          for j in range(n_types)], axis=1) / np.maximum(type_counts, 1)[:, np.newaxis]
+
+    # 補完度: 同じ所属から2人を選んだときの補完度の期待値と、各タイプの人を1人加えたときの補完度の期待値
+    overall_shares = type_counts / max(len(roster.ids), 1)
+    group_complementarity = np.einsum("gi,ij,gj->g", group_shares, complement, group_shares)
+    gains = complement @ overall_shares
+
+    report["overall"] = {
+        "counts": _by_type(type_counts, 0),
+        "shares": _by_type(overall_shares),
+        "target": _by_type(shares),
+        "gap": _by_type(overall_shares - shares),
+        "needed": _by_type(np.maximum(np.ceil(shares * len(roster.ids) - type_counts - 1e-9), 0), 0),
+        "complementarity": round(float(overall_shares @ complement @ overall_shares), 4),
+        "complement_gain": _by_type(gains)
+    }
+    report["groups"] = [
+        {
+            "group": name,
+            "size": int(sizes[g]),
+            "counts": _by_type(counts[g], 0),
+            "shares": _by_type(group_shares[g]),
+            "gap": _by_type(group_shares[g] - shares),
+            "complementarity": round(float(group_complementarity[g]), 4),
+            "profile": _by_type(group_profiles[g], 3)
+        }
+        for g, name in enumerate(roster.group_names)
+    ]
+    report["centroids"] = {
+        t: {"count": int(type_counts[i]), "scores": _by_type(centroids[i], 3)}
+        for i, t in enumerate(TYPE_NAMES) if type_counts[i]
+    }
+
+    # ペアの提案（名簿にいるタイプの組を補完度の高い順に。同じ補完度なら組める人数の多い順）
+    present = type_counts > 0
+    a_idx, b_idx = np.triu_indices(n_types, k=1)
+    keep = present[a_idx] & present[b_idx]
+    a_idx, b_idx = a_idx[keep], b_idx[keep]
+    pairs = np.minimum(type_counts[a_idx], type_counts[b_idx])
+    order = np.lexsort((-pairs, -complement[a_idx, b_idx]))[:TOP_PAIRINGS]
+    report["pairings"] = [
+        {"types": [TYPE_NAMES[a_idx[k]], TYPE_NAMES[b_idx[k]]],
+         "complementarity": round(float(complement[a_idx[k], b_idx[k]]), 4), "pairs": int(pairs[k])}
+        for k in order
+    ]
+    masked = np.where(present[np.newaxis, :] & ~np.eye(n_types, dtype=bool), complement, -1.0)
+    report["best_partners"] = {
+        t: (TYPE_NAMES[int(masked[i].argmax())] if masked[i].max() >= 0 else None)
+        for i, t in enumerate(TYPE_NAMES) if present[i]
+    }
+    report["elements"] = {t: entry._asdict() for t, entry in zip(TYPE_NAMES, type_elements())}
+    report["seconds"] = round(time.perf_counter() - started, 4)
+    return report
+
+
+_cache = collections.OrderedDict()
+_cache_lock = threading.Lock()
+
+
+# 名簿を分析する（名簿のハッシュと目標構成ごとに、最近の結果をキャッシュする）
+def analyze_team(roster, target=None):
+    shares = target_shares(target)
+    key = (roster_hash(roster), shares.tobytes())
+    cache_size = int(os.getenv("TEAM_ANALYTICS_CACHE_SIZE", DEFAULT_CACHE_SIZE))
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    report = dict(compute_report(roster, shares), roster_hash=key[0])
+    with _cache_lock:
+        _cache[key] = report
+        while len(_cache) > cache_size:
+            _cache.popitem(last=False)
+    return report
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+# 分析結果を表にする（CLI と Streamlit のページの表示用）
+def report_frames(report):
+    overall = report["overall"]
+    types = pd.DataFrame({
+        "人数": overall["counts"], "割合": overall["shares"], "目標": overall["target"],
+        "差": overall["gap"], "不足人数": overall["needed"], "加えたときの補完度": overall["complement_gain"]
+    })
+    types.index.name = "タイプ"
+    groups = pd.DataFrame(
+        [dict(g["counts"], 所属=g["group"], 人数=g["size"], 補完度=g["complementarity"]) for g in report["groups"]],
+        columns=["所属", "人数", "補完度"] + TYPE_NAMES
+    ).set_index("所属")
+    centroids = pd.DataFrame({t: c["scores"] for t, c in report["centroids"].items()}).T
+    centroids.index.name = "主要タイプ"
+    pairings = pd.DataFrame(
+        [{"タイプ1": p["types"][0], "タイプ2": p["types"][1], "補完度": p["complementarity"], "組める数": p["pairs"]}
+         for p in report["pairings"]],
+        columns=["タイプ1", "タイプ2", "補完度", "組める数"]
+    )
+    return {"types": types, "groups": groups, "centroids": centroids, "pairings": pairings}
+
+
+def guess_format(path):
+    return "jsonl" if os.path.splitext(path)[1].lower() in (".jsonl", ".ndjson") else "csv"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="チーム構成の分析（タイプ分布・目標構成との差・スコアの重心・ペアの提案）")
+    parser.add_argument("roster", nargs="?", help="名簿（CSV / JSONL、- で標準入力）")
+    parser.add_argument("-o", "--output", help="分析結果の出力先（JSON）")
+    parser.add_argument("--input-format", choices=["csv", "jsonl"], help="名簿の形式（省略時は拡張子から推定）")
+    parser.add_argument("--target", help='目標構成の JSON ファイル（{"指揮官型": 2, ...}。省略時は8タイプ均等）')
+    parser.add_argument("--from-store", action="store_true", help="名簿の代わりに結果ストアの診断結果を使う")
+    parser.add_argument("--store", default=os.getenv("RESULTS_STORE_PATH") or None, help="結果ストアのパス")
+    parser.add_argument("--since", help="--from-store: この日時以降の結果（例: 2026-01-01）")
+    parser.add_argument("--until", help="--from-store: この日時より前の結果")
+    parser.add_argument("--type", dest="main_type", choices=TYPE_NAMES, help="--from-store: 主要タイプで絞り込む")
+    args = parser.parse_args(argv)
+    if not args.roster and not args.from_store:
+        parser.error("名簿を指定するか、--from-store を指定してください")
+
+    from results_store import ResultsStore, DEFAULT_STORE_PATH, parse_time
+
+    store_path = args.store or DEFAULT_STORE_PATH
+    if args.from_store and not os.path.exists(store_path):
+        print(f"結果ストアがありません: {store_path}", file=sys.stderr)
+        return 1
+    store = ResultsStore(store_path) if args.from_store or os.path.exists(store_path) else None
+    started = time.perf_counter()
+    try:
+        target = None
+        if args.target:
+            with open(args.target, encoding="utf-8") as f:
+                target = json.load(f)
+        if args.from_store:
+            roster = roster_from_store(store, since=parse_time(args.since) if args.since else None,
+                                       until=parse_time(args.until) if args.until else None, main_type=args.main_type)
+        else:
+            input_format = args.input_format or guess_format(args.roster)
+            source = io.StringIO(sys.stdin.read()) if args.roster == "-" else args.roster
+            roster = load_roster(source, input_format, store)
+        loaded = time.perf_counter()
+        report = analyze_team(roster, target)
+    except (OSError, ValueError) as e:
+        print(f"チーム構成を分析できません: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if store is not None:
+            store.close()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    frames = report_frames(report)
+    with pd.option_context("display.width", 200, "display.max_columns", 20, "display.unicode.east_asian_width", True):
+        print(f"人数 {report['size']}（読み込めなかった行 {report['invalid']}）・所属 {len(report['groups'])}"
+              f"・チームの補完度 {report['overall']['complementarity']:.3f}")
+        print("\n[タイプ別の人数と目標構成との差]")
+        print(frames["types"].to_string())
+        print("\n[補完度の高いペア]")
+        print(frames["pairings"].to_string(index=False) if len(frames["pairings"]) else "（2タイプ以上の名簿で提案します）")
+        if len(frames["groups"]) > 1:
+            print("\n[所属ごとのタイプ分布]")
+            print(frames["groups"].to_string())
+    for row_id, reason in roster.invalid[:10]:
+        print(f"{row_id}: {reason}", file=sys.stderr)
+    print(f"読み込み {loaded - started:.2f}秒 / 分析 {report['seconds']:.3f}秒", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
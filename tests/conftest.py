@@ -0,0 +1,6 @@
+# テスト共通の設定: リポジトリ直下のモジュール（analysis.py など）を読み込めるようにする
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
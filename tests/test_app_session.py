@@ -0,0 +1,46 @@
+# 画面（app.py）の1回の診断のテスト。Streamlit の AppTest で回答を終えるまで操作する
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import analysis
+import diagnosis
+from conftest import ROOT_DIR
+
+# ハイブリッド判定で AI分析に回る回答（指揮官型と分析者型が同点）
+TIED_ANSWERS = [5, 5, 3, 3, 3, 3, 3, 3, 5, 5]
+
+
+@pytest.fixture
+def blocking_app(monkeypatch):
+    monkeypatch.chdir(ROOT_DIR)
+    monkeypatch.setenv("ANALYSIS_STREAMING", "False")
+    monkeypatch.setenv("ADAPTIVE_QUESTIONS", "False")
+    monkeypatch.setenv("RESULTS_STORE_PATH", "")
+    monkeypatch.setattr(analysis, "DECISION_MODE", "hybrid")
+    calls = []
+
+    def run_ai_analysis(answers, cache=None, on_text=None):
+        calls.append(bytes(answers))
+        raise RuntimeError("AI分析は使えません")
+
+    monkeypatch.setattr(diagnosis, "run_ai_analysis", run_ai_analysis)
+    return calls
+
+
+def answer_all(at, pattern):
+    while at.session_state.result is None:
+        at.button[pattern[at.session_state.current_question] - 1].click().run()
+    return at
+
+
+def test_blocking_session_counts_one_decision(blocking_app):
+    before = analysis.decision_counts()
+    at = answer_all(AppTest.from_file("app.py", default_timeout=30).run(), TIED_ANSWERS)
+    after = analysis.decision_counts()
+
+    assert not at.exception
+    assert after["decisions"] - before["decisions"] == 1
+    assert after["escalated"] - before["escalated"] == 1
+    # AI分析は1回だけ呼び出し、失敗したためローカル採点の結果を表示する
+    assert blocking_app == [bytes(TIED_ANSWERS)]
+    assert at.session_state.result.source == diagnosis.SOURCE_LOCAL
@@ -0,0 +1,74 @@
+# 一括診断（bulk_diagnose.py）の入力の読み込みと検証のテスト
+import io
+import json
+
+import pytest
+
+import bulk_diagnose
+from bulk_diagnose import iter_answer_rows, validate_answers, RowError
+from type_data import questions
+
+ANSWERS = [5, 4, 3, 2, 1, 5, 4, 3, 2, 1]
+
+
+def read_rows(text, input_format):
+    return list(iter_answer_rows(io.StringIO(text), input_format))
+
+
+def test_csv_row_without_id_column_is_a_row_error():
+    text = "answer1,answer2,id\n" + "5,4,u1\n" + "5\n" + "3,2,u3\n"
+    rows = read_rows(text, "csv")
+    assert rows[0] == ("u1", ["5", "4"])
+    assert isinstance(rows[1][1], RowError)
+    assert "3行目" in rows[1][1]
+    assert rows[2] == ("u3", ["3", "2"])
+
+
+def test_invalid_json_line_is_a_row_error():
+    rows = read_rows('{"id": "u1", "answers": [1]}\n{\n[5, 4]\n', "jsonl")
+    assert rows[0] == ("u1", [1])
+    assert isinstance(rows[1][1], RowError)
+    assert rows[2] == (3, [5, 4])
+
+
+@pytest.mark.parametrize("answers", [
+    ANSWERS,
+    [str(a) for a in ANSWERS],
+    [f" {a} " for a in ANSWERS],
+])
+def test_valid_answers(answers):
+    assert validate_answers(answers) == ANSWERS
+
+
+@pytest.mark.parametrize("value", [4.7, 4.0, "4.7", "4.0", True, None, "", "０", 0, 6, "-1"])
+def test_non_integral_or_out_of_range_ratings_are_rejected(value):
+    answers = list(ANSWERS)
+    answers[3] = value
+    assert validate_answers(answers) is None
+
+
+def test_wrong_number_of_answers_is_rejected():
+    assert validate_answers(ANSWERS[:-1]) is None
+    assert validate_answers("5432154321") is None
+
+
+def test_run_continues_past_bad_rows(tmp_path):
+    header = ",".join(f"q{i + 1}" for i in range(len(questions))) + ",id"
+    lines = [
+        header,
+        ",".join(map(str, ANSWERS)) + ",ok",
+        "5,4",
+        ",".join(map(str, ANSWERS[:-1])) + ",4.7,float",
+        ",".join(map(str, ANSWERS)) + ",ok2",
+    ]
+    input_path = tmp_path / "answers.csv"
+    input_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    output_path = tmp_path / "results.jsonl"
+
+    assert bulk_diagnose.main([str(input_path), "-o", str(output_path), "--workers", "1"]) == 0
+
+    records = [json.loads(line) for line in output_path.read_text(encoding="utf-8").splitlines()]
+    assert [record["id"] for record in records] == ["ok", 2, "float", "ok2"]
+    assert "main_type" in records[0] and "main_type" in records[3]
+    assert "id の列がありません" in records[1]["error"]
+    assert "error" in records[2]
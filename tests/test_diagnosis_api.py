@@ -0,0 +1,173 @@
+# 診断 API（diagnosis_api.app）のテスト。ASGI の scope / receive / send を直接渡して呼び出す
+import asyncio
+import json
+
+import pytest
+
+import analysis
+import diagnosis
+import diagnosis_api
+from type_data import questions, TYPE_NAMES
+
+# ハイブリッド判定で AI を使わずに診断できる回答（安定者型が40の差で1位）
+CONFIDENT_ANSWERS = [5, 1, 1, 1, 1, 5, 1, 1, 1, 1]
+
+
+@pytest.fixture(autouse=True)
+def api_settings(monkeypatch):
+    monkeypatch.setattr(diagnosis_api, "API_KEYS", [])
+    monkeypatch.setattr(analysis, "DECISION_MODE", "hybrid")
+
+
+# リクエストを送り、(ステータス, ヘッダー, 本文) を返す
+def request(method, path, body=None, chunks=None, headers=()):
+    if chunks is None:
+        chunks = [b"" if body is None else json.dumps(body).encode("utf-8")]
+    messages = [{"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1} for i, chunk in enumerate(chunks)]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "headers": list(headers)}
+    asyncio.run(diagnosis_api.app(scope, receive, send))
+    assert [m["type"] for m in sent] == ["http.response.start", "http.response.body"]
+    return sent[0]["status"], dict(sent[0]["headers"]), sent[1]["body"]
+
+
+def request_json(method, path, body=None, **options):
+    status, headers, data = request(method, path, body, **options)
+    assert headers[b"content-type"].startswith(b"application/json")
+    assert int(headers[b"content-length"]) == len(data)
+    return status, json.loads(data)
+
+
+def test_health():
+    status, body = request_json("GET", "/health")
+    assert status == 200
+    assert body["status"] == "ok"
+    assert body["questions"] == len(questions)
+
+
+def test_questions():
+    status, body = request_json("GET", "/v1/questions/")
+    assert status == 200
+    assert [q["index"] for q in body["questions"]] == list(range(len(questions)))
+    assert body["types"] == list(TYPE_NAMES)
+    assert set(body["rating_labels"]) == {"1", "2", "3", "4", "5"}
+
+
+def test_diagnosis_local():
+    status, body = request_json("POST", "/v1/diagnoses", {"answers": CONFIDENT_ANSWERS, "use_ai": False})
+    assert status == 200
+    assert body["main_type"] == TYPE_NAMES[5]
+    assert body["source"] == "local"
+    assert set(body["scores"]) == set(TYPE_NAMES)
+
+
+def test_diagnosis_hybrid_does_not_call_llm(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("AI分析を呼び出しました")
+
+    monkeypatch.setattr(diagnosis, "run_ai_analysis", fail)
+    status, body = request_json("POST", "/v1/diagnoses", {"answers": CONFIDENT_ANSWERS})
+    assert status == 200
+    assert body["source"] == "hybrid"
+    assert body["main_type"] == TYPE_NAMES[5]
+
+
+def test_body_in_several_chunks():
+    data = json.dumps({"answers": CONFIDENT_ANSWERS, "use_ai": False}).encode("utf-8")
+    status, body = request_json("POST", "/v1/diagnoses", chunks=[data[:7], data[7:20], data[20:]])
+    assert status == 200
+    assert body["main_type"] == TYPE_NAMES[5]
+
+
+def test_batch_reports_invalid_items_individually():
+    items = [{"id": "ok", "answers": CONFIDENT_ANSWERS}, {"id": "ng", "answers": [6] * len(questions)}]
+    status, body = request_json("POST", "/v1/diagnoses/batch", {"items": items, "use_ai": False})
+    assert status == 200
+    ok, ng = body["results"]
+    assert ok["id"] == "ok" and ok["main_type"] == TYPE_NAMES[5]
+    assert ng["id"] == "ng" and ng["error"]["code"] == "invalid_answers"
+
+
+@pytest.mark.parametrize("answers", [
+    [5, 4, 3],
+    [6] * len(questions),
+    [None] * len(questions),
+    "5432154321",
+])
+def test_invalid_answers(answers):
+    status, body = request_json("POST", "/v1/diagnoses", {"answers": answers})
+    assert status == 422
+    assert body["error"]["code"] == "invalid_answers"
+
+
+@pytest.mark.parametrize("data", [b"{", b"[1, 2]", b"\xff"])
+def test_invalid_json(data):
+    status, body = request_json("POST", "/v1/diagnoses", chunks=[data])
+    assert status == 400
+    assert body["error"]["code"] == "invalid_json"
+
+
+def test_invalid_option():
+    status, body = request_json("POST", "/v1/diagnoses", {"answers": CONFIDENT_ANSWERS, "use_ai": "yes"})
+    assert status == 400
+    assert body["error"]["code"] == "invalid_option"
+
+
+def test_not_found():
+    status, body = request_json("GET", "/v1/unknown")
+    assert status == 404
+    assert body["error"]["code"] == "not_found"
+
+
+def test_method_not_allowed():
+    status, body = request_json("GET", "/v1/diagnoses")
+    assert status == 405
+    assert body["error"]["code"] == "method_not_allowed"
+
+
+def test_api_key_required(monkeypatch):
+    monkeypatch.setattr(diagnosis_api, "API_KEYS", ["secret"])
+    status, body = request_json("GET", "/v1/questions")
+    assert status == 401
+    status, _ = request_json("GET", "/v1/questions", headers=[(b"authorization", b"Bearer secret")])
+    assert status == 200
+    # 稼働状況は認証なしで返す
+    status, _ = request_json("GET", "/health")
+    assert status == 200
+
+
+@pytest.mark.parametrize("keys, authorization, expected", [
+    (["secret"], "Bearer ひみつ".encode("utf-8"), 401),
+    (["secret"], b"Bearer \xe9", 401),
+    (["ひみつ"], b"Bearer secret", 401),
+    (["ひみつ"], "Bearer ひみつ".encode("utf-8"), 200),
+])
+def test_api_key_with_non_ascii(monkeypatch, keys, authorization, expected):
+    monkeypatch.setattr(diagnosis_api, "API_KEYS", keys)
+    status, _ = request_json("GET", "/v1/questions", headers=[(b"authorization", authorization)])
+    assert status == expected
+
+
+def test_unexpected_error_returns_500(monkeypatch):
+    def fail():
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(diagnosis_api, "question_list", fail)
+    status, body = request_json("GET", "/v1/questions")
+    assert status == 500
+    assert body["error"]["code"] == "internal_error"
+
+
+def test_metrics():
+    request_json("GET", "/health")
+    status, headers, data = request("GET", "/metrics")
+    assert status == 200
+    assert headers[b"content-type"].startswith(b"text/plain")
+    assert b'api_request_seconds_count{route="health",status="200"}' in data
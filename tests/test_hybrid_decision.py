@@ -0,0 +1,58 @@
+# ハイブリッド判定（analysis.confident_local_result）のテスト
+import pytest
+
+import analysis
+from analysis import confident_local_result, worst_case_margin, score_local, TYPE_NAMES
+
+
+@pytest.fixture(autouse=True)
+def hybrid(monkeypatch):
+    monkeypatch.setattr(analysis, "DECISION_MODE", "hybrid")
+    monkeypatch.setattr(analysis, "HYBRID_MARGIN_THRESHOLD", 10.0)
+
+
+def test_partial_answers_with_reversible_main_type_go_to_llm():
+    # 補った評価では 安定者型 が 30 の差で1位だが、未回答の質問（7番目・answers[6] など）に 5 と答えると同点になる
+    answers = bytearray([5, 4, 3, 2, 1, 5, 0, 0, 2, 0])
+    assert score_local(answers).margin >= analysis.HYBRID_MARGIN_THRESHOLD
+    assert worst_case_margin(answers, score_local(answers).main_type) <= 0
+    assert confident_local_result(answers, count=False) is None
+
+    answers[6] = 5
+    assert confident_local_result(answers, count=False) is None
+
+
+def test_dict_answers_are_judged_the_same_way():
+    answers = {0: 5, 1: 4, 2: 3, 3: 2, 4: 1, 5: 5, 8: 2}
+    assert confident_local_result(answers, count=False) is None
+
+
+def test_full_answers_use_scored_margin():
+    answers = bytearray([5, 4, 3, 2, 1, 5, 4, 3, 2, 1])
+    scored = score_local(answers)
+    assert worst_case_margin(answers, scored.main_type) == pytest.approx(scored.margin)
+    result = confident_local_result(answers, count=False)
+    assert result is not None
+    assert result["main_type"] == TYPE_NAMES[scored.main_type]
+
+
+def test_partial_answers_decided_by_a_wide_margin_stay_local():
+    # 安定者型 は 5 のまま、他のタイプは残りにどう答えても 2 以下
+    answers = bytearray([1, 1, 1, 1, 1, 5, 1, 1, 1, 0])
+    assert worst_case_margin(answers, score_local(answers).main_type) >= 10
+    result = confident_local_result(answers, count=False)
+    assert result is not None
+    assert result["main_type"] == TYPE_NAMES[5]
+
+
+def test_close_full_answers_go_to_llm():
+    answers = bytearray([5, 5, 3, 3, 3, 3, 3, 3, 5, 5])
+    assert confident_local_result(answers, count=False) is None
+
+
+def test_escalations_are_counted():
+    before = analysis.decision_counts()
+    confident_local_result(bytearray([5, 4, 3, 2, 1, 5, 0, 0, 2, 0]))
+    after = analysis.decision_counts()
+    assert after["decisions"] == before["decisions"] + 1
+    assert after["escalated"] == before["escalated"] + 1
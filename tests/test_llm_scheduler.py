@@ -0,0 +1,295 @@
+# llm_scheduler のテスト（時計と API 呼び出しを置き換えて、実際には待たずに確認する）
+import httpx
+import openai
+import pytest
+
+import llm_scheduler
+from llm_scheduler import (
+    LLMScheduler, TokenBucket, CircuitOpenError, DeadlineExceeded, ProviderUnavailable, CLOSED, OPEN, HALF_OPEN
+)
+
+REQUEST = httpx.Request("POST", "https://api.example.com/v1/chat/completions")
+
+
+# time.monotonic() と time.sleep() の代わり（sleep は時計を進めるだけ）
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+# 決められた結果を順に返す API 呼び出し（例外は送出する）。呼び出しごとの timeout を記録する
+class FakeCall:
+    def __init__(self, clock, outcomes, seconds=0.0):
+        self.clock = clock
+        self.outcomes = list(outcomes)
+        self.seconds = seconds
+        self.timeouts = []
+
+    def __call__(self, timeout):
+        self.timeouts.append(timeout)
+        self.clock.now += self.seconds
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def server_error(status=500, headers=None):
+    response = httpx.Response(status, headers=headers, request=REQUEST)
+    if status == 429:
+        return openai.RateLimitError("rate limited", response=response, body=None)
+    return openai.APIStatusError("server error", response=response, body=None)
+
+
+def bad_request():
+    response = httpx.Response(400, request=REQUEST)
+    return openai.BadRequestError("bad request", response=response, body=None)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm_scheduler, "time", clock)
+    return clock
+
+
+def make_scheduler(**options):
+    defaults = dict(rpm_limit=0, tpm_limit=0, deadline_seconds=30.0, max_retries=2, retry_base_seconds=1.0,
+                    retry_max_seconds=8.0, breaker_failures=3, breaker_reset_seconds=30.0, seed=1)
+    defaults.update(options)
+    return LLMScheduler(**defaults)
+
+
+def test_token_bucket_refills_at_rate(clock):
+    bucket = TokenBucket(60, burst_seconds=5.0)
+    assert bucket.capacity == 5.0
+    assert bucket.wait_time(5, clock.now) == 0.0
+    bucket.take(5)
+    assert bucket.wait_time(1, clock.now) == pytest.approx(1.0)
+    assert bucket.wait_time(1, clock.now + 0.5) == pytest.approx(0.5)
+    # 容量を超えては貯まらない
+    assert bucket.wait_time(5, clock.now + 100) == 0.0
+    assert bucket.tokens == 5.0
+
+
+def test_token_bucket_credit_settles_estimate():
+    bucket = TokenBucket(60, burst_seconds=10.0)
+    bucket.take(8)
+    bucket.credit(3)
+    assert bucket.tokens == pytest.approx(5.0)
+    bucket.credit(-2)
+    assert bucket.tokens == pytest.approx(3.0)
+    bucket.credit(100)
+    assert bucket.tokens == bucket.capacity
+
+
+def test_rate_limit_reserves_waits_in_arrival_order(clock):
+    # 1秒に1件・バースト2件
+    scheduler = make_scheduler(rpm_limit=60, burst_seconds=2.0)
+    call = FakeCall(clock, ["a", "b", "c", "d"])
+    assert [scheduler.call(call) for _ in range(4)] == ["a", "b", "c", "d"]
+    assert clock.sleeps == [pytest.approx(1.0), pytest.approx(1.0)]
+    assert scheduler.metrics()["wait_seconds"]["max"] == pytest.approx(1.0)
+
+
+def test_rate_limit_wait_beyond_deadline_fails_fast(clock):
+    scheduler = make_scheduler(rpm_limit=6, burst_seconds=10.0, deadline_seconds=5.0)
+    call = FakeCall(clock, ["a", "b"])
+    assert scheduler.call(call) == "a"
+    # 次の1件は10秒後まで送れない
+    with pytest.raises(DeadlineExceeded):
+        scheduler.call(call)
+    assert clock.sleeps == []
+    assert len(call.timeouts) == 1
+    assert scheduler.metrics()["deadline_exceeded"] == 1
+
+
+def test_timeout_is_remaining_deadline(clock):
+    scheduler = make_scheduler(rpm_limit=60, burst_seconds=1.0, deadline_seconds=10.0)
+    call = FakeCall(clock, ["a", "b"])
+    scheduler.call(call)
+    scheduler.call(call)
+    # 2件目はレート制限で1秒待ってから呼び出す
+    assert call.timeouts == [pytest.approx(10.0), pytest.approx(9.0)]
+
+
+def test_retries_with_exponential_backoff(clock):
+    scheduler = make_scheduler()
+    call = FakeCall(clock, [server_error(), server_error(), "ok"])
+    assert scheduler.call(call) == "ok"
+    assert len(clock.sleeps) == 2
+    # ジッターは 0〜base * 2 ** attempt の範囲
+    assert 0 <= clock.sleeps[0] <= 1.0
+    assert 0 <= clock.sleeps[1] <= 2.0
+    metrics = scheduler.metrics()
+    assert metrics["retries"] == 2
+    assert metrics["attempts"] == 3
+    assert metrics["successes"] == 1
+    assert metrics["state"] == CLOSED
+
+
+def test_backoff_waits_at_least_retry_after(clock):
+    scheduler = make_scheduler()
+    call = FakeCall(clock, [server_error(429, {"retry-after": "5"}), "ok"])
+    assert scheduler.call(call) == "ok"
+    assert clock.sleeps == [5.0]
+
+
+def test_backoff_is_capped(clock):
+    scheduler = make_scheduler(retry_max_seconds=3.0)
+    call = FakeCall(clock, [server_error(429, {"retry-after": "60"}), "ok"])
+    scheduler.call(call)
+    assert clock.sleeps == [3.0]
+    for attempt in range(10):
+        assert scheduler._backoff(attempt, None) <= 3.0
+
+
+def test_gives_up_after_max_retries(clock):
+    scheduler = make_scheduler(max_retries=1)
+    call = FakeCall(clock, [server_error(), server_error()])
+    with pytest.raises(ProviderUnavailable):
+        scheduler.call(call)
+    assert len(call.timeouts) == 2
+
+
+def test_retry_that_would_pass_deadline_fails_fast(clock):
+    scheduler = make_scheduler(deadline_seconds=5.0)
+    call = FakeCall(clock, [server_error(429, {"retry-after": "8"}), "ok"])
+    with pytest.raises(DeadlineExceeded):
+        scheduler.call(call)
+    assert clock.sleeps == []
+    assert len(call.outcomes) == 1
+
+
+def test_slow_attempt_exhausts_deadline(clock):
+    scheduler = make_scheduler(deadline_seconds=5.0, retry_base_seconds=0.0)
+    call = FakeCall(clock, [server_error(), "ok"], seconds=6.0)
+    with pytest.raises(DeadlineExceeded):
+        scheduler.call(call)
+    assert len(call.timeouts) == 1
+
+
+def test_explicit_deadline_is_shared(clock):
+    scheduler = make_scheduler(deadline_seconds=30.0)
+    deadline = scheduler.deadline_at(4.0)
+    clock.now += 1.0
+    call = FakeCall(clock, ["ok"])
+    scheduler.call(call, deadline=deadline)
+    assert call.timeouts == [pytest.approx(3.0)]
+
+
+def test_non_retryable_error_is_not_a_breaker_failure(clock):
+    scheduler = make_scheduler(breaker_failures=1)
+    call = FakeCall(clock, [bad_request()])
+    with pytest.raises(openai.BadRequestError):
+        scheduler.call(call)
+    assert clock.sleeps == []
+    assert scheduler.metrics()["state"] == CLOSED
+
+
+def test_breaker_opens_half_opens_and_closes(clock):
+    scheduler = make_scheduler(max_retries=0, breaker_failures=2, breaker_reset_seconds=30.0)
+    failing = FakeCall(clock, [server_error(), server_error()])
+    for _ in range(2):
+        with pytest.raises(ProviderUnavailable):
+            scheduler.call(failing)
+    assert scheduler.metrics()["state"] == OPEN
+    assert scheduler.is_open()
+
+    # 開いている間は API を呼ばない
+    never = FakeCall(clock, [])
+    with pytest.raises(CircuitOpenError):
+        scheduler.call(never)
+    assert never.timeouts == []
+
+    # 時間が過ぎたら1件だけ試す（試している間の他の呼び出しは止める）
+    clock.now += 30.0
+    assert not scheduler.is_open()
+
+    def probe(timeout):
+        assert scheduler.metrics()["state"] == HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            scheduler.call(never)
+        return "ok"
+
+    assert scheduler.call(probe) == "ok"
+    metrics = scheduler.metrics()
+    assert metrics["state"] == CLOSED
+    assert metrics["consecutive_failures"] == 0
+    assert metrics["breaker_opened"] == 1
+    assert metrics["short_circuited"] == 2
+
+
+def test_failed_probe_reopens_breaker(clock):
+    scheduler = make_scheduler(max_retries=0, breaker_failures=1, breaker_reset_seconds=30.0)
+    with pytest.raises(ProviderUnavailable):
+        scheduler.call(FakeCall(clock, [server_error()]))
+    clock.now += 30.0
+    with pytest.raises(ProviderUnavailable):
+        scheduler.call(FakeCall(clock, [server_error()]))
+    assert scheduler.metrics()["state"] == OPEN
+    # 開き直した時刻から数える
+    clock.now += 29.0
+    with pytest.raises(CircuitOpenError):
+        scheduler.call(FakeCall(clock, []))
+
+
+def test_probe_rejected_by_deadline_releases_half_open(clock):
+    scheduler = make_scheduler(rpm_limit=6, burst_seconds=10.0, max_retries=0, breaker_failures=1,
+                               deadline_seconds=5.0)
+    with pytest.raises(ProviderUnavailable):
+        scheduler.call(FakeCall(clock, [server_error()]))
+    clock.now += 30.0
+    # バケットが空のため、試す1件はレート制限の待ちで期限を超える
+    scheduler._requests.tokens = 0
+    scheduler._requests.updated = clock.now
+    with pytest.raises(DeadlineExceeded):
+        scheduler.call(FakeCall(clock, ["ok"]))
+    scheduler._requests.tokens = scheduler._requests.capacity
+    assert scheduler.call(FakeCall(clock, ["ok"])) == "ok"
+    assert scheduler.metrics()["state"] == CLOSED
+
+
+# 1チャンクごとに時計を進めるストリーミングの応答
+class FakeStream:
+    def __init__(self, clock, chunks, seconds):
+        self.clock = clock
+        self.chunks = chunks
+        self.seconds = seconds
+        self.closed = False
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.clock.now += self.seconds
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+def test_stream_is_cut_off_at_deadline(clock):
+    scheduler = make_scheduler(deadline_seconds=10.0)
+    deadline = scheduler.deadline_at()
+    stream = FakeStream(clock, list("abcdefghij"), seconds=3.0)
+    received = []
+    with pytest.raises(DeadlineExceeded):
+        for chunk in scheduler.stream_until(stream, deadline):
+            received.append(chunk)
+    assert received == ["a", "b", "c"]
+    assert stream.closed
+    assert scheduler.metrics()["deadline_exceeded"] == 1
+
+
+def test_stream_within_deadline_is_passed_through(clock):
+    scheduler = make_scheduler(deadline_seconds=10.0)
+    stream = FakeStream(clock, list("abc"), seconds=1.0)
+    assert list(scheduler.stream_until(stream, scheduler.deadline_at())) == ["a", "b", "c"]
+    assert stream.closed
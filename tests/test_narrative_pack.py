@@ -0,0 +1,71 @@
+# ナラティブパックの読み込み（narrative_pack.get_default_pack）のテスト
+import logging
+
+import pytest
+
+import narrative_pack
+from item_bank import get_default_bank
+from narrative_pack import build_pack, get_default_pack, make_signature, NarrativePack
+from prompt_templates import profile_prompt_hash
+from type_data import TYPE_NAMES
+
+LEVEL_BOUNDS = [70]
+SIGNATURE = make_signature(TYPE_NAMES[0], [1] + [0] * (len(TYPE_NAMES) - 1))
+
+
+@pytest.fixture
+def write_pack(tmp_path, monkeypatch):
+    path = tmp_path / "narrative_pack.bin"
+    monkeypatch.setenv("NARRATIVE_PACK_PATH", str(path))
+    get_default_pack.cache_clear()
+
+    def write(**changes):
+        header = {
+            "pack_version": "test",
+            "model": "gpt-4",
+            "prompt_hash": profile_prompt_hash(len(LEVEL_BOUNDS) + 1),
+            "content_hash": get_default_bank().content_hash,
+            "level_bounds": LEVEL_BOUNDS,
+        }
+        header.update(changes)
+        path.write_bytes(build_pack({SIGNATURE: "詳細分析"}, header))
+        return path
+
+    yield write
+    get_default_pack.cache_clear()
+
+
+def test_pack_round_trip(write_pack):
+    pack = NarrativePack(str(write_pack()))
+    scores = {t: 100 if i == 0 else 50 for i, t in enumerate(TYPE_NAMES)}
+    assert pack.lookup(TYPE_NAMES[0], scores) == "詳細分析"
+    assert pack.lookup(TYPE_NAMES[1], scores) is None
+    assert (pack.hits, pack.misses) == (1, 1)
+    pack.close()
+
+
+def test_matching_pack_is_used(write_pack):
+    write_pack()
+    pack = get_default_pack("gpt-4")
+    assert pack is not None
+    assert SIGNATURE in pack
+
+
+@pytest.mark.parametrize("changes, model, reason", [
+    ({}, "gpt-4o-mini", "モデル"),
+    ({"prompt_hash": "0000000000000000"}, "gpt-4", "プロンプト"),
+    ({"content_hash": "other"}, "gpt-4", "項目バンク"),
+])
+def test_mismatched_pack_is_ignored(write_pack, caplog, changes, model, reason):
+    write_pack(**changes)
+    with caplog.at_level(logging.WARNING, logger=narrative_pack.__name__):
+        assert get_default_pack(model) is None
+    assert reason in caplog.text
+
+
+def test_missing_pack(write_pack, monkeypatch, tmp_path):
+    monkeypatch.setenv("NARRATIVE_PACK_PATH", str(tmp_path / "missing.bin"))
+    assert get_default_pack("gpt-4") is None
+    monkeypatch.setenv("NARRATIVE_PACK_PATH", "")
+    get_default_pack.cache_clear()
+    assert get_default_pack("gpt-4") is None
@@ -0,0 +1,162 @@
+# 結果ストア（results_store.py）の書き込みのテスト
+# バックグラウンドの書き込みで、終了時に書き込み待ちの行が失われないこと・同時に記録しても欠けないことを確認する
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+
+from results_store import ResultsStore
+from type_data import questions, TYPE_NAMES
+
+from conftest import ROOT_DIR
+
+SCORES = {t: 50 for t in TYPE_NAMES}
+
+
+def answers_for(i):
+    return bytes((i + q_idx) % 5 + 1 for q_idx in range(len(questions)))
+
+
+def stored_ids(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {row[0] for row in conn.execute("SELECT id FROM results")}
+    finally:
+        conn.close()
+
+
+def test_close_writes_pending_rows(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    # まとめる件数・待ち時間を大きくして、close() までは書き込まれないようにする
+    store = ResultsStore(path, batch_size=10000, flush_seconds=60)
+    ids = [store.record(answers_for(i), TYPE_NAMES[0], SCORES) for i in range(50)]
+    assert store.get(ids[0])["main_type"] == TYPE_NAMES[0]
+
+    store.close()
+
+    assert stored_ids(path) == set(ids)
+    assert store.stats()["pending"] == 0
+
+
+def test_flush_writes_without_closing(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    store = ResultsStore(path, batch_size=10000, flush_seconds=60)
+    try:
+        ids = [store.record(answers_for(i), TYPE_NAMES[1], SCORES) for i in range(20)]
+        store.flush()
+        assert stored_ids(path) == set(ids)
+        assert store.stats()["written"] == 20
+    finally:
+        store.close()
+
+
+# プロセスの共通のストアは、close() を呼ばずに終了しても書き込み待ちの行を書き込む（atexit）
+def test_default_store_flushes_at_exit(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    script = (
+        "from results_store import get_default_store\n"
+        "from type_data import TYPE_NAMES\n"
+        "store = get_default_store()\n"
+        "for i in range(30):\n"
+        "    print(store.record(bytes([3] * 10), TYPE_NAMES[2], {t: 50 for t in TYPE_NAMES}))\n"
+    )
+    env = dict(os.environ, RESULTS_STORE_PATH=path, RESULTS_STORE_FLUSH_SECONDS="60", RESULTS_STORE_BATCH_SIZE="10000")
+    output = subprocess.run([sys.executable, "-c", script], cwd=ROOT_DIR, env=env, capture_output=True, text=True,
+                            check=True).stdout
+
+    assert stored_ids(path) == set(output.split())
+
+
+def test_concurrent_sessions_do_not_lose_writes(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    store = ResultsStore(path, batch_size=16, flush_seconds=0.01)
+    ids = []
+    ids_lock = threading.Lock()
+
+    def session(n):
+        recorded = [store.record(answers_for(n * 1000 + i), TYPE_NAMES[n % len(TYPE_NAMES)], SCORES) for i in range(100)]
+        with ids_lock:
+            ids.extend(recorded)
+
+    threads = [threading.Thread(target=session, args=(n,)) for n in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.close()
+
+    assert len(ids) == 1600
+    assert stored_ids(path) == set(ids)
+    stats = store.stats()
+    assert stats["written"] == 1600
+    assert stats["errors"] == 0
+
+
+# 診断 API の複数のワーカープロセスのように、同じファイルに別のストアから同時に書き込んでも欠けない
+def test_concurrent_stores_on_one_file(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    stores = [ResultsStore(path, batch_size=8, flush_seconds=0.01) for _ in range(4)]
+    ids = []
+    ids_lock = threading.Lock()
+
+    def session(store, n):
+        recorded = [store.record(answers_for(i), TYPE_NAMES[0], SCORES) for i in range(200)]
+        with ids_lock:
+            ids.extend(recorded)
+
+    threads = [threading.Thread(target=session, args=(store, n)) for n, store in enumerate(stores)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for store in stores:
+        store.close()
+
+    assert stored_ids(path) == set(ids)
+    assert sum(store.stats()["errors"] for store in stores) == 0
+
+
+# flush() を別のスレッドで呼び、timeout 秒以内に戻るか
+def flush_returns(store, timeout=5):
+    thread = threading.Thread(target=store.flush, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive()
+
+
+# SQLite のエラー以外（値を変換できない行など）で書き込めなくても、書き込みのスレッドは止まらない
+def test_bad_row_does_not_stop_writer(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    store = ResultsStore(path, batch_size=10000, flush_seconds=60)
+    try:
+        bad_id = store.record(answers_for(0), TYPE_NAMES[0], SCORES, answer_seconds=2 ** 70)
+        assert flush_returns(store)
+        stats = store.stats()
+        assert stats["errors"] == 1
+        assert stats["pending"] == 0
+        assert "too large" in stats["last_error"]
+        assert store.get(bad_id) is None
+
+        good_id = store.record(answers_for(1), TYPE_NAMES[0], SCORES)
+        assert flush_returns(store)
+        assert stored_ids(path) == {good_id}
+    finally:
+        store.close()
+
+
+def test_flush_and_record_after_close(tmp_path):
+    path = str(tmp_path / "results.sqlite3")
+    store = ResultsStore(path, batch_size=10000, flush_seconds=60)
+    store.record(answers_for(0), TYPE_NAMES[0], SCORES)
+    store.close()
+
+    assert flush_returns(store)
+    late_id = store.record(answers_for(1), TYPE_NAMES[0], SCORES)
+    assert flush_returns(store)
+    stats = store.stats()
+    assert stats["written"] == 1
+    assert stats["errors"] == 1
+    assert stats["pending"] == 0
+    assert late_id not in stored_ids(path)
+    store.close()
@@ -0,0 +1,57 @@
+# 画面テーマの CSS
+# assets/theme.css と、tools/build_assets.py が作成した static/manifest.json から CSS を組み立てる。
+# 背景画像は Streamlit の静的ファイル配信（/app/static）から読み込み、内容のハッシュを ?v= に付けて
+# 長期キャッシュさせる。CSS はプロセスごとに1回だけ組み立てて圧縮する。
+import functools
+import json
+import os
+import re
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+THEME_CSS_PATH = os.path.join(ROOT_DIR, "assets", "theme.css")
+MANIFEST_PATH = os.path.join(ROOT_DIR, "static", "manifest.json")
+STATIC_URL = "app/static/"
+
+# この幅以上の画面では最大サイズの背景画像を使う
+LARGE_SCREEN_MIN_WIDTH = 1600
+
+
+def static_url(manifest, name):
+    return f"{STATIC_URL}{name}?v={manifest['files'][name]['hash']}"
+
+
+# 背景画像の CSS（WebP 対応ブラウザには WebP、それ以外には JPEG）
+def background_css(manifest):
+    def rule(width):
+        webp = static_url(manifest, f"background-{width}.webp")
+        jpg = static_url(manifest, f"background-{width}.jpg")
+        return (
+            f'.stApp{{background-image:url("{jpg}");'
+            f'background-image:image-set(url("{webp}") type("image/webp"),url("{jpg}") type("image/jpeg"));'
+            f"background-size:cover}}"
+        )
+
+    widths = manifest["background_widths"]
+    css = [rule(1280 if 1280 in widths else widths[0])]
+    css.append(f"@media (max-width:800px){{{rule(widths[0])}}}")
+    css.append(f"@media (min-width:{LARGE_SCREEN_MIN_WIDTH}px){{{rule(widths[-1])}}}")
+    return "".join(css)
+
+
+# CSS の空白・コメントを取り除く
+def minify_css(css):
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{}:;,>])\s*", r"\1", css)
+    return css.replace(";}", "}").strip()
+
+
+# 画面に埋め込む <style> 要素（プロセスごとに1回だけ作成）
+@functools.lru_cache(maxsize=1)
+def theme_style():
+    with open(THEME_CSS_PATH, encoding="utf-8") as f:
+        css = minify_css(f.read())
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            css = background_css(json.load(f)) + css
+    return f"<style>{css}</style>"
@@ -0,0 +1,63 @@
+# 静的アセットのビルド
+# assets/background.jpg から複数サイズの背景画像（WebP と JPEG）を static/ に書き出し、
+# 内容のハッシュを static/manifest.json に記録する。theme.py はこのハッシュを
+# URL の ?v= に付けるため、画像を更新するとブラウザのキャッシュも自動的に切り替わる。
+#
+# 使い方:
+#   python tools/build_assets.py
+import hashlib
+import json
+import os
+import sys
+
+from PIL import Image
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_PATH = os.path.join(ROOT_DIR, "assets", "background.jpg")
+STATIC_DIR = os.path.join(ROOT_DIR, "static")
+MANIFEST_PATH = os.path.join(STATIC_DIR, "manifest.json")
+
+# 出力する背景画像の幅
+BACKGROUND_WIDTHS = [640, 1280, 1920]
+WEBP_QUALITY = 80
+JPEG_QUALITY = 80
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def build_background(source):
+    entries = {}
+    for width in BACKGROUND_WIDTHS:
+        height = round(source.height * width / source.width)
+        resized = source.resize((width, height), Image.LANCZOS)
+        for ext, options in (
+            ("webp", {"quality": WEBP_QUALITY, "method": 6}),
+            ("jpg", {"quality": JPEG_QUALITY, "optimize": True, "progressive": True})
+        ):
+            name = f"background-{width}.{ext}"
+            path = os.path.join(STATIC_DIR, name)
+            resized.save(path, **options)
+            entries[name] = {"hash": file_hash(path), "bytes": os.path.getsize(path)}
+    return entries
+
+
+def main():
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    with Image.open(SOURCE_PATH) as source:
+        files = build_background(source.convert("RGB"))
+
+    manifest = {"background_widths": BACKGROUND_WIDTHS, "files": files}
+    with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+    for name, entry in sorted(files.items()):
+        print(f"{name}: {entry['bytes'] / 1024:.1f}KB ({entry['hash']})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
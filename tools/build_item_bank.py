@@ -0,0 +1,153 @@
+# 項目バンクのビルド
+# assets/item_bank/<言語>.json（質問・評価ラベル・タイプ定義の元データ）を検証し、
+# item_bank.py が読み込む1つのバイナリファイル（data/item_bank.bin）にまとめる。
+#
+# ファイルの構成:
+#   先頭 16 バイト: マジック "ITEMBANK"、形式のバージョン、ヘッダーの長さ（リトルエンディアン）
+#   ヘッダー（JSON）: バンクのバージョン、内容のハッシュ、言語、タイプ名、質問 ID、
+#                    質問→タイプ番号・タイプ→質問番号の索引、本体の各区画の (オフセット, 長さ)
+#   本体: 言語ごとの質問文・評価ラベル、言語×タイプごとのタイプ定義（それぞれ JSON）
+#
+# 使い方:
+#   python tools/build_item_bank.py            # data/item_bank.bin を作り直す
+#   python tools/build_item_bank.py --check    # 元データと一致しなければ終了コード 1
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from item_bank import MAGIC, FORMAT_VERSION, PREAMBLE, DEFAULT_PATH  # noqa: E402
+
+SOURCE_DIR = os.path.join(ROOT_DIR, "assets", "item_bank")
+
+RATINGS = ["1", "2", "3", "4", "5"]
+TYPE_FIELDS = ["英語名", "説明", "強み", "推奨役割", "育成ポイント", "四柱推命", "陰陽五行"]
+
+
+# 元データを言語ごとに読み込む（{言語: 内容}）
+def load_sources(source_dir=SOURCE_DIR):
+    sources = {}
+    for path in sorted(glob.glob(os.path.join(source_dir, "*.json"))):
+        with open(path, encoding="utf-8") as f:
+            source = json.load(f)
+        sources[source["language"]] = source
+    if not sources:
+        raise ValueError(f"項目バンクの元データがありません: {source_dir}")
+    return sources
+
+
+# 言語間で質問 ID・タイプ・バンクのバージョンが揃っていることを確認する
+def validate_sources(sources):
+    reference = next(iter(sources.values()))
+    type_names = [t["name"] for t in reference["types"]]
+    items = [(item["id"], item["type"]) for item in reference["items"]]
+    if len(set(type_names)) != len(type_names):
+        raise ValueError("タイプ名が重複しています")
+    if len({item_id for item_id, _ in items}) != len(items):
+        raise ValueError("質問 ID が重複しています")
+
+    for language, source in sources.items():
+        if source["bank_version"] != reference["bank_version"]:
+            raise ValueError(f"{language}: bank_version が他の言語と異なります")
+        if [t["name"] for t in source["types"]] != type_names:
+            raise ValueError(f"{language}: タイプの並びが他の言語と異なります")
+        if [(item["id"], item["type"]) for item in source["items"]] != items:
+            raise ValueError(f"{language}: 質問 ID かタイプが他の言語と異なります")
+        if sorted(source["rating_labels"]) != RATINGS:
+            raise ValueError(f"{language}: 評価ラベルは 1〜5 のすべてが必要です")
+        for t in source["types"]:
+            missing = [field for field in TYPE_FIELDS if field not in t]
+            if missing:
+                raise ValueError(f"{language}: {t['name']} に {', '.join(missing)} がありません")
+        for item in source["items"]:
+            if item["type"] not in type_names:
+                raise ValueError(f"{language}: {item['id']} のタイプが不明です: {item['type']}")
+            if not item.get("質問"):
+                raise ValueError(f"{language}: {item['id']} の質問文がありません")
+    return type_names, items
+
+
+def _encode(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# 元データから項目バンクのバイト列を作る
+def build_bank(sources, default_language="ja"):
+    if default_language not in sources:
+        raise ValueError(f"既定の言語の元データがありません: {default_language}")
+    type_names, items = validate_sources(sources)
+    type_ids = {name: i for i, name in enumerate(type_names)}
+    item_types = [type_ids[type_name] for _, type_name in items]
+
+    blob = bytearray()
+
+    def append(value):
+        data = _encode(value)
+        entry = [len(blob), len(data)]
+        blob.extend(data)
+        return entry
+
+    sections = {}
+    for language in sorted(sources):
+        source = sources[language]
+        sections[language] = {
+            "questions": append([item["質問"] for item in source["items"]]),
+            "rating_labels": append(source["rating_labels"]),
+            "types": [append({k: v for k, v in t.items() if k != "name"}) for t in source["types"]]
+        }
+
+    header = {
+        "bank_version": sources[default_language]["bank_version"],
+        "content_hash": hashlib.sha256(bytes(blob)).hexdigest()[:16],
+        "default_language": default_language,
+        "languages": sorted(sources),
+        "type_names": type_names,
+        "item_ids": [item_id for item_id, _ in items],
+        "item_types": item_types,
+        "type_items": [[q_idx for q_idx, t in enumerate(item_types) if t == type_id] for type_id in range(len(type_names))],
+        "sections": sections
+    }
+    header_bytes = _encode(header)
+    return PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)) + header_bytes + bytes(blob)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="項目バンク（質問・タイプ定義）をビルドする")
+    parser.add_argument("--source-dir", default=SOURCE_DIR, help="元データ（<言語>.json）のディレクトリ")
+    parser.add_argument("-o", "--output", default=DEFAULT_PATH, help="出力先")
+    parser.add_argument("--default-language", default="ja", help="既定の言語")
+    parser.add_argument("--check", action="store_true", help="出力先が元データと一致するかだけを確認する")
+    args = parser.parse_args(argv)
+
+    try:
+        data = build_bank(load_sources(args.source_dir), args.default_language)
+    except (ValueError, KeyError) as e:
+        print(f"項目バンクをビルドできません: {e}", file=sys.stderr)
+        return 1
+
+    if args.check:
+        try:
+            with open(args.output, "rb") as f:
+                current = f.read()
+        except FileNotFoundError:
+            current = None
+        if current != data:
+            print(f"{args.output} が元データと一致しません。python tools/build_item_bank.py を実行してください", file=sys.stderr)
+            return 1
+        print(f"{args.output} は最新です")
+        return 0
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "wb") as f:
+        f.write(data)
+    print(f"{args.output}: {len(data) / 1024:.1f}KB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+# 母集団との比較に使うパーセンタイル表のビルド
+# ローカル採点（scoring.py）で母集団の回答を採点し、percentiles.py が読み込む表を作る。
+#   uniform : 全回答の組（5^質問数 通り）をそれぞれ1人として数える（既定。data/percentiles.bin に同梱）
+#   results : 結果ストアに保存した診断結果の回答を、件数で重み付けして数える
+# 結果ストアの回答で未回答の質問は、画面の採点と同じく中央の評価で補う。
+# 回答の組をまとめた行列ごとに採点するため、全回答の組（約980万通り）でも数秒で終わる。
+#
+# 使い方:
+#   python tools/build_percentiles.py                                   # data/percentiles.bin を作り直す
+#   python tools/build_percentiles.py --check                           # 項目バンクと一致しなければ終了コード 1
+#   python tools/build_percentiles.py --population results --since 2026-01-01 -o .cache/percentiles.bin
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from adaptive import fill_unanswered  # noqa: E402
+from item_bank import get_default_bank  # noqa: E402
+from percentiles import MAGIC, FORMAT_VERSION, PREAMBLE, SCALE, DEFAULT_PATH  # noqa: E402
+from results_store import ResultsStore, DEFAULT_STORE_PATH, parse_time  # noqa: E402
+from scoring import score_answers  # noqa: E402
+from type_data import questions, TYPE_NAMES, TYPE_ITEMS  # noqa: E402
+
+# 1回に採点する回答の組の数
+CHUNK_SIZE = 1 << 20
+
+# 質問ごとの5進数の桁の重み（先頭の質問が最下位の桁）
+PLACES = 5 ** np.arange(len(questions), dtype=np.int64)
+
+
+# 回答の組の番号（5進数）を N×質問数 の評価の行列にする
+def decode_indices(indices):
+    return (indices[:, np.newaxis] // PLACES) % 5 + 1
+
+
+class Population:
+    def __init__(self):
+        # タイプごとの、タイプの質問の評価の番号ごとの重み
+        self.type_counts = [np.zeros(5 ** len(items)) for items in TYPE_ITEMS]
+        # 主要タイプごとの重み
+        self.main_counts = np.zeros(len(TYPE_NAMES))
+        self.size = 0
+
+    # 評価の行列（N×質問数）を重み付きで加える
+    def add(self, matrix, weights=None):
+        scored = score_answers(matrix)
+        self.main_counts += np.bincount(scored.main_type, weights=weights, minlength=len(TYPE_NAMES))
+        for counts, items in zip(self.type_counts, TYPE_ITEMS):
+            codes = (matrix[:, items] - 1) @ PLACES[:len(items)]
+            counts += np.bincount(codes, weights=weights, minlength=len(counts))
+        self.size += len(matrix) if weights is None else int(weights.sum())
+
+
+def uniform_population():
+    population = Population()
+    total = 5 ** len(questions)
+    for start in range(0, total, CHUNK_SIZE):
+        population.add(decode_indices(np.arange(start, min(start + CHUNK_SIZE, total), dtype=np.int64)))
+    return population
+
+
+def results_population(path, since=None, until=None):
+    if not os.path.exists(path):
+        raise ValueError(f"結果ストアがありません: {path}")
+    counter = collections.Counter()
+    store = ResultsStore(path)
+    try:
+        for record in store.iter_results(since=since, until=until):
+            answers = fill_unanswered(record["answers"])
+            counter[sum((rating - 1) * 5 ** q_idx for q_idx, rating in enumerate(answers))] += 1
+    finally:
+        store.close()
+    if not counter:
+        raise ValueError(f"結果ストアに診断結果がありません: {path}")
+    population = Population()
+    indices = np.fromiter(counter.keys(), dtype=np.int64, count=len(counter))
+    weights = np.fromiter(counter.values(), dtype=np.float64, count=len(counter))
+    for start in range(0, len(indices), CHUNK_SIZE):
+        population.add(decode_indices(indices[start:start + CHUNK_SIZE]), weights[start:start + CHUNK_SIZE])
+    return population
+
+
+# タイプの質問の評価の番号ごとのパーセンタイル（より低い割合 + 同じ割合の半分、× SCALE）
+# タイプのスコアは平均評価なので、評価の合計が同じ番号は同じ値になる
+def type_percentiles(counts, n_items):
+    sums = decode_indices(np.arange(len(counts), dtype=np.int64))[:, :n_items].sum(axis=1)
+    weight_by_sum = np.bincount(sums, weights=counts)
+    below = np.concatenate([[0.0], np.cumsum(weight_by_sum)[:-1]])
+    percentiles = (below[sums] + weight_by_sum[sums] / 2) / counts.sum() * 100
+    return np.rint(percentiles * SCALE).astype("<u2")
+
+
+def _encode(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# 母集団からパーセンタイル表のバイト列を作る
+def build_table(population, population_name):
+    blob = bytearray()
+    sections = []
+    for counts, items in zip(population.type_counts, TYPE_ITEMS):
+        data = type_percentiles(counts, len(items)).tobytes()
+        sections.append([len(blob), len(counts)])
+        blob.extend(data)
+
+    header = {
+        "content_hash": get_default_bank().content_hash,
+        "population": population_name,
+        "population_size": population.size,
+        "type_names": TYPE_NAMES,
+        "type_items": [list(items) for items in TYPE_ITEMS],
+        "type_shares": [round(float(share), 6) for share in population.main_counts / population.main_counts.sum()],
+        "sections": sections
+    }
+    header_bytes = _encode(header)
+    return PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)) + header_bytes + bytes(blob)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="母集団との比較に使うパーセンタイル表をビルドする")
+    parser.add_argument("--population", choices=["uniform", "results"], default="uniform",
+                        help="uniform: 全回答の組 / results: 結果ストアの診断結果")
+    parser.add_argument("--store", default=os.getenv("RESULTS_STORE_PATH") or DEFAULT_STORE_PATH, help="結果ストアのパス")
+    parser.add_argument("--since", type=parse_time, help="この日時以降の結果（例: 2026-01-01）")
+    parser.add_argument("--until", type=parse_time, help="この日時より前の結果")
+    parser.add_argument("-o", "--output", default=DEFAULT_PATH, help="出力先")
+    parser.add_argument("--check", action="store_true", help="出力先が現在の項目バンクから作った表と一致するかだけを確認する")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        if args.population == "uniform":
+            population = uniform_population()
+        else:
+            population = results_population(args.store, args.since, args.until)
+    except ValueError as e:
+        print(f"パーセンタイル表をビルドできません: {e}", file=sys.stderr)
+        return 1
+    data = build_table(population, args.population)
+
+    if args.check:
+        try:
+            with open(args.output, "rb") as f:
+                current = f.read()
+        except FileNotFoundError:
+            current = None
+        if current != data:
+            print(f"{args.output} が項目バンクと一致しません。python tools/build_percentiles.py を実行してください", file=sys.stderr)
+            return 1
+        print(f"{args.output} は最新です")
+        return 0
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "wb") as f:
+        f.write(data)
+    print(f"{args.output}: {len(data) / 1024:.1f}KB（母集団 {population.size}件、{time.perf_counter() - started:.1f}秒）")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
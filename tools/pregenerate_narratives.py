@@ -0,0 +1,348 @@
+# 詳細分析の事前生成（ナラティブパックのビルド）
+# よく現れる結果のシグネチャ（主要タイプ × 各タイプのスコアの段階、narrative_pack.py）ごとに、
+# LLM で詳細分析をオフラインで生成し、analysis.py が API を呼び出さずに使うパック（data/narrative_pack.bin）にまとめる。
+#
+# シグネチャの重みは母集団（build_percentiles.py と同じ uniform / results）から求め、重みの大きい順に
+# --limit 件、または母集団に占める割合が --coverage に達するまでを生成する。
+# 生成した詳細分析は1件ごとにチェックポイント（JSONL）に追記するため、中断しても同じコマンドで続きから再開でき、
+# 失敗したシグネチャだけを次の実行で生成し直す。モデル・プロンプト・段階の境界・項目バンクが変わった場合は
+# 以前のチェックポイントを使わない（--restart で作り直す）。
+#
+# 生成のバックエンド（--backend）:
+#   openai : analysis.create_completion で呼び出す（スケジューラーのレート制限・再試行と使用量の記録を共有する）
+#            --base-url（または OPENAI_BASE_URL）で OpenAI 互換のローカルサーバー（vLLM・Ollama など）も使える
+#   fake   : benchmarks/fake_openai_server.py を同じプロセスで起動して使う（API キー・ネットワーク不要の動作確認用）
+#
+# 使い方:
+#   python tools/pregenerate_narratives.py --backend fake --limit 50 -o .cache/narrative_pack.bin
+#   python tools/pregenerate_narratives.py --coverage 0.8 --concurrency 8        # data/narrative_pack.bin
+#   python tools/pregenerate_narratives.py --population results --since 2026-01-01 --limit 2000
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from adaptive import fill_unanswered  # noqa: E402
+from build_percentiles import CHUNK_SIZE, decode_indices  # noqa: E402
+from item_bank import get_default_bank  # noqa: E402
+from narrative_pack import DEFAULT_PATH, build_pack, make_signature  # noqa: E402
+from prompt_templates import profile_narrative_messages, profile_prompt_hash  # noqa: E402
+from results_store import ResultsStore, DEFAULT_STORE_PATH, parse_time  # noqa: E402
+from scoring import score_answers  # noqa: E402
+from type_data import questions, TYPE_NAMES  # noqa: E402
+
+DEFAULT_CHECKPOINT = os.path.join(ROOT_DIR, ".cache", "narrative_checkpoint.jsonl")
+
+# 段階の境界（正規化スコア。既定は 70 未満 / 70 以上の2段階）
+DEFAULT_LEVEL_BOUNDS = (70,)
+
+MAX_TOKENS = 1500
+TEMPERATURE = 0.5
+
+
+# --- バックエンド ---
+
+# OpenAI（互換）API で生成する
+class OpenAIBackend:
+    def __init__(self, model, base_url=None):
+        self.model = model
+        self.base_url = base_url
+
+    def start(self):
+        # 共有クライアントは最初の呼び出しで作られるため、その前に接続先を設定する
+        if self.base_url:
+            os.environ["OPENAI_BASE_URL"] = self.base_url
+
+    def generate(self, messages):
+        from analysis import create_completion
+
+        response = create_completion(messages, MAX_TOKENS, "pregenerate", model=self.model, temperature=TEMPERATURE)
+        text = (response.choices[0].message.content or "").strip()
+        if not text:
+            raise ValueError("空の応答です")
+        return text
+
+    def close(self):
+        pass
+
+
+# 同じプロセスで起動した負荷試験用のサーバーで生成する
+class FakeBackend(OpenAIBackend):
+    def start(self):
+        sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+        from fake_openai_server import FakeConfig, start_server
+
+        self.server = start_server(FakeConfig(latency=0.05, seed=0))
+        os.environ["OPENAI_BASE_URL"] = self.server.base_url
+        os.environ.setdefault("OPENAI_API_KEY", "dummy")
+
+    def close(self):
+        self.server.shutdown()
+
+
+BACKENDS = {"openai": OpenAIBackend, "fake": FakeBackend}
+
+
+# --- シグネチャの重み ---
+
+# 評価の行列（N×質問数）のシグネチャの番号（主要タイプ × 段階の組）ごとの重みを加える
+def add_signature_weights(counts, matrix, level_bounds, weights=None):
+    scored = score_answers(matrix)
+    levels = np.searchsorted(np.asarray(level_bounds), scored.scores.astype(np.int64), side="right")
+    n_levels = len(level_bounds) + 1
+    codes = scored.main_type.astype(np.int64)
+    for i in range(len(TYPE_NAMES)):
+        codes = codes * n_levels + levels[:, i]
+    counts += np.bincount(codes, weights=weights, minlength=len(counts))
+
+
+def uniform_weights(level_bounds):
+    counts = np.zeros(len(TYPE_NAMES) * (len(level_bounds) + 1) ** len(TYPE_NAMES))
+    total = 5 ** len(questions)
+    for start in range(0, total, CHUNK_SIZE):
+        add_signature_weights(counts, decode_indices(np.arange(start, min(start + CHUNK_SIZE, total), dtype=np.int64)),
+                              level_bounds)
+    return counts
+
+
+def results_weights(level_bounds, path, since=None, until=None):
+    if not os.path.exists(path):
+        raise ValueError(f"結果ストアがありません: {path}")
+    counter = collections.Counter()
+    store = ResultsStore(path)
+    try:
+        for record in store.iter_results(since=since, until=until):
+            counter[bytes(fill_unanswered(record["answers"]))] += 1
+    finally:
+        store.close()
+    if not counter:
+        raise ValueError(f"結果ストアに診断結果がありません: {path}")
+    counts = np.zeros(len(TYPE_NAMES) * (len(level_bounds) + 1) ** len(TYPE_NAMES))
+    rows = list(counter)
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[start:start + CHUNK_SIZE]
+        matrix = np.frombuffer(b"".join(chunk), dtype=np.uint8).reshape(len(chunk), len(questions)).astype(np.int64)
+        add_signature_weights(counts, matrix, level_bounds,
+                              np.fromiter((counter[row] for row in chunk), dtype=np.float64, count=len(chunk)))
+    return counts
+
+
+# シグネチャの番号を (主要タイプ, 段階のリスト) にする
+def decode_signature(code, n_levels):
+    levels = []
+    for _ in TYPE_NAMES:
+        code, level = divmod(code, n_levels)
+        levels.append(int(level))
+    return TYPE_NAMES[code], levels[::-1]
+
+
+# 重みの大きい順に、件数または母集団に占める割合の上限までのシグネチャ（[(シグネチャ, 主要タイプ, 段階, 割合)]）
+def select_signatures(counts, level_bounds, limit=None, coverage=None):
+    shares = counts / counts.sum()
+    order = np.argsort(-shares, kind="stable")
+    order = order[shares[order] > 0]
+    if coverage is not None:
+        order = order[:int(np.searchsorted(np.cumsum(shares[order]), coverage)) + 1]
+    if limit is not None:
+        order = order[:limit]
+    selected = []
+    for code in order:
+        main_type, levels = decode_signature(int(code), len(level_bounds) + 1)
+        selected.append((make_signature(main_type, levels), main_type, levels, float(shares[code])))
+    return selected
+
+
+# --- 生成 ---
+
+# チェックポイントの内容（生成済みの {シグネチャ: 詳細分析}）を読み込む
+# 先頭行の識別情報が identity と異なる場合は ValueError
+def load_checkpoint(path, identity):
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        first = f.readline()
+        if first and json.loads(first) != identity:
+            raise ValueError(f"{path} は別のモデル・プロンプト・段階の境界・項目バンクで生成したチェックポイントです"
+                             "（--restart で作り直すか、--checkpoint で別のファイルを指定してください）")
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # 中断時に書きかけだった行
+                continue
+            done[entry["signature"]] = entry["text"]
+    return done
+
+
+def open_checkpoint(path, identity, restart):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    if restart or not os.path.exists(path) or os.path.getsize(path) == 0:
+        f = open(path, "w", encoding="utf-8")
+        f.write(json.dumps(identity, ensure_ascii=False) + "\n")
+        f.flush()
+        return f
+    with open(path, "rb") as f:
+        f.seek(-1, os.SEEK_END)
+        complete = f.read(1) == b"\n"
+    f = open(path, "a", encoding="utf-8")
+    # 中断時に書きかけだった行の後ろに続けて書かない
+    if not complete:
+        f.write("\n")
+    return f
+
+
+# 未生成のシグネチャを並行して生成し、1件ごとにチェックポイントへ追記する（失敗したシグネチャのリストを返す）
+def generate(backend, todo, n_levels, checkpoint, concurrency, on_progress):
+    failed = []
+    pending = iter(todo)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        running = {}
+
+        def submit():
+            for signature, main_type, levels, _ in pending:
+                running[executor.submit(backend.generate, profile_narrative_messages(main_type, levels, n_levels))] = signature
+                return True
+            return False
+
+        for _ in range(concurrency * 2):
+            if not submit():
+                break
+        try:
+            while running:
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    signature = running.pop(future)
+                    try:
+                        text = future.result()
+                    except Exception as e:
+                        failed.append((signature, e))
+                    else:
+                        checkpoint.write(json.dumps({"signature": signature, "text": text}, ensure_ascii=False) + "\n")
+                        checkpoint.flush()
+                    on_progress(signature)
+                    submit()
+        except KeyboardInterrupt:
+            for future in running:
+                future.cancel()
+            raise
+    return failed
+
+
+def write_pack(path, data):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="詳細分析を事前生成してナラティブパックをビルドする")
+    parser.add_argument("--backend", choices=list(BACKENDS), default="openai", help="生成に使うバックエンド")
+    parser.add_argument("--model", default=os.getenv("ANALYSIS_NARRATIVE_MODEL") or "gpt-4", help="生成に使うモデル")
+    parser.add_argument("--base-url", help="OpenAI 互換 API の URL（openai バックエンド）")
+    parser.add_argument("--population", choices=["uniform", "results"], default="uniform",
+                        help="シグネチャの重み。uniform: 全回答の組 / results: 結果ストアの診断結果")
+    parser.add_argument("--store", default=os.getenv("RESULTS_STORE_PATH") or DEFAULT_STORE_PATH, help="結果ストアのパス")
+    parser.add_argument("--since", type=parse_time, help="この日時以降の結果（例: 2026-01-01）")
+    parser.add_argument("--until", type=parse_time, help="この日時より前の結果")
+    parser.add_argument("--levels", type=int, nargs="+", default=list(DEFAULT_LEVEL_BOUNDS),
+                        help="段階の境界（正規化スコア、昇順）")
+    parser.add_argument("--limit", type=int, help="生成するシグネチャの数の上限（既定 500。--coverage だけを指定した場合は上限なし）")
+    parser.add_argument("--coverage", type=float, help="母集団に占める割合（0〜1）がこの値に達するまで生成する")
+    parser.add_argument("--concurrency", type=int, default=4, help="同時に生成する数")
+    parser.add_argument("--pack-version", help="パックのバージョン（既定は生成日時）")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="生成済みの詳細分析を追記するファイル")
+    parser.add_argument("--restart", action="store_true", help="チェックポイントを作り直す")
+    parser.add_argument("-o", "--output", default=DEFAULT_PATH, help="出力先")
+    args = parser.parse_args(argv)
+
+    level_bounds = sorted(set(args.levels))
+    n_levels = len(level_bounds) + 1
+    limit = args.limit if args.limit is not None or args.coverage is not None else 500
+
+    started = time.perf_counter()
+    try:
+        if args.population == "uniform":
+            counts = uniform_weights(level_bounds)
+        else:
+            counts = results_weights(level_bounds, args.store, args.since, args.until)
+    except ValueError as e:
+        print(f"シグネチャの重みを求められません: {e}", file=sys.stderr)
+        return 1
+    selected = select_signatures(counts, level_bounds, limit, args.coverage)
+    target_coverage = sum(share for *_, share in selected)
+    print(f"{len(selected)}件のシグネチャ（母集団の {target_coverage:.1%}）を選びました"
+          f"（{time.perf_counter() - started:.1f}秒）")
+
+    content_hash = get_default_bank().content_hash
+    identity = {"checkpoint": 1, "model": args.model, "prompt_hash": profile_prompt_hash(n_levels),
+                "level_bounds": level_bounds, "content_hash": content_hash}
+    try:
+        done = {} if args.restart else load_checkpoint(args.checkpoint, identity)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    todo = [entry for entry in selected if entry[0] not in done]
+    print(f"生成済み {len(selected) - len(todo)}件 / 未生成 {len(todo)}件")
+
+    backend = BACKENDS[args.backend](args.model, args.base_url)
+    backend.start()
+    progress = {"count": 0}
+
+    def on_progress(signature):
+        progress["count"] += 1
+        if progress["count"] % 50 == 0 or progress["count"] == len(todo):
+            print(f"  {progress['count']}/{len(todo)}", flush=True)
+
+    checkpoint = open_checkpoint(args.checkpoint, identity, args.restart)
+    try:
+        failed = generate(backend, todo, n_levels, checkpoint, args.concurrency, on_progress)
+    except KeyboardInterrupt:
+        print(f"中断しました。生成済みの詳細分析は {args.checkpoint} にあり、同じコマンドで再開できます", file=sys.stderr)
+        return 130
+    finally:
+        checkpoint.close()
+        backend.close()
+
+    done = load_checkpoint(args.checkpoint, identity)
+    entries = {signature: done[signature] for signature, *_ in selected if signature in done}
+    coverage = sum(share for signature, *_, share in selected if signature in entries)
+    header = {
+        "pack_version": args.pack_version or datetime.now().strftime("%Y%m%d-%H%M%S"),
+        "model": args.model,
+        "prompt_hash": identity["prompt_hash"],
+        "content_hash": content_hash,
+        "level_bounds": level_bounds,
+        "population": args.population,
+        "coverage": round(coverage, 6)
+    }
+    data = build_pack(entries, header)
+    write_pack(args.output, data)
+    print(f"{args.output}: {len(entries)}件・{len(data) / 1024:.1f}KB（母集団の {coverage:.1%}、"
+          f"{time.perf_counter() - started:.1f}秒）")
+
+    from llm_usage import get_usage_log
+
+    summary = get_usage_log().summary().get("pregenerate")
+    if summary:
+        print(f"使用量: {json.dumps(summary, ensure_ascii=False)}")
+    if failed:
+        print(f"{len(failed)}件の生成に失敗しました（再実行すると失敗したものだけを生成します）。例: "
+              f"{failed[0][0]}: {failed[0][1]}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
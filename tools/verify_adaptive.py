@@ -0,0 +1,117 @@
+# 適応型の出題の検証
+# 5^10 通りの回答ベクトルすべてについて、適応型の出題（adaptive.py）で決まる主要タイプが
+# 全問回答した場合のローカル採点（scoring.score_answers）の主要タイプと一致することを確認する。
+# 出題の順序は回答によって決まるため、出題の分岐を深さ優先でたどり、出題を終えた時点で
+# 残りの質問の回答（5^残り問数 通り）をまとめて採点して比較する。あわせて、すべての回答が
+# 等確率の場合の出題数の分布を表示する。
+#
+# 使い方:
+#   python tools/verify_adaptive.py              # 不一致があれば終了コード 1
+#   python tools/verify_adaptive.py --json
+import argparse
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from type_data import questions  # noqa: E402
+from scoring import score_answers  # noqa: E402
+from adaptive import RATINGS, decided_type, fill_unanswered, next_question  # noqa: E402
+
+
+# 残りの質問の回答をすべて補った N×質問数 の行列
+def completions(answers):
+    unanswered = [q_idx for q_idx, rating in enumerate(answers) if rating == 0]
+    base = np.frombuffer(bytes(answers), dtype=np.uint8)
+    if not unanswered:
+        return base[np.newaxis, :]
+    fills = np.array(list(itertools.product(RATINGS, repeat=len(unanswered))), dtype=np.uint8)
+    matrix = np.repeat(base[np.newaxis, :], len(fills), axis=0)
+    matrix[:, unanswered] = fills
+    return matrix
+
+
+# 出題の分岐をたどって検証する（first_rating は最初の質問の回答。プロセスごとに分担する）
+def verify_branch(first_rating):
+    answers = bytearray(len(questions))
+    counts = {"vectors": 0, "mismatches": 0, "filled_mismatches": 0, "nodes": 0, "asked": {}}
+    examples = []
+
+    def walk(asked):
+        q_idx = next_question(answers)
+        if q_idx is not None:
+            counts["nodes"] += 1
+            for rating in RATINGS:
+                answers[q_idx] = rating
+                walk(asked + 1)
+            answers[q_idx] = 0
+            return
+
+        decided = decided_type(answers)
+        matrix = completions(answers)
+        full = score_answers(matrix).main_type
+        mismatched = int((full != decided).sum())
+        counts["vectors"] += len(matrix)
+        counts["mismatches"] += mismatched
+        counts["filled_mismatches"] += int(score_answers(fill_unanswered(answers)).main_type != decided)
+        counts["asked"][asked] = counts["asked"].get(asked, 0) + len(matrix)
+        if mismatched and len(examples) < 5:
+            examples.append(list(answers))
+
+    first = next_question(answers)
+    answers[first] = first_rating
+    walk(1)
+    counts["examples"] = examples
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="適応型の出題と全問回答の採点結果の一致を確認する")
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+    args = parser.parse_args(argv)
+
+    with ProcessPoolExecutor(max_workers=len(RATINGS)) as pool:
+        branches = list(pool.map(verify_branch, RATINGS))
+
+    total = {"vectors": 0, "mismatches": 0, "filled_mismatches": 0, "nodes": 0, "asked": {}, "examples": []}
+    for branch in branches:
+        for name in ("vectors", "mismatches", "filled_mismatches", "nodes"):
+            total[name] += branch[name]
+        for asked, count in branch["asked"].items():
+            total["asked"][asked] = total["asked"].get(asked, 0) + count
+        total["examples"].extend(branch["examples"])
+    expected_vectors = len(RATINGS) ** len(questions)
+    mean_asked = sum(asked * count for asked, count in total["asked"].items()) / total["vectors"]
+    report = {
+        "vectors": total["vectors"],
+        "expected_vectors": expected_vectors,
+        "mismatches": total["mismatches"],
+        "filled_mismatches": total["filled_mismatches"],
+        "decision_nodes": total["nodes"],
+        "mean_questions": mean_asked,
+        "questions_distribution": {k: total["asked"][k] / total["vectors"] for k in sorted(total["asked"])},
+        "examples": total["examples"][:5]
+    }
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print(f"検証した回答ベクトル: {report['vectors']} / {expected_vectors}")
+        print(f"  全問回答との不一致: {report['mismatches']}件（中央値で補った採点の不一致: {report['filled_mismatches']}件）")
+        print(f"  平均出題数: {mean_asked:.2f}問（回答がすべて等確率の場合）")
+        for asked, ratio in report["questions_distribution"].items():
+            print(f"    {asked}問: {ratio * 100:.2f}%")
+
+    ok = report["vectors"] == expected_vectors and not report["mismatches"] and not report["filled_mismatches"]
+    if not ok:
+        print("NG: 適応型の出題の結果が全問回答の採点と一致しません", file=sys.stderr)
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
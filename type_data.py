@@ -0,0 +1,46 @@
+# 継続力タイプ診断の質問・タイプ定義データ
+# 内容は項目バンク（data/item_bank.bin。元データは assets/item_bank/<言語>.json）から読み込む。
+# 質問とタイプの対応はタイプ番号の索引（ITEM_TYPES / TYPE_ITEMS）で引き、タイプ定義の長文は
+# personality_types[タイプ名] で初めて参照したときに読み込む。
+# Streamlit に依存しないため、app.py 以外（一括診断など）からも import できる
+import os
+from collections.abc import Mapping
+
+from item_bank import get_default_bank
+
+bank = get_default_bank()
+
+# 表示に使う言語（省略時は項目バンクの既定の言語）
+LANGUAGE = os.getenv("ITEM_BANK_LANGUAGE") or bank.default_language
+
+# タイプ名の並び（スコア配列の列順）と、タイプ名からタイプ番号への対応
+TYPE_NAMES = list(bank.type_names)
+TYPE_IDS = bank.type_ids
+
+# 質問ごとのタイプ番号と、タイプごとの質問番号
+ITEM_TYPES = bank.item_types
+TYPE_ITEMS = bank.type_items
+
+# 継続力タイプに関する質問リスト
+questions = [{"質問": text, "タイプ": TYPE_NAMES[type_id]} for text, type_id in zip(bank.question_texts(LANGUAGE), ITEM_TYPES)]
+
+# 評価値のラベル
+RATING_LABELS = bank.rating_labels(LANGUAGE)
+
+
+# 継続力タイプの定義（タイプ名 → 定義の dict。定義は参照したときに項目バンクから読み込む）
+class PersonalityTypes(Mapping):
+    def __getitem__(self, type_name):
+        return bank.type_content(TYPE_IDS[type_name], LANGUAGE)
+
+    def __contains__(self, type_name):
+        return type_name in TYPE_IDS
+
+    def __iter__(self):
+        return iter(TYPE_NAMES)
+
+    def __len__(self):
+        return len(TYPE_NAMES)
+
+
+personality_types = PersonalityTypes()